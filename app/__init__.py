@@ -1,53 +1,88 @@
 """
 Initializes the PowerToken Flask app variables.\n
+The app is built by `create_app()`, so every Gunicorn worker (or test) makes
+its own, with its own database and HTTP connection pools. The extensions
+below are created unbound and attached to each app.\n
 Created by Abigail Franz on 3/12/2018.\n
 Last modified by Abigail Franz on 3/13/2018.
 """
 
-import logging
+import logging, os
 from logging.handlers import RotatingFileHandler, SMTPHandler
 
 from config import Config
 from flask import Flask
 from flask_login import LoginManager
 from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
-
-app = Flask(__name__)
-app.config.from_object(Config)
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-login = LoginManager(app)
-login.login_view = "admin_login"
-
-# Set up email logging for system failures.
-if not app.debug:
-	# Configure email logging
-	if app.config["MAIL_SERVER"]:
-		auth = None
-		if app.config["MAIL_USERNAME"] or app.config["MAIL_PASSWORD"]:
-			auth = (app.config["MAIL_USERNAME"], app.config["MAIL_PASSWORD"])
-		secure = None
-		if app.config["MAIL_USE_TLS"]:
-			secure = ()
-		mail_handler = SMTPHandler(
-			mailhost=(app.config["MAIL_SERVER"], app.config["MAIL_PORT"]),
-			fromaddr="no-replay@" + app.config["MAIL_SERVER"],
-			toaddrs=app.config["ADMINS"],
-			subject="PowerToken Flask Failure",
-			credentials=auth,
-			secure=secure
-		)
-		mail_handler.setLevel(logging.ERROR)
-		app.logger.addHandler(mail_handler)
-
-	# Configure file logging
-	file_handler = RotatingFileHandler(app.config["LOG_FILE"], maxBytes=10240,
-		backupCount=20)
-	file_handler.setFormatter(logging.Formatter(
-		"%(asctime)s %(levelname)4s: %(message)s [in %(pathname)s:%(lineno)d]"))
-	file_handler.setLevel(logging.WARNING)
-	app.logger.addHandler(file_handler)
+from app.routing import RoutingSQLAlchemy
+
+# Statements go to the request's cohort database, and reads in views marked
+# @replica.reads may go to the database snapshot (see routing.py).
+db = RoutingSQLAlchemy()
+migrate = Migrate()
+login = LoginManager()
+login.login_view = "main.admin_login"
+
+def create_app(config_class=Config):
+	"""
+	Build a PowerToken Flask app.
+
+	:param config_class: the configuration, `config.Config` by default
+	"""
+	app = Flask(__name__)
+	app.config.from_object(config_class)
+	db.init_app(app)
+	migrate.init_app(app, db)
+	login.init_app(app)
+
+	from app import (errors, helpers, hooks, monitoring, profiling, routes,
+			routing)
+	app.register_blueprint(errors.bp)
+	app.register_blueprint(hooks.bp)
+	app.register_blueprint(monitoring.bp)
+	app.register_blueprint(routes.bp)
+	profiling.init_app(app)
+
+	# A worker forked from a process that already used the pools (e.g.
+	# `gunicorn --preload`) must not share their sockets; give it its own.
+	def reset_pools():
+		with app.app_context():
+			db.engine.dispose()
+		routing.dispose()
+		helpers.reset_http()
+	if hasattr(os, "register_at_fork"):
+		os.register_at_fork(after_in_child=reset_pools)
+
+	# Set up email logging for system failures.
+	if not app.debug and not app.testing:
+		# Configure email logging
+		if app.config["MAIL_SERVER"]:
+			auth = None
+			if app.config["MAIL_USERNAME"] or app.config["MAIL_PASSWORD"]:
+				auth = (app.config["MAIL_USERNAME"], app.config["MAIL_PASSWORD"])
+			secure = None
+			if app.config["MAIL_USE_TLS"]:
+				secure = ()
+			mail_handler = SMTPHandler(
+				mailhost=(app.config["MAIL_SERVER"], app.config["MAIL_PORT"]),
+				fromaddr="no-replay@" + app.config["MAIL_SERVER"],
+				toaddrs=app.config["ADMINS"],
+				subject="PowerToken Flask Failure",
+				credentials=auth,
+				secure=secure
+			)
+			mail_handler.setLevel(logging.ERROR)
+			app.logger.addHandler(mail_handler)
+
+		# Configure file logging
+		file_handler = RotatingFileHandler(app.config["LOG_FILE"], maxBytes=10240,
+			backupCount=20)
+		file_handler.setFormatter(logging.Formatter(
+			"%(asctime)s %(levelname)4s: %(message)s [in %(pathname)s:%(lineno)d]"))
+		file_handler.setLevel(logging.WARNING)
+		app.logger.addHandler(file_handler)
+
+	return app
 
 # Leave at the bottom of the file!
-from app import errors, models, routes
\ No newline at end of file
+from app import models
@@ -0,0 +1,138 @@
+"""
+Activity completion analytics for the PowerToken admin dashboard.\n
+Completion counts are cached in `completion_stat`, one row per user, closed
+day and activity, filled by a single INSERT ... SELECT that groups `event`
+joined to `day` and `activity`. Each refresh only counts the days that
+closed since the user's newest cached day, so the rates per activity, per
+user and per weekday are small GROUP BYs over the cache instead of scans of
+every event. Users' days follow their own time zones (see
+background/usertime.py), so a day is only counted from two days after it
+(server time), when it's over everywhere.\n
+Created on 10/19/2026.
+"""
+
+import threading, time
+from datetime import datetime, timedelta
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from app import db, routing
+from app.models import Activity, CompletionStat, Day, Event
+
+# Seconds between refreshes of the cache in one process.
+REFRESH_SECONDS = 300
+
+_refreshed_at = {}	# database (see app.routing) -> time
+_refresh_lock = threading.Lock()
+
+def _today():
+	return datetime.combine(datetime.now().date(), datetime.min.time())
+
+def _closed_before():
+	# Days before this one are over for users in any time zone.
+	return _today() - timedelta(days=1)
+
+def refresh(force=False):
+	"""
+	Count the days that closed since each user's newest cached day into
+	`completion_stat`. Does nothing if the request's database's cache was
+	refreshed by this process in the last REFRESH_SECONDS, unless `force`.
+	Return the number of rows added (0 if another process added them at the
+	same time).
+
+	:param bool force
+	"""
+	database = routing.current()
+	with _refresh_lock:
+		if not force and \
+				time.time() - _refreshed_at.get(database, 0) < REFRESH_SECONDS:
+			return 0
+		_refreshed_at[database] = time.time()
+
+	cached = aliased(CompletionStat)
+	newest = db.session.query(func.max(cached.date)).\
+			filter(cached.user_id == Day.user_id).correlate(Day).as_scalar()
+	counts = db.session.query(Day.user_id, Day.date,
+			func.extract("dow", Day.date), Event.activity_id, func.count(Event.id),
+			func.sum(case([(Event.completed == True, 1)], else_=0))).\
+			join(Event, Event.day_id == Day.id).\
+			join(Activity, Activity.id == Event.activity_id).\
+			filter(Day.date < _closed_before()).\
+			filter(Day.date > func.coalesce(newest, datetime(1970, 1, 1))).\
+			group_by(Day.user_id, Day.date, Event.activity_id)
+	insert = CompletionStat.__table__.insert().from_select(["user_id", "date",
+			"weekday", "activity_id", "event_count", "completed_count"],
+			counts.subquery().select())
+	try:
+		added = db.session.execute(insert).rowcount
+		db.session.commit()
+	except IntegrityError:
+		# Another process counted the same days first; the cache is filled.
+		db.session.rollback()
+		return 0
+	except:
+		db.session.rollback()
+		raise
+	return added
+
+def invalidate(user_id, date):
+	"""
+	Drop a user's cached counts from a date on, e.g. after a check-in for a
+	closed day. The next refresh counts those days again.
+
+	:param int user_id: `User.id`\n
+	:param datetime date
+	"""
+	CompletionStat.query.filter(CompletionStat.user_id == user_id).\
+			filter(CompletionStat.date >= date).delete(synchronize_session=False)
+
+def rebuild():
+	"""
+	Empty the cache and count every closed day again.
+	"""
+	CompletionStat.query.delete()
+	db.session.commit()
+	return refresh(force=True)
+
+def _grouped(columns, user_id=None, days=None):
+	query = db.session.query(*(columns + [func.sum(CompletionStat.event_count),
+			func.sum(CompletionStat.completed_count)]))
+	if user_id is not None:
+		query = query.filter(CompletionStat.user_id == user_id)
+	if days is not None:
+		query = query.filter(CompletionStat.date >= _today() - timedelta(days=days))
+	return query.group_by(*columns)
+
+def by_activity(user_id=None, days=None):
+	"""
+	Return {activity_id: (events, completed)} over the closed days, with
+	`activity_id` being `Activity.id`.
+
+	:param int user_id: only this `User.id`, or None for everyone\n
+	:param int days: only the last N days, or None for all of them
+	"""
+	query = _grouped([CompletionStat.activity_id], user_id, days)
+	return dict((activity_id, (events, completed))
+			for activity_id, events, completed in query)
+
+def by_user(days=None):
+	"""
+	Return {user_id: (events, completed)} over the closed days.
+
+	:param int days: only the last N days, or None for all of them
+	"""
+	query = _grouped([CompletionStat.user_id], days=days)
+	return dict((user_id, (events, completed))
+			for user_id, events, completed in query)
+
+def by_weekday(user_id=None, days=None):
+	"""
+	Return {weekday: (events, completed)} over the closed days, with
+	0 = Sunday.
+
+	:param int user_id: only this `User.id`, or None for everyone\n
+	:param int days: only the last N days, or None for all of them
+	"""
+	query = _grouped([CompletionStat.weekday], user_id, days)
+	return dict((int(weekday), (events, completed))
+			for weekday, events, completed in query)
@@ -0,0 +1,186 @@
+"""
+Search for the system error log (`/admin/system_logs`), which lists error
+groups (see background/errorgroups.py): each distinct error once, with its
+count and when it was first and last seen.\n
+On SQLite, `error_group.summary`, `origin` and `message` are indexed in an
+FTS5 table, `error_group_fts`, which triggers keep in step with
+`error_group` whoever writes it. On PostgreSQL the same columns get a
+trigram index (pg_trgm) and are searched with ILIKE. Elsewhere, or if
+neither is available, the search falls back to LIKE. The index is created
+the first time it's needed.\n
+Groups move up the list as errors come in, so pages are numbered rather
+than keyed; there are far fewer groups than raw errors.\n
+Created on 10/19/2026.
+"""
+
+import logging, re, threading, time
+from sqlalchemy import column, literal_column, or_, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import joinedload
+from app import db, routing
+from app.models import Error, ErrorGroup
+
+PAGE_SIZE = 50
+# Seconds the list of origins is reused for the filter menu.
+ORIGINS_CACHE_SECONDS = 60
+
+FTS, TRIGRAM, LIKE = "fts5", "trigram", "like"
+
+# How the groups can be ordered (`?sort=`).
+SORTS = {
+	"recent": [ErrorGroup.last_seen.desc(), ErrorGroup.id.desc()],
+	"count": [ErrorGroup.count.desc(), ErrorGroup.last_seen.desc(),
+			ErrorGroup.id.desc()]
+}
+
+_SQLITE_INDEX = [
+	# The index of raw errors used before they were grouped.
+	"DROP TRIGGER IF EXISTS error_fts_insert",
+	"DROP TRIGGER IF EXISTS error_fts_delete",
+	"DROP TRIGGER IF EXISTS error_fts_update",
+	"DROP TABLE IF EXISTS error_fts",
+	"CREATE VIRTUAL TABLE IF NOT EXISTS error_group_fts USING fts5(summary, "
+			"origin, message, content='error_group', content_rowid='id')",
+	"CREATE TRIGGER IF NOT EXISTS error_group_fts_insert AFTER INSERT ON "
+			"error_group BEGIN INSERT INTO error_group_fts(rowid, summary, origin, "
+			"message) VALUES (new.id, new.summary, new.origin, new.message); END",
+	"CREATE TRIGGER IF NOT EXISTS error_group_fts_delete AFTER DELETE ON "
+			"error_group BEGIN INSERT INTO error_group_fts(error_group_fts, rowid, "
+			"summary, origin, message) VALUES ('delete', old.id, old.summary, "
+			"old.origin, old.message); END",
+	# Only when the text changes, not on every new occurrence.
+	"CREATE TRIGGER IF NOT EXISTS error_group_fts_update AFTER UPDATE OF "
+			"summary, origin, message ON error_group BEGIN INSERT INTO "
+			"error_group_fts(error_group_fts, rowid, summary, origin, message) "
+			"VALUES ('delete', old.id, old.summary, old.origin, old.message); "
+			"INSERT INTO error_group_fts(rowid, summary, origin, message) VALUES "
+			"(new.id, new.summary, new.origin, new.message); END",
+	"INSERT INTO error_group_fts(error_group_fts) VALUES ('rebuild')"
+]
+_TRIGRAM_EXPRESSION = "(coalesce(summary, '') || ' ' || coalesce(origin, '') " \
+		"|| ' ' || coalesce(message, ''))"
+_POSTGRES_INDEX = [
+	"CREATE EXTENSION IF NOT EXISTS pg_trgm",
+	"DROP INDEX IF EXISTS error_search_trgm",
+	"CREATE INDEX IF NOT EXISTS error_group_search_trgm ON error_group USING "
+			"gin ({} gin_trgm_ops)".format(_TRIGRAM_EXPRESSION)
+]
+
+_modes = {}
+_install_lock = threading.Lock()
+_origins = {}	# database -> {"at": time, "values": origins}
+
+def _run(engine, statements):
+	with engine.begin() as conn:
+		for statement in statements:
+			conn.execute(text(statement))
+
+def _installed_mode(engine):
+	dialect = engine.dialect.name
+	if dialect == "sqlite":
+		with engine.connect() as conn:
+			found = conn.execute(text("SELECT 1 FROM sqlite_master WHERE "
+					"name = 'error_group_fts'")).scalar()
+		if not found:
+			_run(engine, _SQLITE_INDEX)
+		return FTS
+	if dialect == "postgresql":
+		_run(engine, _POSTGRES_INDEX)
+		return TRIGRAM
+	return LIKE
+
+def install():
+	"""
+	Create the search index for the request's database (see app.routing) if
+	it doesn't exist yet, and return how it's searched: FTS, TRIGRAM or LIKE.
+	Runs once per process and database.
+	"""
+	engine = routing.engine()
+	url = str(engine.url)
+	if url not in _modes:
+		with _install_lock:
+			if url not in _modes:
+				try:
+					_modes[url] = _installed_mode(engine)
+				except DBAPIError as e:
+					# E.g. SQLite without FTS5, or no rights to add pg_trgm.
+					logging.warning("Error log search falls back to LIKE: "
+							"{}".format(e))
+					_modes[url] = LIKE
+	return _modes[url]
+
+def _terms(query):
+	return re.findall(r"\w+", query or "", re.UNICODE)
+
+def _fts_query(terms):
+	# Every word, as a prefix, so "fitb tok" finds "Fitbit token".
+	return " ".join('"{}"*'.format(term) for term in terms)
+
+def search(query=None, user_id=None, origin=None, since=None, until=None,
+		sort="recent", page=0, limit=PAGE_SIZE):
+	"""
+	Return up to `limit` `ErrorGroup` rows matching all the given filters,
+	with their users loaded, most recent or most frequent first.
+
+	:param String query: words that must all appear in the summary, origin or
+	message (as word prefixes with FTS5)\n
+	:param int user_id: `User.id`\n
+	:param String origin: the exact origin\n
+	:param datetime since: seen from this time on\n
+	:param datetime until: seen before this time\n
+	:param String sort: a key of SORTS\n
+	:param int page: pages of `limit` groups to skip\n
+	:param int limit
+	"""
+	rows = ErrorGroup.query.options(joinedload(ErrorGroup.user))
+	terms = _terms(query)
+	if terms:
+		mode = install()
+		if mode == FTS:
+			matches = text("SELECT rowid FROM error_group_fts WHERE "
+					"error_group_fts MATCH :match").bindparams(
+					match=_fts_query(terms)).columns(column("rowid"))
+			rows = rows.filter(ErrorGroup.id.in_(matches))
+		else:
+			searched = literal_column(_TRIGRAM_EXPRESSION) if mode == TRIGRAM \
+					else None
+			for term in terms:
+				pattern = "%{}%".format(term)
+				if searched is not None:
+					rows = rows.filter(searched.ilike(pattern))
+				else:
+					rows = rows.filter(or_(ErrorGroup.summary.ilike(pattern),
+							ErrorGroup.origin.ilike(pattern),
+							ErrorGroup.message.ilike(pattern)))
+	if user_id is not None:
+		rows = rows.filter(ErrorGroup.user_id == user_id)
+	if origin:
+		rows = rows.filter(ErrorGroup.origin == origin)
+	if since is not None:
+		rows = rows.filter(ErrorGroup.last_seen >= since)
+	if until is not None:
+		rows = rows.filter(ErrorGroup.first_seen < until)
+	return rows.order_by(*SORTS.get(sort, SORTS["recent"])).\
+			offset(page * limit).limit(limit).all()
+
+def samples(group_id, limit=PAGE_SIZE):
+	"""
+	Return the newest `limit` raw `Error` rows kept for a group.
+
+	:param int group_id\n
+	:param int limit
+	"""
+	return Error.query.filter(Error.group_id == group_id).\
+			order_by(Error.id.desc()).limit(limit).all()
+
+def origins():
+	"""
+	Return the distinct origins, for the filter menu. Cached for
+	ORIGINS_CACHE_SECONDS.
+	"""
+	cached = _origins.setdefault(routing.current(), {"at": 0, "values": []})
+	if time.time() - cached["at"] >= ORIGINS_CACHE_SECONDS:
+		cached["values"] = [origin for (origin,) in db.session.query(
+				ErrorGroup.origin).distinct().order_by(ErrorGroup.origin) if origin]
+		cached["at"] = time.time()
+	return cached["values"]
@@ -4,14 +4,22 @@ Created by Abigail Franz on 3/12/2018.\n
 Last modified by Abigail Franz on 3/26/2018.
 """
 
-from flask import render_template
-from app import app, db
+from flask import Blueprint, render_template
+from app import db
+from background import breakers
 
-@app.errorhandler(404)
+bp = Blueprint("errors", __name__)
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
 	return render_template("404.html"), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
 	db.session.rollback()
-	return render_template("500.html"), 500
\ No newline at end of file
+	return render_template("500.html"), 500
+
+@bp.app_errorhandler(breakers.CircuitOpen)
+def upstream_unavailable(error):
+	db.session.rollback()
+	return render_template("500.html"), 503
@@ -35,6 +35,7 @@ class AdminRegistrationForm(FlaskForm):
 
 class UserLoginForm(FlaskForm):
 	username = StringField("Username", validators=[DataRequired()])
+	timezone = HiddenField("Time zone")	# Filled in by the browser
 	submit = SubmitField("Next")
 
 class UserWcLoginForm(FlaskForm):
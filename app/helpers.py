@@ -4,17 +4,63 @@ Created by Abigail Franz on 3/13/2018\.n
 Last modified by Abigail Franz on 5/5/2018.
 """
 import logging, sys
-import json, requests
-from datetime import datetime, timedelta, MAXYEAR
-from background import db
+import json, os, requests, threading
+from datetime import datetime
+from app import db
 from app.models import Activity
+from background import breakers, wcdecode
 
 logging.basicConfig(stream=sys.stderr, level=logging.DEBUG)
 
 
-WC_URL = "https://palalinq.herokuapp.com/api/People"
+WC_URL = (os.environ.get("WECONNECT_API_URL") or
+		"https://palalinq.herokuapp.com/api") + "/People"
 WC_DATE_FMT = "%Y-%m-%dT%H:%M:%S.%fZ"
-TODAY = datetime(datetime.now().year, datetime.now().month, datetime.now().day)
+# Seconds to wait for WEconnect to connect or respond.
+WC_TIMEOUT = 30
+# Keep-alive connections to WEconnect per worker process; at least as many as
+# the worker's threads (or greenlets) that may call it at once.
+WC_POOL_SIZE = int(os.environ.get("PT_HTTP_POOL_SIZE") or 10)
+
+_http = None
+_http_lock = threading.Lock()
+
+def _http_session():
+	"""
+	Return this worker process's pooled `requests` session, made on first use.
+	"""
+	global _http
+	if _http is None:
+		with _http_lock:
+			if _http is None:
+				session = requests.Session()
+				adapter = requests.adapters.HTTPAdapter(pool_connections=2,
+						pool_maxsize=WC_POOL_SIZE)
+				session.mount("http://", adapter)
+				session.mount("https://", adapter)
+				_http = session
+	return _http
+
+def reset_http():
+	"""
+	Forget the pooled session, e.g. in a freshly forked worker; the next
+	request makes a new one.
+	"""
+	global _http
+	_http = None
+
+def _wc_request(endpoint, method, url, **kwargs):
+	"""
+	Make a request to WEconnect with this worker's pooled session, counting
+	and timing it in the metrics store. Goes through the same circuit breaker
+	as the background scripts (breakers.call), so while WEconnect is down this
+	raises breakers.CircuitOpen at once (see errors.py).
+
+	:param String endpoint: the name of the calling function
+	"""
+	kwargs.setdefault("timeout", WC_TIMEOUT)
+	return breakers.call("weconnect", endpoint,
+			lambda: _http_session().request(method, url, **kwargs))
 
 def login_to_wc(email, password):
 	"""
@@ -30,7 +76,7 @@ def login_to_wc(email, password):
 	"""
 	url = "{}/login".format(WC_URL)
 	data = {"email": email, "password": password}
-	result = requests.post(url, data=data)
+	result = _wc_request("login_to_wc", "POST", url, data=data)
 	if result.status_code != 200:
 		return False, ()
 		
@@ -49,13 +95,13 @@ def check_wc_token_status(wc_user_id, wc_token):
 		CHECK TOKEN STATUS (401 AUTH ERROR)
 	"""
 	url = "{}/{}?access_token={}".format(WC_URL, wc_user_id, wc_token) 
-	result = requests.get(url)
+	result = _wc_request("check_wc_token_status", "GET", url)
 	logging.debug("Result: {}".format(result.status_code))
 	if result.status_code != 200:
-		print("Response: {}").format("Token invalid" if result.status_code == 401 else result.status_code)
+		print("Response: {}".format("Token invalid" if result.status_code == 401 else result.status_code))
 		return False
 	else:
-		print("Token for User {} is good").format(wc_user_id)
+		print("Token for User {} is good".format(wc_user_id))
 		return True
 
 
@@ -67,14 +113,34 @@ def get_wc_activities(user):
 
 	:param app.models.User user: a user from the database
 	"""
-	url = "{}/{}/activities?access_token={}".format(WC_URL, user.wc_id, 
-			user.wc_token)
-	response = requests.get(url)
+	return save_wc_activities(user, fetch_wc_activities(user.wc_id,
+			user.wc_token))
+
+def fetch_wc_activities(wc_id, wc_token):
+	"""
+	Get a user's activities from WEconnect, as a list of
+	background.wcdecode.WcActivity records (empty if the request was
+	unsuccessful). Doesn't touch the database, so a route
+	can call it without holding a connection.
+
+	:param wc_id: the user's WEconnect ID\n
+	:param String wc_token: the user's WEconnect access token
+	"""
+	url = "{}/{}/activities?access_token={}".format(WC_URL, wc_id, wc_token)
+	response = _wc_request("get_wc_activities", "GET", url)
 	if response.status_code != 200:
 		# Return an empty list if the request was unsuccessful
 		return []
-	parsed = response.json()
+	return wcdecode.activities(response.json())
 
+def save_wc_activities(user, parsed):
+	"""
+	Store the unexpired activities from fetch_wc_activities in the database.
+	Returns a list of app.model.Activity objects.
+
+	:param app.models.User user\n
+	:param list parsed: activities from fetch_wc_activities
+	"""
 	#TODO: EVERYTHING PAST HERE MODIFIED TO use WECONNECT.PY
 	# Data to use: user, activity
 	acts = []
@@ -90,25 +156,15 @@ def get_wc_activities(user):
 	
 def wc_json_to_db(wc_act, user):
 	"""
-	Given a JSON activity object from WEconnect, convert it to an Activity
-	object compatible with the database.
+	Given a decoded WEconnect activity, convert it to an Activity object
+	compatible with the database.
 
-	:param dict wc_act: an activity from WEconnect in JSON format
+	:param background.wcdecode.WcActivity wc_act
 	:param app.models.User user
 	"""
-	# Determine the start and end times
-	ts = datetime.strptime(wc_act["dateStart"], WC_DATE_FMT)
-	te = ts + timedelta(minutes=wc_act["duration"])
-
-	# Determine the expiration date (if any)
-	expiration = datetime(MAXYEAR, 12, 31)
-	if wc_act["repeat"] == "never":
-		expiration = te
-	if wc_act["repeatEnd"] != None:
-		expiration = datetime.strptime(wc_act["repeatEnd"], WC_DATE_FMT)
-
-	activity = Activity(wc_act_id=wc_act["activityId"], name=wc_act["name"],
-			expiration=expiration, user=user)
+	activity = Activity(wc_act_id=wc_act.activity_id, name=wc_act.name,
+			expiration=wc_act.expiration, start_time=wc_act.start,
+			duration=wc_act.duration, repeat=wc_act.repeat, user=user)
 	return activity
 
 def complete_fb_login(fb_response):
@@ -0,0 +1,125 @@
+"""
+Push ingestion of WEconnect check-ins for the PowerToken Flask app.\n
+WEconnect (or a local relay, see bench/send_checkin.py) POSTs a JSON check-in
+to /hooks/checkin, signed with CHECKIN_HOOK_SECRET:\n
+	{"personId": 123, "eid": "456-20181019", "didCheckin": true}\n
+	X-PowerToken-Signature: sha256=<hex HMAC-SHA256 of the body>\n
+The matching event is updated at once, and a progress recompute and Fitbit
+push for that user only (background/push.py) is queued to a worker thread.
+Both run under the user's lock (background/locks.py), so they can't race the
+regular poller. Without CHECKIN_HOOK_SECRET the endpoint doesn't exist.\n
+Created on 10/19/2026.
+"""
+
+import hashlib, hmac, os, queue, subprocess, sys, threading
+from flask import Blueprint, abort, current_app, jsonify, request
+from app import analytics, db, routing
+from app.models import Day, Event, User
+from background import locks, metrics, usertime
+
+BACKGROUND_DIR = os.path.join(os.path.dirname(os.path.dirname(
+		os.path.abspath(__file__))), "background")
+bp = Blueprint("hooks", __name__)
+SIGNATURE_HEADER = "X-PowerToken-Signature"
+
+# Seconds a check-in waits for the poller to finish with the same user.
+HOOK_LOCK_TIMEOUT = 10
+
+_queue = queue.Queue()
+_pending = set()
+_pending_lock = threading.Lock()
+_worker = None
+
+def sign(body, secret):
+	"""
+	Return the signature header value for a request body.
+
+	:param bytes body\n
+	:param String secret
+	"""
+	return "sha256=" + hmac.new(secret.encode("utf-8"), body,
+			hashlib.sha256).hexdigest()
+
+def _push_worker(app):
+	env = dict(os.environ)
+	env["DATABASE_URL"] = app.config["SQLALCHEMY_DATABASE_URI"]
+	while True:
+		database, user_id = _queue.get()
+		# A check-in arriving from now on needs another push.
+		with _pending_lock:
+			_pending.discard((database, user_id))
+		# push.py works on the database of PT_COHORT (see background/cohorts.py).
+		env["PT_COHORT"] = database
+		try:
+			subprocess.call([sys.executable, "push.py", "--user", str(user_id)],
+					cwd=BACKGROUND_DIR, env=env)
+		except OSError:
+			app.logger.exception("Progress push for user {} failed".format(
+					user_id))
+		_queue.task_done()
+
+def enqueue_push(user_id, database=None):
+	"""
+	Queue a progress recompute and Fitbit push for one user. A user already
+	waiting in the queue isn't queued twice. Return True if queued.
+
+	:param int user_id: `User.id`\n
+	:param String database: the user's cohort database, None for the
+	request's (see app.routing)
+	"""
+	global _worker
+	key = (database or routing.current(), user_id)
+	with _pending_lock:
+		if key in _pending:
+			return False
+		_pending.add(key)
+		if _worker is None or not _worker.is_alive():
+			_worker = threading.Thread(target=_push_worker, name="pt-push",
+					args=(current_app._get_current_object(),))
+			_worker.daemon = True
+			_worker.start()
+	_queue.put(key)
+	return True
+
+def _hook_result(result, status, **body):
+	metrics.inc("pt_checkin_hooks_total", result=result)
+	body["result"] = result
+	return jsonify(body), status
+
+@bp.route("/hooks/checkin", methods=["POST"])
+def checkin_hook():
+	secret = current_app.config.get("CHECKIN_HOOK_SECRET")
+	if not secret:
+		abort(404)
+	body = request.get_data()
+	signature = request.headers.get(SIGNATURE_HEADER, "")
+	if not hmac.compare_digest(signature, sign(body, secret)):
+		return _hook_result("unauthorized", 401)
+
+	checkin = request.get_json(force=True, silent=True)
+	if not isinstance(checkin, dict) or "personId" not in checkin or \
+			"eid" not in checkin:
+		return _hook_result("invalid", 400)
+
+	database = routing.use_user(wc_id=checkin["personId"])
+	user = User.query.filter_by(wc_id=checkin["personId"]).first()
+	if user is None:
+		return _hook_result("unknown_user", 404)
+	try:
+		with locks.user_lock(user.id, timeout=HOOK_LOCK_TIMEOUT,
+				database=database):
+			event = Event.query.join(Day).filter(Day.user_id == user.id).\
+					filter(Event.eid == checkin["eid"]).first()
+			if event is None:
+				# The poller hasn't seen this event yet and will pick it up.
+				return _hook_result("unknown_event", 404)
+			event.completed = bool(checkin.get("didCheckin", True))
+			if event.day.date < usertime.today(user):
+				# A late check-in for a closed day: recount its completion.
+				analytics.invalidate(user.id, event.day.date)
+			db.session.commit()
+	except locks.LockTimeout:
+		return _hook_result("busy", 503)
+
+	queued = enqueue_push(user.id, database)
+	return _hook_result("accepted", 202, queued=queued)
@@ -8,6 +8,8 @@ from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from app import db, login
+from app.routing import RoutingSession
+from background import progresshook, usertime
 
 @login.user_loader
 def load_admin(id):
@@ -20,15 +22,28 @@ class User(db.Model):
 	"""
 	id = db.Column(db.Integer, primary_key=True)
 	username = db.Column(db.String(64), index=True, unique=True)
-	registered_on = db.Column(db.DateTime, index=True, default=datetime.now())
+	registered_on = db.Column(db.DateTime, index=True, default=datetime.now)
 	goal_period = db.Column(db.String(16), default="daily")
 	wc_id = db.Column(db.Integer, unique=True)
 	wc_token = db.Column(db.String(128))
 	fb_token = db.Column(db.String(256))
-	logs = db.relationship("Log", backref="user", lazy="dynamic")
-	activities = db.relationship("Activity", backref="user", lazy="dynamic")
-	errors = db.relationship("Error", backref="user", lazy="dynamic")
-	days = db.relationship("Day", backref="user", lazy="dynamic")
+	shard = db.Column(db.Integer, index=True)	# Assigned by the background poller
+	shard_count = db.Column(db.Integer)
+	timezone = db.Column(db.String(64))	# IANA name; None means server time
+	maintained_on = db.Column(db.DateTime)	# Set by background/maintenance.py
+	cohort = db.Column(db.String(32), index=True)	# See app/routing.py
+	logs = db.relationship("Log", backref="user", lazy="dynamic",
+			passive_deletes=True)
+	log_summaries = db.relationship("LogSummary", backref="user", lazy="dynamic",
+			passive_deletes=True)
+	activities = db.relationship("Activity", backref="user", lazy="dynamic",
+			passive_deletes=True)
+	errors = db.relationship("Error", backref="user", lazy="dynamic",
+			passive_deletes=True)
+	error_groups = db.relationship("ErrorGroup", backref="user",
+			lazy="dynamic", passive_deletes=True)
+	days = db.relationship("Day", backref="user", lazy="dynamic",
+			passive_deletes=True)
 
 	def __repr__(self):
 		return "<User {}>".format(self.username)
@@ -43,9 +58,14 @@ class Activity(db.Model):
 	wc_act_id = db.Column(db.Integer, index=True, unique=True)
 	name = db.Column(db.String(256))
 	expiration = db.Column(db.DateTime, index=True)
+	start_time = db.Column(db.DateTime)	# First occurrence (UTC)
+	duration = db.Column(db.Integer)	# Minutes
+	repeat = db.Column(db.String(16))
 	weight = db.Column(db.Integer, default=1)
-	user_id = db.Column(db.Integer, db.ForeignKey("user.wc_id"))
-	events = db.relationship("Event", backref="activity", lazy="dynamic")
+	user_id = db.Column(db.Integer, db.ForeignKey("user.id",
+			ondelete="CASCADE"))
+	events = db.relationship("Event", backref="activity", lazy="dynamic",
+			passive_deletes=True)
 
 	def __repr__(self):
 		return "<Activity '{}'>".format(self.name)
@@ -58,10 +78,13 @@ class Event(db.Model):
 	"""
 	id = db.Column(db.Integer, primary_key=True)
 	eid = db.Column(db.String, index=True)
-	start_time = db.Column(db.DateTime)	# Date portion is ignored
+	start_time = db.Column(db.DateTime)	# User's local time; date portion is ignored
+	end_time = db.Column(db.DateTime)	# Date portion is ignored
 	completed = db.Column(db.Boolean) #Setup in polling.py for "didCheckin" == True
-	day_id = db.Column(db.Integer, db.ForeignKey("day.id"))
-	activity_id = db.Column(db.Integer, db.ForeignKey("activity.wc_act_id"))
+	day_id = db.Column(db.Integer, db.ForeignKey("day.id", ondelete="CASCADE"))
+	# The background scripts store the local `activity.id` here.
+	activity_id = db.Column(db.Integer, db.ForeignKey("activity.id",
+			ondelete="CASCADE"))
 
 	def __repr__(self):
 		output = "<Event '{}' at {}>".format(self.eid, 
@@ -78,8 +101,10 @@ class Day(db.Model):
 	id = db.Column(db.Integer, primary_key=True)
 	date = db.Column(db.DateTime, index=True)
 	computed_progress = db.Column(db.Float, default=0.0)
-	user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
-	events = db.relationship("Event", backref="day", lazy="dynamic")
+	user_id = db.Column(db.Integer, db.ForeignKey("user.id",
+			ondelete="CASCADE"))
+	events = db.relationship("Event", backref="day", lazy="dynamic",
+			passive_deletes=True)
 
 	def __repr__(self):
 		return "<Day {}>".format(self.date.strftime("%Y-%m-%d"))
@@ -108,26 +133,136 @@ class Log(db.Model):
 	Represents a WEconnect-Fitbit progress log.
 	"""
 	id = db.Column(db.Integer, primary_key=True)
-	timestamp = db.Column(db.DateTime, index=True, default=datetime.now())
+	timestamp = db.Column(db.DateTime, index=True, default=datetime.now)
 	wc_progress = db.Column(db.Float)
 	fb_step_count = db.Column(db.Integer)
-	user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+	user_id = db.Column(db.Integer, db.ForeignKey("user.id",
+			ondelete="CASCADE"))
 
 	def __repr__(self):
 		timestr = self.timestamp.strftime("%Y-%m-%d %I:%M %p")
 		return "<Log {} at {}>".format(self.user.username, timestr)
 
+class LogSummary(db.Model):
+	"""
+	Represents one user's progress logs for one day, rolled up once the raw
+	logs have aged out (see background/retention.py).
+	"""
+	id = db.Column(db.Integer, primary_key=True)
+	date = db.Column(db.DateTime, index=True)
+	log_count = db.Column(db.Integer)
+	min_wc_progress = db.Column(db.Float)
+	max_wc_progress = db.Column(db.Float)
+	max_fb_step_count = db.Column(db.Integer)
+	user_id = db.Column(db.Integer, db.ForeignKey("user.id",
+			ondelete="CASCADE"), index=True)
+
+	def __repr__(self):
+		return "<LogSummary {} for {}>".format(self.date.strftime("%Y-%m-%d"),
+				self.user.username)
+
+class ProgressState(db.Model):
+	"""
+	Running progress totals for one user's current day, kept up to date by
+	the background progress engine (see background/progress.py), whose
+	session hook is installed on the app's sessions too (see the end of this
+	file). Delete a user's row to make the engine recompute from scratch.
+	"""
+	id = db.Column(db.Integer, primary_key=True)
+	date = db.Column(db.DateTime)
+	possible_score = db.Column(db.Integer, default=0)
+	score = db.Column(db.Integer, default=0)
+	fade = db.Column(db.String(64))
+	event_count = db.Column(db.Integer, default=0)
+	completed_count = db.Column(db.Integer, default=0)
+	user_id = db.Column(db.Integer, db.ForeignKey("user.id",
+			ondelete="CASCADE"), unique=True)
+
+	def __repr__(self):
+		return "<ProgressState for {}>".format(self.user_id)
+
+class CompletionStat(db.Model):
+	"""
+	How many of one activity's events one user had, and completed, on one
+	closed day. A cache kept by app/analytics.py for the adherence views.
+	"""
+	__tablename__ = "completion_stat"
+	__table_args__ = (db.UniqueConstraint("user_id", "date", "activity_id"),)
+	id = db.Column(db.Integer, primary_key=True)
+	date = db.Column(db.DateTime, index=True)
+	weekday = db.Column(db.Integer)	# 0 = Sunday
+	event_count = db.Column(db.Integer, default=0)
+	completed_count = db.Column(db.Integer, default=0)
+	activity_id = db.Column(db.Integer, db.ForeignKey("activity.id",
+			ondelete="CASCADE"))
+	user_id = db.Column(db.Integer, db.ForeignKey("user.id",
+			ondelete="CASCADE"), index=True)
+
+	def __repr__(self):
+		return "<CompletionStat {} for {}>".format(
+				self.date.strftime("%Y-%m-%d"), self.user_id)
+
+class MaintenanceStep(db.Model):
+	"""
+	When one of a user's daily maintenance steps last finished, and its
+	outcome. Kept by background/maintenance.py.
+	"""
+	__tablename__ = "maintenance_step"
+	__table_args__ = (db.UniqueConstraint("user_id", "step"),)
+	id = db.Column(db.Integer, primary_key=True)
+	step = db.Column(db.String(32))
+	date = db.Column(db.DateTime)	# The user's day it finished on
+	result = db.Column(db.String(64))
+	finished_at = db.Column(db.DateTime, default=datetime.now)
+	user_id = db.Column(db.Integer, db.ForeignKey("user.id",
+			ondelete="CASCADE"), index=True)
+
+	def __repr__(self):
+		return "<MaintenanceStep {} for {}>".format(self.step, self.user_id)
+
+class ErrorGroup(db.Model):
+	"""
+	All the occurrences of one error for one user, counted by
+	background/errorgroups.py.
+	"""
+	__tablename__ = "error_group"
+	id = db.Column(db.Integer, primary_key=True)
+	fingerprint = db.Column(db.String(40), unique=True)
+	summary = db.Column(db.String(64))
+	origin = db.Column(db.String(256), index=True)
+	message = db.Column(db.String(256))
+	first_seen = db.Column(db.DateTime)
+	last_seen = db.Column(db.DateTime, index=True)
+	count = db.Column(db.Integer, default=1, index=True)
+	user_id = db.Column(db.Integer, db.ForeignKey("user.id",
+			ondelete="CASCADE"), index=True)
+	errors = db.relationship("Error", backref="group", lazy="dynamic",
+			passive_deletes=True)
+
+	def __repr__(self):
+		return "<ErrorGroup '{}' x{}>".format(self.summary, self.count)
+
 class Error(db.Model):
 	"""
-	Represents an error that occurred somewhere in the application(s).
+	Represents an error that occurred somewhere in the application(s). Only
+	a sample of each group's occurrences is kept.
 	"""
 	id = db.Column(db.Integer, primary_key=True)
-	timestamp = db.Column(db.DateTime, default=datetime.now())
+	timestamp = db.Column(db.DateTime, index=True, default=datetime.now)
 	summary = db.Column(db.String(64))
-	origin = db.Column(db.String(256))
+	origin = db.Column(db.String(256), index=True)
 	message = db.Column(db.String(256))
 	traceback = db.Column(db.String(1048))
-	user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+	user_id = db.Column(db.Integer, db.ForeignKey("user.id",
+			ondelete="CASCADE"), index=True)
+	group_id = db.Column(db.Integer, db.ForeignKey("error_group.id",
+			ondelete="SET NULL"), index=True)
 
 	def __repr__(self):
-		return "<Error '{}', '{}'>".format(self.summary, self.message)
\ No newline at end of file
+		return "<Error '{}', '{}'>".format(self.summary, self.message)
+
+# Check-ins and weight changes made here update the progress engine's running
+# totals in the same flush, as the background scripts' changes do.
+progresshook.install(RoutingSession, {"Activity": Activity, "Day": Day,
+		"Event": Event, "ProgressState": ProgressState, "User": User},
+		usertime.today)
@@ -0,0 +1,29 @@
+"""
+Records request latency for the PowerToken Flask app in the shared metrics
+store (see background/metrics.py).\n
+Created on 10/19/2026.
+"""
+
+import time
+from flask import Blueprint, g, request
+from background import metrics
+
+bp = Blueprint("monitoring", __name__)
+
+metrics.instrument_commits()
+
+@bp.before_app_request
+def start_request_timer():
+	g.request_start = time.time()
+
+@bp.after_app_request
+def record_request_latency(response):
+	start = getattr(g, "request_start", None)
+	if start is not None:
+		endpoint = request.endpoint or "unmatched"
+		metrics.observe("pt_http_request_seconds", time.time() - start,
+				endpoint=endpoint)
+		metrics.inc("pt_http_requests_total", endpoint=endpoint,
+				status=response.status_code)
+		metrics.maybe_flush()
+	return response
@@ -0,0 +1,94 @@
+"""
+Per-request SQL profiling for the PowerToken Flask app.\n
+When SQL_PROFILING is on, every statement run while handling a request is
+counted and timed. The totals are sent back in response headers, statements
+that repeat with the same shape (the usual sign of an N+1 lazy load) are
+flagged, and slow or query-heavy requests are logged with their most
+expensive statements. When SQL_PROFILING is off, nothing is registered.\n
+Created on 10/19/2026.
+"""
+
+import re, time
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# A statement shape that runs at least this many times in one request is
+# reported as a repeated (N+1) shape.
+REPEAT_THRESHOLD = 5
+TOP_STATEMENTS = 5
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_in_lists = re.compile(r"\bIN \((?:\?(?:, )?)+\)", re.IGNORECASE)
+_spaces = re.compile(r"\s+")
+
+def statement_shape(statement):
+	"""
+	Reduce a SQL statement to its shape, so that the same query with
+	different parameters counts as one.
+	"""
+	shape = _spaces.sub(" ", statement).strip()
+	shape = _literals.sub("?", shape)
+	return _in_lists.sub("IN (...)", shape)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+		executemany):
+	if has_request_context() and "sql_profile" in g:
+		context._pt_query_start = time.time()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+		executemany):
+	if not has_request_context() or "sql_profile" not in g:
+		return
+	start = getattr(context, "_pt_query_start", None)
+	elapsed = time.time() - start if start is not None else 0.0
+	shapes = g.sql_profile["shapes"]
+	shape = statement_shape(statement)
+	count, total = shapes.get(shape, (0, 0.0))
+	shapes[shape] = (count + 1, total + elapsed)
+	g.sql_profile["count"] += 1
+	g.sql_profile["seconds"] += elapsed
+
+def start_profile():
+	g.sql_profile = {"start": time.time(), "count": 0, "seconds": 0.0,
+			"shapes": {}}
+
+def finish_profile(response):
+	profile = g.pop("sql_profile", None)
+	if profile is None:
+		return response
+	total_ms = (time.time() - profile["start"]) * 1000.0
+	sql_ms = profile["seconds"] * 1000.0
+	repeated = [(shape, count) for shape, (count, _) in profile["shapes"].items()
+			if count >= REPEAT_THRESHOLD]
+
+	response.headers["X-SQL-Queries"] = str(profile["count"])
+	response.headers["X-SQL-Time-Ms"] = "{:.1f}".format(sql_ms)
+	response.headers["X-SQL-Repeated-Shapes"] = str(len(repeated))
+	response.headers.add("Server-Timing", 'db;dur={:.1f};desc="{} queries"'.format(
+			sql_ms, profile["count"]))
+
+	if total_ms >= current_app.config["SQL_PROFILING_SLOW_MS"] or \
+			profile["count"] >= current_app.config["SQL_PROFILING_MAX_QUERIES"]:
+		top = sorted(profile["shapes"].items(), key=lambda item: -item[1][1])
+		lines = ["{:>5}x {:>8.1f} ms  {}".format(count, seconds * 1000.0,
+				shape[:200]) for shape, (count, seconds) in top[:TOP_STATEMENTS]]
+		current_app.logger.warning("Slow request {} {}: {:.1f} ms, {} statements "
+				"({:.1f} ms SQL, {} repeated shapes)\n{}".format(request.method,
+				request.full_path.rstrip("?"), total_ms, profile["count"], sql_ms,
+				len(repeated), "\n".join(lines)))
+	return response
+
+def init_app(app):
+	"""
+	Install the profiling hooks on an app, if its SQL_PROFILING is on.
+
+	:param flask.Flask app
+	"""
+	if not app.config.get("SQL_PROFILING"):
+		return
+	if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+		event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+		event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+	app.before_request(start_profile)
+	app.after_request(finish_profile)
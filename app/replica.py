@@ -0,0 +1,93 @@
+"""
+Sends the heavy admin pages' reads to the read-only snapshot of the database
+that background/snapshot.py keeps (REPLICA_PATH), so long dashboard queries
+don't contend with the poller's writes to the SQLite file.\n
+Views opt in with `@replica.reads`. Within them, the session reads from the
+snapshot (see app/routing.py), but everything it writes (flushes, INSERT,
+UPDATE and DELETE statements) still goes to the primary, as does everything
+inside `with replica.primary():`. If the snapshot is missing or older than
+REPLICA_MAX_AGE seconds, the views read the primary as before. The snapshot
+is of the default cohort's database; the other cohorts' pages always read
+their own database. `g.replica` tells the templates which one they got, and
+`g.replica_taken` and `g.replica_age` (seconds) how old the snapshot is.\n
+Created on 10/19/2026.
+"""
+
+import os, threading, time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from flask import current_app, g, has_app_context
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+from background import cohorts
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def taken_at():
+	"""
+	Return when the current snapshot was taken, in seconds since the epoch,
+	or None if there's no snapshot.
+	"""
+	path = current_app.config.get("REPLICA_PATH")
+	if not path:
+		return None
+	try:
+		return os.stat(path).st_mtime
+	except OSError:
+		return None
+
+def engine():
+	"""
+	Return the engine for the snapshot. Connections aren't pooled, so each
+	one opens the newest snapshot.
+	"""
+	path = current_app.config["REPLICA_PATH"]
+	if path not in _engines:
+		with _engines_lock:
+			if path not in _engines:
+				# The same URL as snapshot.open_engine in the background scripts.
+				_engines[path] = create_engine("sqlite:///file:{}?mode=ro&"
+						"immutable=1&uri=true".format(path), poolclass=NullPool)
+	return _engines[path]
+
+def active():
+	"""
+	Return True if the session should read from the snapshot now.
+	"""
+	return has_app_context() and g.get("replica", False)
+
+def reads(view):
+	"""
+	Decorate a view whose reads may come from the snapshot.
+	"""
+	@wraps(view)
+	def wrapper(*args, **kwargs):
+		taken = None
+		if g.get("database", cohorts.DEFAULT) == cohorts.DEFAULT:
+			taken = taken_at()
+		g.replica_taken = datetime.fromtimestamp(taken) if taken else None
+		g.replica_age = max(time.time() - taken, 0) if taken else None
+		g.replica = g.replica_age is not None and \
+				g.replica_age <= current_app.config["REPLICA_MAX_AGE"]
+		try:
+			return view(*args, **kwargs)
+		finally:
+			g.replica = False
+	return wrapper
+
+@contextmanager
+def primary():
+	"""
+	Read from the primary database inside the block, e.g. for reads that
+	decide what to write.
+	"""
+	previous = g.get("replica", False) if has_app_context() else False
+	if has_app_context():
+		g.replica = False
+	try:
+		yield
+	finally:
+		if has_app_context():
+			g.replica = previous
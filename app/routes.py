@@ -3,69 +3,119 @@ Handles routing and form processing for the PowerToken Flask app.\n
 Created by Jasmine Jones in 11/2017.\n
 Last modified by Abigail Franz on 5/2/2018.
 """
-import logging, sys
+import hmac, logging, sys, threading, time
 
-from datetime import datetime
-from flask import redirect, render_template, request, url_for
+from datetime import datetime, timedelta
+from flask import (Blueprint, abort, current_app, jsonify, redirect,
+		render_template, request, session as browser_session, url_for)
 from flask_login import current_user, login_required, login_user, logout_user
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
 from werkzeug.urls import url_parse
 from werkzeug.datastructures import MultiDict
-from app import app, db
-from app.weconnect import check_wc_token_status, login_to_wc, set_wc_activities
-from app.helpers import complete_fb_login
+from app import analytics, db, errorlog, replica, routing
+from app.helpers import (check_wc_token_status, complete_fb_login, 
+		fetch_wc_activities, login_to_wc, save_wc_activities)
 from app.forms import (AdminLoginForm, AdminRegistrationForm, UserLoginForm, 
 		UserWcLoginForm, UserActivityForm)
-from app.models import Activity, Admin, Error, Log, User
-from app.viewmodels import LogViewModel, UserViewModel, ActivityViewModel, EventLogViewModel
+from app.models import (Activity, Admin, Day, ErrorGroup, Event, Log,
+		MaintenanceStep, User)
+from app.viewmodels import (LogViewModel, UserViewModel, ActivityViewModel,
+		CompletionViewModel, EventLogViewModel)
+from background import breakers, cohorts, metrics, usertime
 
 logging.basicConfig(stream=sys.stderr, level=logging.DEBUG)
 
-@app.route("/")
-@app.route("/index")
-@app.route("/home")
+bp = Blueprint("main", __name__)
+
+def release_db():
+	'''
+	End the request's transaction, so its pooled database connection isn't
+	held while a worker waits on WEconnect. Loaded objects are detached.
+	'''
+	db.session.close()
+
+@bp.before_request
+def use_admin_cohort():
+	'''
+	Admin pages work on the cohort database the admin picked (`?cohort=`,
+	remembered in their session). User pages pick theirs per user.
+	'''
+	if not request.path.startswith("/admin"):
+		return
+	cohort = request.args.get("cohort")
+	if cohort in cohorts.databases():
+		browser_session["cohort"] = cohort
+	database = browser_session.get("cohort")
+	if database in cohorts.databases():
+		routing.use(database)
+
+@bp.app_context_processor
+def cohort_databases():
+	return {"cohort_databases": cohorts.databases(),
+			"cohort_database": routing.current()}
+
+@bp.route("/")
+@bp.route("/index")
+@bp.route("/home")
 def user_home():
 	username = request.args.get("username")
 
 	# If the user isn't logged in, redirect to the PowerToken login.
 	if username is None:
-		return redirect(url_for("user_login"))
+		return redirect(url_for("main.user_login"))
 
 	# If the user is logged in, show the welcome page.
 	else:
 		return render_template("user_home.html", username=username)
 
-@app.route("/user_login", methods=["GET", "POST"])
+@bp.route("/user_login", methods=["GET", "POST"])
 def user_login():
 	form = UserLoginForm()
 
 	# POST: Process the PowerToken login form.
 	if form.validate_on_submit():
 		username = form.username.data
+		routing.use_user(username)
 		user = User.query.filter_by(username=username).first()
+		# The browser's time zone sets where the user's days begin.
+		timezone = form.timezone.data
+		if not usertime.is_valid(timezone):
+			timezone = None
 
 		# If the user has not been added to the database, add the user to the
-		# database and redirect to the WEconnect login.
+		# database and redirect to the WEconnect login. The sign-up link's
+		# `?cohort=` picks the study cohort, and so the database.
 		if user is None:
-			user = User(username=username)
+			cohort = request.args.get("cohort")
+			if not cohorts.is_valid(cohort):
+				cohort = None
+			routing.use(cohorts.database(cohort or cohorts.DEFAULT))
+			user = User(username=username, timezone=timezone, cohort=cohort)
 			db.session.add(user)
 			db.session.commit()
-			return redirect(url_for("user_wc_login", username=username))
+			return redirect(url_for("main.user_wc_login", username=username))
+		if user.timezone is None and timezone is not None:
+			user.timezone = timezone
+			db.session.commit()
 		
 			
 		# If the user exists in the database, but the WEconnect (or Fitbit)
 		# info isn't filled out, redirect to the WEconnect login.
 		if any([not user.wc_id, not user.wc_token, not user.fb_token]):
-			return redirect(url_for("user_wc_login", username=username))
+			return redirect(url_for("main.user_wc_login", username=username))
 		
 		#TODO Add token expiry check here
 		# If user exists in the db, but token returns an error, then login again to refresh 
-		if not check_wc_token_status(user.wc_id, user.wc_token):
-			return redirect(url_for("user_wc_login", username=username))
+		wc_id, wc_token = user.wc_id, user.wc_token
+		release_db()
+		if not check_wc_token_status(wc_id, wc_token):
+			return redirect(url_for("main.user_wc_login", username=username))
 			
 			
 		# If the user exists in the database, and the WEconnect and Fitbit info
 		# is already filled out, bypass the login process.
-		return redirect(url_for("user_home", username=username))
+		return redirect(url_for("main.user_home", username=username))
 
 	# GET: Render the PowerToken login page.
 	error = request.args.get("error")
@@ -74,7 +124,7 @@ def user_login():
 	else:
 		return render_template("user_login.html", form=form)
 
-@app.route("/user_wc_login", methods=["GET", "POST"])
+@bp.route("/user_wc_login", methods=["GET", "POST"])
 def user_wc_login():
 
 	form = UserWcLoginForm()
@@ -86,21 +136,24 @@ def user_wc_login():
 		# If for whatever reason the username wasn't saved, return to the 
 		# original PowerToken login page.
 		if username is None:
-			return redirect(url_for("user_login", error="Invalid username"))
+			return redirect(url_for("main.user_login", error="Invalid username"))
 
 		# Get the user with that username from the database.
+		routing.use_user(username)
 		user = User.query.filter_by(username=username).first()
-		priorUser = user is not None
 		
 		# If the user with that username isn't in the database for whatever
 		# reason, go back to the PowerToken login page.
 		if user is None:
-			return redirect(url_for("user_login", error="Invalid user"))
+			return redirect(url_for("main.user_login", error="Invalid user"))
+		priorUser = user.wc_id is not None
+		user_id = user.id
 
 		# If everything is okay so far, get WEconnect info from the form and
 		# login to external WEconnect server.
 		email = form.email.data
 		password = form.password.data
+		release_db()
 		success, result = login_to_wc(email, password)
 
 		# If the username or password is incorrect, prompt the user to re-enter
@@ -112,6 +165,7 @@ def user_wc_login():
 		# If the login was successful, store the WEconnect ID and access token
 		# in the database, pull the user's WEconnect activities into the
 		# database, and redirect to the Fitbit login.
+		user = User.query.get(user_id)
 		user.wc_id = result[0]
 		user.wc_token = result[1]
 		logging.info("Adding User {}".format(user.wc_id))
@@ -119,18 +173,21 @@ def user_wc_login():
 		try:
 			db.session.commit()
 		except:
+			db.session.rollback()
 			error = "A user with the same WEconnect credentials already exists"
 			return render_template("user_wc_login.html", form=form, error=error)
 		
-		#TODO: CHECK TO MAKE SURE THIS WORKS. only execute when there is an new user
+		# Only pull the activities of a new user. The commit above ended the
+		# transaction, so no connection is held during the request.
 		if not priorUser:
-			set_wc_activities(user)
-		return redirect(url_for("user_fb_login", username=username))
+			items = fetch_wc_activities(result[0], result[1])
+			save_wc_activities(User.query.get(user_id), items)
+		return redirect(url_for("main.user_fb_login", username=username))
 
 	# GET: Render the WEconnect login page.
 	return render_template("user_wc_login.html", form=form)
 
-@app.route("/user_fb_login", methods=["GET", "POST"])
+@bp.route("/user_fb_login", methods=["GET", "POST"])
 def user_fb_login():
 	# POST: Process response from external Fitbit server.
 	if request.method == "POST":
@@ -140,18 +197,22 @@ def user_fb_login():
 		# If the username wasn't saved, return to the original PowerToken login
 		# page.
 		if username is None:
-			return redirect(url_for("user_login", error="Invalid username"))
+			return redirect(url_for("main.user_login", error="Invalid username"))
 
 		# Get the user with that username from the database.
+		routing.use_user(username)
 		user = User.query.filter_by(username=username).first()
 
 		# If the user with that username isn't in the database for whatever
 		# reason, go back to the PowerToken login page.
 		if user is None:
-			return redirect(url_for("user_login", error="Invalid user"))
+			return redirect(url_for("main.user_login", error="Invalid user"))
 		
 		# If everything is okay so far, add the Fitbit token to the database.
 		user.fb_token = fb_token
+		# Have the background maintenance set the step goal on this account.
+		MaintenanceStep.query.filter_by(user_id=user.id,
+				step="change_step_goal").delete()
 		
 		try:
 			db.session.commit()
@@ -166,23 +227,24 @@ def user_fb_login():
 		username = request.args.get("username")
 		return render_template("user_fb_login.html", username=username)
 
-@app.route("/user_refresh", methods=["GET", "POST"])
+@bp.route("/user_refresh", methods=["GET", "POST"])
 def refresh_tokens():
 	# GET PT USERNAME
 	username = request.args.get("username")
-	return redirect(url_for("user_wc_login", username=username))
+	return redirect(url_for("main.user_wc_login", username=username))
 	
 	
 
-@app.route("/user_activities", methods=["GET", "POST"])
+@bp.route("/user_activities", methods=["GET", "POST"])
 def user_activities():
 	username = request.args.get("username")
 
 	# If for whatever reason the username wasn't saved, go back to the 
 	# original login screen.
 	if username is None:
-		return redirect(url_for("user_login", error="Invalid username"))
+		return redirect(url_for("main.user_login", error="Invalid username"))
 
+	routing.use_user(username)
 	user = User.query.filter_by(username=username).first()
 	form = UserActivityForm()
 
@@ -194,7 +256,7 @@ def user_activities():
 			activity = user.activities.filter_by(wc_act_id=entry_id).first()
 			activity.weight = entry.weight.data
 		db.session.commit()
-		return redirect(url_for("user_home", username=username))
+		return redirect(url_for("main.user_home", username=username))
 
 	# GET: Set up the form for activity weighting and render the page.
 	elif request.method == "GET":
@@ -212,11 +274,12 @@ def user_activities():
 """
 ADMIN
 """
-@app.route("/admin")
-@app.route("/admin/")
-@app.route("/admin/index")
-@app.route("/admin/home")
+@bp.route("/admin")
+@bp.route("/admin/")
+@bp.route("/admin/index")
+@bp.route("/admin/home")
 @login_required
+@replica.reads
 def admin_home():
 	'''
 	Home: Display list of users with user data
@@ -225,37 +288,37 @@ def admin_home():
 	user_vms = [UserViewModel(user) for user in users]
 	return render_template("admin_home.html", user_vms=user_vms)
 
-@app.route("/admin/login", methods=["GET", "POST"])
+@bp.route("/admin/login", methods=["GET", "POST"])
 def admin_login():
 	if current_user.is_authenticated:
-		return redirect(url_for("admin_home"))
+		return redirect(url_for("main.admin_home"))
 	form = AdminLoginForm()
 
 	# POST: If a valid form was submitted
 	if form.validate_on_submit():
 		admin = Admin.query.filter_by(username=form.username.data).first()
 		if admin is None or not admin.check_password(form.password.data):
-			return redirect(url_for("admin_login", next=request.args.get("next")))
+			return redirect(url_for("main.admin_login", next=request.args.get("next")))
 		login_user(admin, remember=False)
 		next_page = request.args.get("next")
 		if not next_page or url_parse(next_page).netloc != '':
-			next_page = url_for("admin_home")
+			next_page = url_for("main.admin_home")
 		return redirect(next_page)
 
 	# GET: Renders the admin login template.
 	return render_template("admin_login.html", form=form)
 
-@app.route("/admin/logout")
+@bp.route("/admin/logout")
 def admin_logout():
 	logout_user()
-	return redirect(url_for("admin_login"))
+	return redirect(url_for("main.admin_login"))
 
-@app.route("/admin/register", methods=["GET", "POST"])
+@bp.route("/admin/register", methods=["GET", "POST"])
 def admin_register():
 	# If a user who's already logged in tries to register, send him/her to the
 	# homepage.
 	if current_user.is_authenticated:
-		return redirect(url_for("admin_home"))
+		return redirect(url_for("main.admin_home"))
 
 	form = AdminRegistrationForm()
 
@@ -268,46 +331,203 @@ def admin_register():
 		login_user(admin, remember=False)
 		next_page = request.args.get("next")
 		if not next_page or url_parse(next_page).netloc != '':
-			next_page = url_for("admin_home")
+			next_page = url_for("main.admin_home")
 		return redirect(next_page)
 
 	# GET: Render the admin login page.
 	return render_template("admin_register.html", form=form)
 
-@app.route("/admin/progress_logs")
+@bp.route("/admin/progress_logs")
 @login_required
+@replica.reads
 def admin_progress_logs():
 	logs = Log.query.order_by(Log.timestamp.desc()).all()
 	log_vms = [LogViewModel(log) for log in logs]
 	return render_template("admin_progress_logs.html", log_vms=log_vms)
 
-@app.route("/admin/user_stats")
+@bp.route("/admin/user_stats")
 @login_required
+@replica.reads
 def admin_user_stats():
 	users = User.query.order_by(User.registered_on).all()
 	user_vms = [UserViewModel(user) for user in users]
 	
 	return render_template("admin_user_stats.html", user_vms=user_vms)
 
-@app.route("/admin/event_stats")
+@bp.route("/admin/event_stats")
 @login_required
+@replica.reads
 def admin_event_stats():
-	events = Event.query.all()
+	# Load each event's activity in the same query, instead of one query per
+	# event when the view models read `event.activity`.
+	events = Event.query.options(joinedload(Event.activity)).all()
 	event_vms = [EventLogViewModel(event) for event in events]
 	
 	return render_template("admin_event_stats.html", event_vms=event_vms)
 
+WEEKDAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday",
+		"Saturday"]
 
-@app.route("/admin/system_logs")
-#@login_required
+@bp.route("/admin/completion")
+@login_required
+@replica.reads
+def admin_completion():
+	'''
+	Completion rates per user, per activity and per weekday, over the closed
+	days (from the app.analytics cache). `?user=<id>` narrows the activity and
+	weekday tables to one user, `?days=<n>` all three to the last n days.
+	'''
+	user_id = request.args.get("user", type=int)
+	days = request.args.get("days", type=int)
+	analytics.refresh()
+
+	per_user = analytics.by_user(days)
+	users = User.query.filter(User.id.in_(per_user.keys())).\
+			order_by(User.username).all() if per_user else []
+	user_vms = [CompletionViewModel(user.username, per_user[user.id], user.id)
+			for user in users]
+
+	per_activity = analytics.by_activity(user_id, days)
+	activities = Activity.query.options(joinedload(Activity.user)).\
+			filter(Activity.id.in_(per_activity.keys())).\
+			order_by(Activity.name).all() if per_activity else []
+	activity_vms = [ActivityViewModel(act, per_activity[act.id])
+			for act in activities]
+
+	per_weekday = analytics.by_weekday(user_id, days)
+	weekday_vms = [CompletionViewModel(WEEKDAYS[day], per_weekday[day])
+			for day in sorted(per_weekday)]
+
+	return render_template("admin_completion.html", user_vms=user_vms,
+			activity_vms=activity_vms, weekday_vms=weekday_vms, user_id=user_id,
+			days=days)
+
+@bp.route("/admin/system_logs")
+@login_required
 def admin_system_logs():
-	syslogs = Error.query.all()
-	return render_template("admin_system_logs.html", syslogs=syslogs)
+	'''
+	The error log, one row per error group (see app.errorlog), most recent
+	first or, with `?sort=count`, most frequent first. `?q=` searches the
+	summary, origin and message; `?user=`, `?origin=`, `?since=` and
+	`?until=` (YYYY-MM-DD, inclusive) filter; `?page=` turns the page.
+	'''
+	args = request.args
+	since, until = _date_arg("since"), _date_arg("until")
+	page = max(args.get("page", 0, type=int), 0)
+	groups = errorlog.search(query=args.get("q"),
+			user_id=args.get("user", type=int), origin=args.get("origin"),
+			since=since, until=until + timedelta(days=1) if until else None,
+			sort=args.get("sort"), page=page)
+	users = db.session.query(User.id, User.username).\
+			order_by(User.username).all()
+	return render_template("admin_system_logs.html", groups=groups,
+			users=users, origins=errorlog.origins(), page=page,
+			more=len(groups) == errorlog.PAGE_SIZE,
+			filters=dict((key, value) for key, value in args.items()
+			if key != "page" and value))
+
+@bp.route("/admin/system_logs/<int:group_id>")
+@login_required
+def admin_error_group(group_id):
+	'''
+	One error group and the newest of its sampled occurrences.
+	'''
+	group = ErrorGroup.query.get_or_404(group_id)
+	return render_template("admin_error_group.html", group=group,
+			samples=errorlog.samples(group_id))
+
+@bp.route("/admin/cohorts")
+@login_required
+def admin_cohorts():
+	'''
+	Every cohort database side by side: its users, how many have connected
+	Fitbit, the events and check-ins of the last 7 days, the error groups
+	seen in them, and the newest progress log.
+	'''
+	week_ago = datetime.now() - timedelta(days=7)
+	users, days = User.__table__, Day.__table__
+	events, groups = Event.__table__, ErrorGroup.__table__
+	recent_events = select([func.count()]).select_from(events.join(days)).\
+			where(days.c.date >= week_ago)
+	statement = select([
+		select([func.count()]).select_from(users).as_scalar().label("users"),
+		select([func.count()]).select_from(users).\
+				where(users.c.fb_token.isnot(None)).as_scalar().label("connected"),
+		recent_events.as_scalar().label("events"),
+		recent_events.where(events.c.completed == True).as_scalar().\
+				label("completed"),
+		select([func.count()]).select_from(groups).\
+				where(groups.c.last_seen >= week_ago).as_scalar().label("errors"),
+		select([func.max(Log.__table__.c.timestamp)]).as_scalar().\
+				label("last_log")
+	])
+	rows = [(database, result[0]) for database, result in
+			routing.fan_out(statement)]
+	return render_template("admin_cohorts.html", rows=rows)
+
+def _date_arg(name):
+	try:
+		return datetime.strptime(request.args.get(name, ""), "%Y-%m-%d")
+	except ValueError:
+		return None
+
+@bp.route("/admin/metrics")
+def admin_metrics():
+	'''
+	Metrics from the app and the background scripts, in the Prometheus text
+	format. Readable by logged-in admins, or with the METRICS_TOKEN bearer
+	token.
+	'''
+	token = current_app.config.get("METRICS_TOKEN")
+	auth = request.headers.get("Authorization", "")
+	if not current_user.is_authenticated and \
+			not (token and hmac.compare_digest(auth, "Bearer " + token)):
+		abort(401)
+	metrics.flush()
+	return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+# Seconds /health reuses the breaker states it last read.
+HEALTH_CACHE_SECONDS = 5
+_health = {"at": 0, "body": None}
+_health_lock = threading.Lock()
+
+def _iso(timestamp):
+	if timestamp is None:
+		return None
+	return datetime.fromtimestamp(timestamp).isoformat()
+
+@bp.route("/health")
+def health():
+	'''
+	The state of each upstream's circuit breaker, as JSON. Served from the
+	breaker store (at most HEALTH_CACHE_SECONDS old); never calls an upstream,
+	so it stays fast while they're down. "status" is "degraded" while any
+	breaker isn't closed. Always 200, so the app itself counts as up.
+	'''
+	with _health_lock:
+		if _health["body"] is None or \
+				time.time() - _health["at"] >= HEALTH_CACHE_SECONDS:
+			upstreams = {}
+			for state in breakers.states():
+				upstreams[state["upstream"]] = {
+					"state": state["state"],
+					"failures": state["failures"],
+					"last_success": _iso(state["last_success"]),
+					"last_failure": _iso(state["last_failure"]),
+					"last_error": state["last_error"]
+				}
+			degraded = any(u["state"] != breakers.CLOSED
+					for u in upstreams.values())
+			_health["body"] = {"status": "degraded" if degraded else "ok",
+					"upstreams": upstreams}
+			_health["at"] = time.time()
+		body = _health["body"]
+	return jsonify(body)
 
 # TODO: Put PowerToken setup instructions here (or just link to the document,
 # which can be found in the GroupLens Google Drive under Meetings >
 # ProDUCT Lab > Projects > PowerToken Wearables).
-@app.route("/admin/instructions")
+@bp.route("/admin/instructions")
 @login_required
 def admin_instructions():
 	return "Not implemented."
@@ -316,12 +536,12 @@ def admin_instructions():
 # troubleshoot the PowerToken system. This should be more for study
 # administrators than system administrators (i.e. more practical than 
 # technical).
-@app.route("/admin/help")
+@bp.route("/admin/help")
 @login_required
 def admin_help():
 	return "Not implemented."
 
-@app.route("/admin/test")
+@bp.route("/admin/test")
 def admin_test():
 	users = User.query.order_by(User.registered_on).all()
 	user_vms = [UserViewModel(user) for user in users]
@@ -0,0 +1,142 @@
+"""
+Sends the app's database work to the right study cohort's database (see
+background/cohorts.py), or to the read-only snapshot (see app/replica.py).\n
+A request works on one database, `g.database`. User pages pick it from the
+user (`use_user`), found by looking the username or WEconnect id up in each
+database; a new user goes to the cohort of their sign-up link. Admin pages
+use the cohort the admin picked. The `admin` table is shared by every
+cohort and always lives in the default database. `fan_out` runs a statement
+on every database, for the admin views that compare cohorts.\n
+Created on 10/19/2026.
+"""
+
+import threading
+from flask import g, has_app_context
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import create_engine, orm, select
+from sqlalchemy.sql.dml import UpdateBase
+from app import replica
+from background import cohorts
+
+# Tables every cohort shares, kept in the default database.
+SHARED_TABLES = ("admin",)
+# Users whose database is remembered (usernames and WEconnect ids).
+USER_CACHE_SIZE = 10000
+
+_engines = {}
+_engines_lock = threading.Lock()
+_users = {}
+
+def current():
+	"""
+	Return the name of the database the request works on.
+	"""
+	if not has_app_context():
+		return cohorts.DEFAULT
+	return g.get("database", cohorts.DEFAULT)
+
+def use(database):
+	"""
+	Send the rest of the request's database work to `database`.
+
+	:param String database: a name from cohorts.databases()
+	"""
+	g.database = database
+
+def engine(database=None):
+	"""
+	Return the engine of a database.
+
+	:param String database: None for current()
+	"""
+	database = database or current()
+	if database == cohorts.DEFAULT:
+		from app import db
+		return db.engine
+	if database not in _engines:
+		with _engines_lock:
+			if database not in _engines:
+				_engines[database] = create_engine(cohorts.url(database))
+	return _engines[database]
+
+def dispose():
+	"""
+	Drop the cohort engines' pooled connections, e.g. in a forked worker.
+	"""
+	for cohort_engine in list(_engines.values()):
+		cohort_engine.dispose()
+
+def find_user(username=None, wc_id=None):
+	"""
+	Return the name of the database the user with this username (or
+	WEconnect id) is in, or None if they're in none of them.
+
+	:param String username\n
+	:param int wc_id
+	"""
+	from app.models import User
+	key = ("username", username) if username is not None else ("wc_id", wc_id)
+	if key in _users:
+		return _users[key]
+	users = User.__table__
+	column = users.c.username if username is not None else users.c.wc_id
+	for database in cohorts.databases():
+		with engine(database).connect() as conn:
+			found = conn.execute(select([users.c.id]).where(
+					column == key[1])).first()
+		if found is not None:
+			if len(_users) >= USER_CACHE_SIZE:
+				_users.clear()
+			_users[key] = database
+			return database
+	return None
+
+def use_user(username=None, wc_id=None):
+	"""
+	Send the rest of the request's database work to the user's database, or
+	to the default one if there's no such user. Return the database used.
+
+	:param String username\n
+	:param int wc_id
+	"""
+	database = cohorts.DEFAULT
+	if len(cohorts.databases()) > 1:
+		database = find_user(username, wc_id) or cohorts.DEFAULT
+	use(database)
+	return database
+
+def fan_out(statement):
+	"""
+	Run a Core statement on every database. Return a list of (database
+	name, rows).
+
+	:param statement: e.g. a `select()`
+	"""
+	results = []
+	for database in cohorts.databases():
+		with engine(database).connect() as conn:
+			results.append((database, conn.execute(statement).fetchall()))
+	return results
+
+class RoutingSession(SignallingSession):
+	"""
+	The app's session: each statement goes to the request's database, or to
+	the snapshot while `replica.active()`.
+	"""
+	def get_bind(self, mapper=None, clause=None):
+		table = getattr(mapper, "local_table", None)
+		if table is None or table.name not in SHARED_TABLES:
+			database = current()
+			if database != cohorts.DEFAULT:
+				return engine(database)
+			if replica.active() and not self._flushing and \
+					not isinstance(clause, UpdateBase):
+				return replica.engine()
+		return SignallingSession.get_bind(self, mapper, clause)
+
+class RoutingSQLAlchemy(SQLAlchemy):
+	"""
+	Flask-SQLAlchemy, with RoutingSession as its session.
+	"""
+	def create_session(self, options):
+		return orm.sessionmaker(class_=RoutingSession, db=self, **options)
@@ -5,8 +5,8 @@ Last modified by Abigail Franz on 5/9/2018.
 """
 
 from datetime import datetime, timedelta
-from app.helpers import TODAY
 from app.models import Day, Log, User, Admin, Event, Activity
+from background import usertime
 
 class UserViewModel:
 	"""
@@ -35,7 +35,8 @@ class UserViewModel:
 			return last_day.date.strftime("%Y-%m-%d")
 
 	def _todays_progress(self, user):
-		day = user.days.filter(Day.date == TODAY).first()
+		today = usertime.today(user)
+		day = user.days.filter(Day.date == today).first()
 
 		# If the user has no Day object for today, return 0
 		if day is None:
@@ -43,7 +44,7 @@ class UserViewModel:
 
 		# Compute average progress this week
 		total_progress = day.computed_progress
-		weekday = TODAY.weekday()
+		weekday = today.weekday()
 		sunday = weekday - (weekday % 7)
 		days_so_far = (weekday - sunday) + 1
 		for i in range(1, days_so_far):
@@ -60,20 +61,49 @@ class UserViewModel:
 
 
 class ActivityViewModel:
-	def __init__(self, activity):
+	def __init__(self, activity, completion=None):
+		"""
+		:param app.models.Activity activity\n
+		:param tuple completion: (events, completed) from app.analytics
+		"""
 		self.id = activity.wc_act_id
 		self.name = activity.name
 		self.expiration = activity.expiration
-		self.isExpired = _isExpired()
+		self.isExpired = self._isExpired()
 		self.weight = activity.weight
 		self.user = activity.user
-		self.completion_rate = 0 #TODO
+		self.events, self.completed = completion or (0, 0)
+		self.completion_rate = _rate(self.events, self.completed)
 	
-	def _isExpired():
-		return self.expiration < datetime.now()
+	def _isExpired(self):
+		return self.expiration is not None and self.expiration < datetime.now()
+
+	def __repr__(self):
+		return "<ActivityViewModel {}, {:.0f}% completed>".format(self.name,
+				self.completion_rate)
+
+class CompletionViewModel:
+	"""
+	One row of a completion table (a user or a weekday): how many events
+	there were, how many were checked in, and the rate in percent.
+	"""
+	def __init__(self, label, completion, id=None):
+		"""
+		:param String label\n
+		:param tuple completion: (events, completed) from app.analytics\n
+		:param int id: the user's `User.id`, for a user's row
+		"""
+		self.id = id
+		self.label = label
+		self.events, self.completed = completion
+		self.completion_rate = _rate(self.events, self.completed)
+
+	def __repr__(self):
+		return "<CompletionViewModel {}, {:.0f}%>".format(self.label,
+				self.completion_rate)
 
-	def _completedActivityEvents():
-		pass	
+def _rate(events, completed):
+	return 100.0 * completed / events if events else 0.0
 
 class EventLogViewModel:
 	def __init__(self, event):
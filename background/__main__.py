@@ -0,0 +1,65 @@
+"""
+Single entry point for the background scripts:\n
+	python -m background [--cohort NAME] <command> [options]\n
+Nothing beyond the standard library is imported until a command is chosen,
+and then only that command's script (and what it imports) is loaded, so
+e.g. `trace` never loads SQLAlchemy and nothing here loads Flask. The
+scripts run exactly as they do when started directly.\n
+Created on 10/19/2026.
+"""
+
+import os, runpy, sys
+
+BACKGROUND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# command: (script, arguments put in front of the user's, description)
+COMMANDS = {
+	"poll": ("polling.py", [], "poll WEconnect and save events"),
+	"maintain": ("maintenance.py", [], "bring the database up to date"),
+	"push": ("push.py", [], "push today's progress to Fitbit for some users"),
+	"progress": ("progress.py", [], "check the running progress totals"),
+	"retention": ("retention.py", [], "archive and compact old rows"),
+	"dump": ("dbdump.py", ["dump"], "dump the database to a file"),
+	"export": ("export.py", [], "export closed months for analysis (NumPy)"),
+	"restore": ("dbdump.py", ["restore"], "load a dump into the database"),
+	"snapshot": ("snapshot.py", [], "copy the database to the read-only snapshot"),
+	"trace": ("tracing.py", [], "summarize trace files"),
+	"upgrade": ("upgrade.py", [], "add new tables and columns to an old database")
+}
+
+def usage():
+	lines = ["usage: python -m background [--cohort NAME] <command> [options]",
+			"", "--cohort runs the command on that cohort's database (PT_COHORT).",
+			"", "commands:"]
+	for name in sorted(COMMANDS):
+		lines.append("  {:<12} {}".format(name, COMMANDS[name][2]))
+	lines.append("")
+	lines.append("Run `python -m background <command> --help` for a command's "
+			"options.")
+	return "\n".join(lines)
+
+def main(argv):
+	if argv and argv[0] == "--cohort":
+		if len(argv) < 2:
+			sys.stderr.write("--cohort needs a name\n\n{}\n".format(usage()))
+			return 2
+		# Read by cohorts.py when the command's script loads.
+		os.environ["PT_COHORT"] = argv[1]
+		argv = argv[2:]
+	if not argv or argv[0] in ("-h", "--help"):
+		print(usage())
+		return 0
+	if argv[0] not in COMMANDS:
+		sys.stderr.write("unknown command '{}'\n\n{}\n".format(argv[0], usage()))
+		return 2
+	script, prefix, _ = COMMANDS[argv[0]]
+	# The scripts import each other as top-level modules (`from db import
+	# session`), as when they're run from this directory.
+	if BACKGROUND_DIR not in sys.path:
+		sys.path.insert(0, BACKGROUND_DIR)
+	sys.argv = ["python -m background " + argv[0]] + prefix + argv[1:]
+	runpy.run_path(os.path.join(BACKGROUND_DIR, script), run_name="__main__")
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,233 @@
+"""
+Circuit breakers for the upstream APIs (Fitbit and WEconnect), shared by the
+background scripts and the Flask app.\n
+After PT_BREAKER_FAILURES consecutive failures (network errors, 429s and
+5xxs) an upstream's breaker opens, and calls fail at once with CircuitOpen
+instead of waiting out a timeout. After PT_BREAKER_OPEN_SECONDS one process
+is let through with a trial call (half-open): if it succeeds the breaker
+closes again, otherwise it reopens.\n
+The state lives in a small SQLite file (PT_BREAKER_PATH) shared by every
+process on the host. This module only uses the standard library, so both
+`import breakers` and `from background import breakers` work. `call` wraps
+one upstream request in the breaker and the metrics; the scripts
+(connections.request) and the app (app/helpers._wc_request) both use it.\n
+Created on 10/19/2026.
+"""
+
+import os, sqlite3, threading, time
+
+STORE_PATH = os.environ.get("PT_BREAKER_PATH") or os.path.join(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+		"data", "breakers.db")
+FAILURE_THRESHOLD = int(os.environ.get("PT_BREAKER_FAILURES") or 5)
+OPEN_SECONDS = float(os.environ.get("PT_BREAKER_OPEN_SECONDS") or 30)
+
+# How long a half-open trial call may take before another process may try.
+PROBE_SECONDS = 30.0
+
+# Each process rereads an upstream's state at most this often, and records a
+# success in the shared store at most this often while the breaker is closed.
+CACHE_SECONDS = 1.0
+SUCCESS_WRITE_SECONDS = 5.0
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+COLUMNS = ("upstream", "state", "failures", "opened_at", "probe_until",
+		"last_success", "last_failure", "last_error")
+
+_lock = threading.Lock()
+_cache = {}	# upstream -> (read at, row dict)
+
+class CircuitOpen(IOError):
+	"""
+	Raised instead of calling an upstream whose breaker is open. Like the
+	network errors from `requests`, it's an IOError.
+	"""
+	def __init__(self, upstream):
+		IOError.__init__(self, "{} is unavailable (circuit open)".format(upstream))
+		self.upstream = upstream
+
+def _connect():
+	directory = os.path.dirname(STORE_PATH)
+	if directory and not os.path.isdir(directory):
+		os.makedirs(directory, exist_ok=True)
+	conn = sqlite3.connect(STORE_PATH, timeout=5)
+	conn.execute("PRAGMA journal_mode=WAL")
+	conn.execute("CREATE TABLE IF NOT EXISTS breaker (upstream TEXT PRIMARY KEY, "
+			"state TEXT, failures INTEGER, opened_at REAL, probe_until REAL, "
+			"last_success REAL, last_failure REAL, last_error TEXT)")
+	return conn
+
+def _closed(upstream):
+	return dict(zip(COLUMNS, (upstream, CLOSED, 0, None, None, None, None, None)))
+
+def _read(upstream, fresh=False):
+	now = time.time()
+	with _lock:
+		cached = _cache.get(upstream)
+	if cached is not None and not fresh and now - cached[0] < CACHE_SECONDS:
+		return cached[1]
+	conn = _connect()
+	try:
+		row = conn.execute("SELECT {} FROM breaker WHERE upstream = ?".format(
+				", ".join(COLUMNS)), (upstream,)).fetchone()
+	finally:
+		conn.close()
+	state = dict(zip(COLUMNS, row)) if row else _closed(upstream)
+	with _lock:
+		_cache[upstream] = (now, state)
+	return state
+
+def _write(upstream, statements):
+	conn = _connect()
+	try:
+		with conn:
+			conn.execute("INSERT OR IGNORE INTO breaker (upstream, state, failures) "
+					"VALUES (?, ?, 0)", (upstream, CLOSED))
+			changed = 0
+			for sql, params in statements:
+				changed = conn.execute(sql, params).rowcount
+	finally:
+		conn.close()
+	with _lock:
+		_cache.pop(upstream, None)
+	return changed
+
+def allow(upstream):
+	"""
+	Return True if a call to the upstream may go ahead. When the breaker has
+	been open for OPEN_SECONDS, exactly one caller (across all processes) gets
+	True, for the half-open trial call.
+
+	:param String upstream: "fitbit" or "weconnect"
+	"""
+	try:
+		state = _read(upstream)
+		if state["state"] == CLOSED:
+			return True
+		now = time.time()
+		if state["state"] == OPEN and now < state["opened_at"] + OPEN_SECONDS:
+			return False
+		if state["state"] == HALF_OPEN and now < state["probe_until"]:
+			return False
+		return _write(upstream, [("UPDATE breaker SET state = ?, probe_until = ? "
+				"WHERE upstream = ? AND ((state = ? AND opened_at <= ?) OR "
+				"(state = ? AND probe_until <= ?))", (HALF_OPEN, now + PROBE_SECONDS,
+				upstream, OPEN, now - OPEN_SECONDS, HALF_OPEN, now))]) == 1
+	except sqlite3.Error:
+		# A broken store must not stop the calls.
+		return True
+
+def check(upstream):
+	"""
+	Raise CircuitOpen unless a call to the upstream may go ahead.
+
+	:param String upstream
+	"""
+	if not allow(upstream):
+		raise CircuitOpen(upstream)
+
+def is_failure(status):
+	"""
+	Return True if a response status means the upstream is in trouble.
+	Client errors other than 429 (e.g. an expired token) don't count.
+
+	:param status: an HTTP status code, or "error" for no response
+	"""
+	return status == "error" or status == 429 or status >= 500
+
+def record_success(upstream):
+	"""
+	Record a good response: closes the breaker.
+
+	:param String upstream
+	"""
+	try:
+		state = _read(upstream)
+		now = time.time()
+		if state["state"] == CLOSED and not state["failures"] and \
+				now - (state["last_success"] or 0) < SUCCESS_WRITE_SECONDS:
+			return
+		_write(upstream, [("UPDATE breaker SET state = ?, failures = 0, "
+				"last_success = ? WHERE upstream = ?", (CLOSED, now, upstream))])
+	except sqlite3.Error:
+		pass
+
+def record_failure(upstream, error):
+	"""
+	Record a failed call: opens the breaker after FAILURE_THRESHOLD failures
+	in a row, or at once if it was a half-open trial.
+
+	:param String upstream\n
+	:param String error: a short description, shown by /health
+	"""
+	now = time.time()
+	try:
+		_write(upstream, [
+			("UPDATE breaker SET failures = failures + 1, last_failure = ?, "
+					"last_error = ? WHERE upstream = ?", (now, str(error)[:200],
+					upstream)),
+			("UPDATE breaker SET state = ?, opened_at = ? WHERE upstream = ? AND "
+					"(state = ? OR (state = ? AND failures >= ?))", (OPEN, now,
+					upstream, HALF_OPEN, CLOSED, FAILURE_THRESHOLD))
+		])
+	except sqlite3.Error:
+		pass
+
+def call(upstream, endpoint, send):
+	"""
+	Make one call to an upstream through its breaker, and return the
+	response. Raises CircuitOpen at once while the breaker is open. The call
+	is counted and timed in the metrics store (see metrics.record_upstream;
+	network errors have status "error" and are re-raised), and its outcome is
+	recorded in the breaker.
+
+	:param String upstream: "fitbit" or "weconnect"\n
+	:param String endpoint: the name of the calling API function\n
+	:param function send: makes the HTTP request and returns the response
+	"""
+	metrics = _metrics()
+	if not allow(upstream):
+		metrics.inc("pt_upstream_rejected_total", upstream=upstream,
+				endpoint=endpoint)
+		raise CircuitOpen(upstream)
+	start = time.time()
+	status = "error"
+	try:
+		response = send()
+		status = response.status_code
+		return response
+	except IOError as e:
+		record_failure(upstream, "{}: {}".format(type(e).__name__, e))
+		raise
+	finally:
+		metrics.record_upstream(upstream, endpoint, status, time.time() - start)
+		if status != "error":
+			if is_failure(status):
+				record_failure(upstream, "HTTP {} from {}".format(status,
+						endpoint))
+			else:
+				record_success(upstream)
+
+def _metrics():
+	# The metrics module next to this one: `metrics` in the background
+	# scripts, `background.metrics` in the app.
+	if __package__:
+		from . import metrics
+	else:
+		import metrics
+	return metrics
+
+def states():
+	"""
+	Return every known breaker's state as a dict, read from the shared store.
+	"""
+	try:
+		conn = _connect()
+		try:
+			rows = conn.execute("SELECT {} FROM breaker ORDER BY upstream".format(
+					", ".join(COLUMNS))).fetchall()
+		finally:
+			conn.close()
+	except sqlite3.Error:
+		return []
+	return [dict(zip(COLUMNS, row)) for row in rows]
@@ -0,0 +1,72 @@
+"""
+Study cohorts and their databases. Each cohort can have a database of its
+own, so one cohort's queries and backfills don't scan or lock another's
+rows. PT_COHORT_DATABASES maps cohort names to SQLAlchemy URLs:\n
+	pilot=sqlite:////srv/powertoken/pilot.db,spring=postgresql://pt@db/pt?options=-csearch_path%3Dspring\n
+(the second one is a PostgreSQL schema). Cohorts not listed, including the
+default one, share DATABASE_URL. Every database has the full set of tables,
+and `User.cohort` records each user's cohort.\n
+A background process works on one database, the one of PT_COHORT (see
+`python -m background --cohort`); the Flask app serves them all and routes
+each request to the right one (see app/routing.py). Used by both, so stdlib
+only.\n
+Created on 10/19/2026.
+"""
+
+import os, re
+
+DEFAULT = "default"
+
+_NAME = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+def _parse(text):
+	databases = {}
+	for entry in (text or "").split(","):
+		if not entry.strip():
+			continue
+		name, _, url = entry.partition("=")
+		name = name.strip()
+		if not is_valid(name) or name == DEFAULT or not url.strip():
+			raise ValueError("bad PT_COHORT_DATABASES entry {!r}".format(entry))
+		databases[name] = url.strip()
+	return databases
+
+def is_valid(name):
+	"""
+	Return True if `name` can be a cohort name: 1 to 32 letters, digits,
+	"-" or "_".
+
+	:param String name
+	"""
+	return bool(name) and _NAME.match(name) is not None
+
+DATABASES = _parse(os.environ.get("PT_COHORT_DATABASES"))
+# The cohort this process works on.
+CURRENT = os.environ.get("PT_COHORT") or DEFAULT
+
+def database(cohort=None):
+	"""
+	Return the name of the database a cohort's users are kept in: the
+	cohort's own name if it has a database, or DEFAULT.
+
+	:param String cohort: None for CURRENT
+	"""
+	cohort = cohort or CURRENT
+	return cohort if cohort in DATABASES else DEFAULT
+
+def databases():
+	"""
+	Return the names of all the databases, DEFAULT first.
+	"""
+	return [DEFAULT] + sorted(DATABASES)
+
+def url(cohort=None):
+	"""
+	Return the SQLAlchemy URL of a cohort's database.
+
+	:param String cohort: None for CURRENT
+	"""
+	name = database(cohort)
+	if name == DEFAULT:
+		return os.environ.get("DATABASE_URL")
+	return DATABASES[name]
@@ -0,0 +1,244 @@
+"""
+Reads and writes the column-oriented study archive made by export.py, for
+loading into NumPy or pandas without going through the database. Needs only
+NumPy, so analysts can copy this one file.\n
+An archive directory holds `manifest.json` and one directory per table with
+one partition per study month (`day/2026-09/`, ...). A partition is a
+directory of `.npy` files, one per column, which `read_partition` memory-maps;
+with `--compress` it's a single compressed `.npz` file instead, which has to
+be read into memory. String columns are dictionary-encoded: `<column>.npy`
+holds int32 codes (-1 for NULL) into `<column>.dict.npy`. Integer and
+boolean columns with NULLs get a `<column>.valid.npy` mask.\n
+	import columnar, pandas
+	frame = pandas.DataFrame(columnar.to_pandas(columnar.read("../data/export", "event")))\n
+Created on 10/19/2026.
+"""
+
+import json, os, shutil
+from collections import namedtuple
+import numpy as np
+
+MANIFEST = "manifest.json"
+FORMAT = 1
+
+# Column kinds, from the SQL column types.
+INT, FLOAT, BOOL, DATETIME, STRING = "int", "float", "bool", "datetime", "string"
+
+class Encoded(namedtuple("Encoded", "codes values")):
+	"""
+	A dictionary-encoded string column: `values[codes]`, with -1 for NULL.
+	"""
+	def decode(self):
+		"""
+		Return the strings as an object array, with None for NULL.
+		"""
+		out = np.empty(len(self.codes), dtype=object)
+		valid = self.codes >= 0
+		out[valid] = self.values[self.codes[valid]]
+		return out
+
+def encode(kind, values):
+	"""
+	Turn a list of Python values (None for NULL) into the arrays stored for
+	one column. Return a dict of suffix ("", ".dict", ".valid") to array.
+
+	:param String kind: INT, FLOAT, BOOL, DATETIME or STRING\n
+	:param list values
+	"""
+	nulls = np.array([value is None for value in values], dtype=bool)
+	if kind == STRING:
+		present = [value for value in values if value is not None]
+		dictionary, inverse = np.unique(np.array(present, dtype=str),
+				return_inverse=True)
+		codes = np.full(len(values), -1, dtype=np.int32)
+		codes[~nulls] = inverse
+		return {"": codes, ".dict": dictionary}
+	if kind == FLOAT:
+		return {"": np.array([np.nan if value is None else value
+				for value in values], dtype=np.float64)}
+	if kind == DATETIME:
+		return {"": np.array([np.datetime64("NaT") if value is None else
+				np.datetime64(value, "s") for value in values],
+				dtype="datetime64[s]")}
+	if kind == BOOL:
+		arrays = {"": np.array([bool(value) for value in values], dtype=bool)}
+	else:
+		data = np.array([0 if value is None else value for value in values],
+				dtype=np.int64)
+		if len(data) and data.min() >= np.iinfo(np.int32).min and \
+				data.max() <= np.iinfo(np.int32).max:
+			data = data.astype(np.int32)
+		arrays = {"": data}
+	if nulls.any():
+		arrays[".valid"] = ~nulls
+	return arrays
+
+def _decode(kind, arrays):
+	if kind == STRING:
+		return Encoded(arrays[""], arrays[".dict"])
+	if ".valid" in arrays:
+		return np.ma.masked_array(arrays[""], mask=~arrays[".valid"])
+	return arrays[""]
+
+def load_manifest(directory):
+	"""
+	Return the archive's manifest, or an empty one if there's none yet.
+
+	:param String directory
+	"""
+	path = os.path.join(directory, MANIFEST)
+	if not os.path.exists(path):
+		return {"format": FORMAT, "tables": {}}
+	with open(path) as manifest:
+		return json.load(manifest)
+
+def save_manifest(directory, manifest):
+	"""
+	Write the manifest atomically.
+
+	:param String directory\n
+	:param dict manifest
+	"""
+	path = os.path.join(directory, MANIFEST)
+	with open(path + ".tmp", "w") as out:
+		json.dump(manifest, out, indent=1, sort_keys=True)
+	os.replace(path + ".tmp", path)
+
+def write_partition(directory, table, partition, columns, rows, compress=False):
+	"""
+	Write one partition of a table, replacing it if it exists. The files are
+	written under a temporary name and renamed into place. Return the path.
+
+	:param String directory: the archive directory\n
+	:param String table\n
+	:param String partition: e.g. "2026-09"\n
+	:param list columns: (name, kind) pairs\n
+	:param list rows: tuples in column order\n
+	:param bool compress: write one compressed .npz instead of .npy files
+	"""
+	table_dir = os.path.join(directory, table)
+	os.makedirs(table_dir, exist_ok=True)
+	arrays = {}
+	for i, (name, kind) in enumerate(columns):
+		for suffix, array in encode(kind, [row[i] for row in rows]).items():
+			arrays[name + suffix] = array
+
+	if compress:
+		path = os.path.join(table_dir, partition + ".npz")
+		with open(path + ".tmp", "wb") as out:
+			np.savez_compressed(out, **arrays)
+		os.replace(path + ".tmp", path)
+		return path
+	path = os.path.join(table_dir, partition)
+	tmp = path + ".tmp"
+	shutil.rmtree(tmp, ignore_errors=True)
+	os.makedirs(tmp)
+	for name, array in arrays.items():
+		np.save(os.path.join(tmp, name + ".npy"), array, allow_pickle=False)
+	if os.path.isdir(path):
+		shutil.rmtree(path)
+	os.rename(tmp, path)
+	return path
+
+def partitions(directory, table):
+	"""
+	Return the table's partition names, oldest first.
+
+	:param String directory\n
+	:param String table
+	"""
+	entry = load_manifest(directory)["tables"].get(table, {})
+	return sorted(entry.get("partitions", {}))
+
+def read_partition(directory, table, partition, manifest=None):
+	"""
+	Return one partition as a dict of column name to array: a memory-mapped
+	ndarray, a masked array for integer or boolean columns with NULLs, or an
+	Encoded pair for strings.
+
+	:param String directory\n
+	:param String table\n
+	:param String partition
+	"""
+	manifest = manifest or load_manifest(directory)
+	entry = manifest["tables"][table]
+	path = os.path.join(directory, table, entry["partitions"][partition]["file"])
+	if path.endswith(".npz"):
+		with np.load(path, allow_pickle=False) as npz:
+			stored = dict((name, npz[name]) for name in npz.files)
+	else:
+		stored = dict((name[:-len(".npy")], np.load(os.path.join(path, name),
+				mmap_mode="r", allow_pickle=False))
+				for name in os.listdir(path) if name.endswith(".npy"))
+
+	columns = {}
+	for name, kind in entry["columns"]:
+		arrays = dict((suffix, stored[name + suffix])
+				for suffix in ("", ".dict", ".valid") if name + suffix in stored)
+		if not arrays:
+			# A column added after this partition was written.
+			arrays = encode(kind, [None] * entry["partitions"][partition]["rows"])
+		columns[name] = _decode(kind, arrays)
+	return columns
+
+def _concatenate(kind, parts):
+	if kind == STRING:
+		values = np.unique(np.concatenate([part.values for part in parts]))
+		codes = []
+		for part in parts:
+			# Map this partition's codes into the shared dictionary.
+			remap = np.searchsorted(values, part.values).astype(np.int32)
+			part_codes = np.full(len(part.codes), -1, dtype=np.int32)
+			valid = part.codes >= 0
+			part_codes[valid] = remap[part.codes[valid]]
+			codes.append(part_codes)
+		return Encoded(np.concatenate(codes), values)
+	if any(isinstance(part, np.ma.MaskedArray) for part in parts):
+		return np.ma.concatenate(parts)
+	return np.concatenate(parts)
+
+def read(directory, table, months=None):
+	"""
+	Return a whole table (or some of its partitions) as one dict of column
+	name to array. Unlike read_partition, this copies the data into memory.
+
+	:param String directory\n
+	:param String table\n
+	:param list months: partition names, or None for all of them
+	"""
+	manifest = load_manifest(directory)
+	entry = manifest["tables"][table]
+	names = [name for name in sorted(entry["partitions"])
+			if months is None or name in months]
+	parts = [read_partition(directory, table, name, manifest) for name in names]
+	columns = {}
+	for name, kind in entry["columns"]:
+		if not parts:
+			columns[name] = _decode(kind, encode(kind, []))
+		else:
+			columns[name] = _concatenate(kind, [part[name] for part in parts])
+	return columns
+
+def to_pandas(columns):
+	"""
+	Make the arrays from `read` or `read_partition` ready for
+	`pandas.DataFrame`: strings become categoricals (if pandas is installed)
+	or object arrays, masked arrays become floats or objects with NaN/None.
+
+	:param dict columns
+	"""
+	try:
+		import pandas
+	except ImportError:
+		pandas = None
+	out = {}
+	for name, column in columns.items():
+		if isinstance(column, Encoded):
+			out[name] = pandas.Categorical.from_codes(np.asarray(column.codes),
+					column.values) if pandas else column.decode()
+		elif isinstance(column, np.ma.MaskedArray):
+			out[name] = column.astype(object).filled(None) \
+					if column.dtype == bool else column.astype(np.float64).filled(np.nan)
+		else:
+			out[name] = np.asarray(column)
+	return out
@@ -0,0 +1,71 @@
+"""
+Per-process HTTP and database connection pools for the background scripts.\n
+A sharded poller forks one process per shard; each process must drop the
+connections it inherited from its parent and open its own.\n
+Created on 10/19/2026.
+"""
+
+import os
+import breakers
+import db
+import tracing
+
+# Number of keep-alive connections held open to each upstream host.
+HTTP_POOL_SIZE = int(os.environ.get("PT_HTTP_POOL_SIZE") or 10)
+# Seconds to wait for an upstream to connect or respond.
+HTTP_TIMEOUT = float(os.environ.get("PT_HTTP_TIMEOUT") or 30)
+
+_http = None
+
+def http():
+	"""
+	Return this process's shared `requests.Session`, creating it on first use.
+	Fitbit and WEconnect calls go through this session so that connections
+	are reused across users within a cycle.
+	"""
+	global _http
+	if _http is None:
+		# Imported here so that commands without upstream calls start faster.
+		import requests
+		from requests.adapters import HTTPAdapter
+		_http = requests.Session()
+		adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+				pool_maxsize=HTTP_POOL_SIZE)
+		_http.mount("http://", adapter)
+		_http.mount("https://", adapter)
+	return _http
+
+def request(upstream, endpoint, method, url, **kwargs):
+	"""
+	Make an HTTP request through this process's session, and count and time
+	it (pt_upstream_requests_total, pt_upstream_request_seconds) and trace it.
+	Network errors are counted with status "error" and re-raised. Calls to an
+	upstream whose circuit breaker is open (see breakers.py) fail at once with
+	breakers.CircuitOpen. Both are IOErrors.
+
+	:param String upstream: "fitbit" or "weconnect"\n
+	:param String endpoint: the name of the calling API function\n
+	:param String method: "GET", "POST" or "DELETE"\n
+	:param String url\n
+	:param kwargs: passed on to `requests.Session.request`
+	"""
+	kwargs.setdefault("timeout", HTTP_TIMEOUT)
+	def send():
+		with tracing.span("http", endpoint, upstream=upstream,
+				method=method) as call:
+			response = http().request(method, url, **kwargs)
+			call.set(status=response.status_code, bytes=len(response.content))
+			return response
+	return breakers.call(upstream, endpoint, send)
+
+def reset():
+	"""
+	Discard the HTTP session and database connections inherited from a parent
+	process. Call this first thing in a forked worker.
+	"""
+	global _http
+	if _http is not None:
+		_http.close()
+		_http = None
+	db.session.remove()
+	db.engine.dispose()
@@ -4,15 +4,36 @@ Created by Abigail Franz on 4/30/2018.\n
 Last Modified by Abigail Franz on 5/9/2018.
 """
 
-from models import Base
-import os
+from models import Activity, Base, Day, Event, ProgressState, User
+import cohorts
+import metrics
+import progresshook
+import tracing
+import usertime
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 
-DB_PATH = os.environ.get("DATABASE_URL")
+# DATABASE_URL, or the database of the cohort in PT_COHORT (see cohorts.py).
+DB_PATH = cohorts.url()
+# Its name, which e.g. per-user locks are kept under.
+DATABASE = cohorts.database()
 
 # Set up the SQLAlchemy engine and connect it to the Sqlite database.
 engine = create_engine(DB_PATH)
 Base.metadata.bind = engine
 DbSession = sessionmaker(bind=engine)
-session = DbSession()
\ No newline at end of file
+
+# A scoped session behaves like a plain session for callers, but can be
+# discarded and recreated (see connections.reset) in forked worker processes.
+session = scoped_session(DbSession)
+
+# Keep the progress engine's running totals up to date in every flush, from
+# whichever script changes the events (see progress.py).
+progresshook.install(DbSession, {"Activity": Activity, "Day": Day,
+		"Event": Event, "ProgressState": ProgressState, "User": User},
+		usertime.today)
+
+# Time commits for the metrics store (pt_db_commit_seconds), and count
+# statements and flushes for the trace log.
+metrics.instrument_commits()
+tracing.instrument(engine)
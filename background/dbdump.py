@@ -0,0 +1,184 @@
+"""
+Dumps the whole database to a file and restores it, at constant memory, to
+copy production data or reseed test databases. Replaces db_debug.py.\n
+A dump is a gzipped NDJSON file. Tables are written in dependency order
+(`Base.metadata.sorted_tables`), each one as a header line followed by one
+line per row:\n
+	{"table": "user", "columns": ["id", "username", ...], "rows": 1200}
+	[1, "alice", ...]\n
+Usage:\n
+	python dbdump.py dump ../data/powertoken.jsonl.gz
+	python dbdump.py restore ../data/powertoken.jsonl.gz [--clear]\n
+Created on 10/19/2026.
+"""
+
+import argparse, gzip, json, sys
+from datetime import datetime
+from sqlalchemy import DateTime, Integer, func, select
+from db import engine
+from models import Base
+
+# Rows are read, written and inserted this many at a time.
+CHUNK_SIZE = 5000
+
+def _progress(table, done, total, out=sys.stderr):
+	out.write("\r  {:<14} {:>10}/{:<10}".format(table, done, total))
+	if done >= total:
+		out.write("\n")
+	out.flush()
+
+def _encode(value):
+	if isinstance(value, datetime):
+		return value.isoformat()
+	return value
+
+def _decoders(table, columns):
+	"""
+	Return one function per column that turns a JSON value back into what
+	the column expects.
+	"""
+	def parse_datetime(value):
+		return datetime.fromisoformat(value) if value is not None else None
+	def as_is(value):
+		return value
+	return [parse_datetime if isinstance(table.c[name].type, DateTime) else as_is
+			for name in columns]
+
+def dump(path, tables=None, progress=True):
+	"""
+	Stream every table (or only the named ones) into a gzipped NDJSON file.
+	Return a dict with the number of rows written per table.
+
+	:param String path\n
+	:param list tables: table names, or None for all of them\n
+	:param bool progress: write per-table progress to stderr
+	"""
+	counts = {}
+	with gzip.open(path, "wt") as out, engine.connect() as conn:
+		conn = conn.execution_options(stream_results=True)
+		for table in Base.metadata.sorted_tables:
+			if tables and table.name not in tables:
+				continue
+			columns = [c.name for c in table.columns]
+			total = conn.execute(select([func.count()]).select_from(table)).scalar()
+			out.write(json.dumps({"table": table.name, "columns": columns,
+					"rows": total}) + "\n")
+			query = table.select().order_by(*table.primary_key.columns)
+			result = conn.execute(query)
+			done = 0
+			while True:
+				rows = result.fetchmany(CHUNK_SIZE)
+				if not rows:
+					break
+				out.write("".join(json.dumps([_encode(value) for value in row]) +
+						"\n" for row in rows))
+				done += len(rows)
+				if progress:
+					_progress(table.name, done, total)
+			result.close()
+			if progress and done == 0:
+				_progress(table.name, 0, 0)
+			counts[table.name] = done
+	return counts
+
+def delete_all_content(conn):
+	"""
+	Empty every table, children first.
+
+	:param sqlalchemy.engine.Connection conn
+	"""
+	for table in reversed(Base.metadata.sorted_tables):
+		conn.execute(table.delete())
+
+def _reset_sequences(conn, table):
+	# Rows keep their ids, so PostgreSQL's sequences must be moved past them.
+	if conn.dialect.name != "postgresql":
+		return
+	for column in table.primary_key.columns:
+		if isinstance(column.type, Integer):
+			conn.execute("SELECT setval(pg_get_serial_sequence('\"{0}\"', '{1}'), "
+					"COALESCE(MAX(\"{1}\"), 1)) FROM \"{0}\"".format(table.name,
+					column.name))
+
+def restore(path, clear=False, progress=True):
+	"""
+	Load a dump written by `dump()` with bulk inserts, one transaction per
+	table. Return a dict with the number of rows inserted per table.
+
+	:param String path\n
+	:param bool clear: empty every table before loading\n
+	:param bool progress: write per-table progress to stderr
+	"""
+	Base.metadata.create_all(engine)
+	counts = {}
+	with gzip.open(path, "rt") as dump_file, engine.connect() as conn:
+		if clear:
+			with conn.begin():
+				delete_all_content(conn)
+
+		table, columns, decoders, total = None, None, None, 0
+		batch, transaction = [], None
+
+		def insert_batch():
+			if batch:
+				conn.execute(table.insert(), batch)
+				counts[table.name] += len(batch)
+				del batch[:]
+				if progress:
+					_progress(table.name, counts[table.name], total)
+
+		def finish_table():
+			insert_batch()
+			_reset_sequences(conn, table)
+			transaction.commit()
+			if progress and total == 0:
+				_progress(table.name, 0, 0)
+
+		try:
+			for line in dump_file:
+				record = json.loads(line)
+				if isinstance(record, dict):
+					if table is not None:
+						finish_table()
+					table = Base.metadata.tables[record["table"]]
+					columns, total = record["columns"], record["rows"]
+					decoders = _decoders(table, columns)
+					counts[table.name] = 0
+					transaction = conn.begin()
+					continue
+				batch.append({name: decode(value) for name, decode, value in
+						zip(columns, decoders, record)})
+				if len(batch) >= CHUNK_SIZE:
+					insert_batch()
+			if table is not None:
+				finish_table()
+		except:
+			if transaction is not None and transaction.is_active:
+				transaction.rollback()
+			raise
+	return counts
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Dump or restore the "
+			"PowerToken database as gzipped NDJSON.")
+	subparsers = parser.add_subparsers(dest="command")
+	dump_parser = subparsers.add_parser("dump", help="write the database to a file")
+	dump_parser.add_argument("path", help="output file (.jsonl.gz)")
+	dump_parser.add_argument("--tables", nargs="+", help="only these tables")
+	restore_parser = subparsers.add_parser("restore",
+			help="load a dump into the database")
+	restore_parser.add_argument("path", help="dump file (.jsonl.gz)")
+	restore_parser.add_argument("--clear", action="store_true",
+			help="delete everything in the database first")
+	for sub in (dump_parser, restore_parser):
+		sub.add_argument("--quiet", action="store_true", help="no progress output")
+	args = parser.parse_args()
+
+	if args.command == "dump":
+		counts = dump(args.path, tables=args.tables, progress=not args.quiet)
+	elif args.command == "restore":
+		counts = restore(args.path, clear=args.clear, progress=not args.quiet)
+	else:
+		parser.print_help()
+		sys.exit(1)
+	print("{} rows in {} tables".format(sum(counts.values()), len(counts)))
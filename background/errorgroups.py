@@ -0,0 +1,117 @@
+"""
+Groups repeated errors. An expired token makes the same Fitbit or WEconnect
+call fail every cycle, so instead of one `error` row per failure, each
+distinct error gets one `error_group` row with its first and last occurrence
+and a count. Errors are the same if they have the same origin, summary and
+message, up to numbers, dates and tokens, and belong to the same user.\n
+Only a sample of the occurrences is kept as raw `error` rows (with their
+tracebacks): the first PT_ERROR_SAMPLE_FIRST (10 by default), then every
+PT_ERROR_SAMPLE_EVERY-th (100). Set PT_ERROR_SAMPLE_EVERY=1 to keep them all.\n
+The fingerprinting is stdlib only, so the benchmarks can use it too.\n
+Created on 10/19/2026.
+"""
+
+from datetime import datetime
+import hashlib, os, re
+
+SAMPLE_FIRST = int(os.environ.get("PT_ERROR_SAMPLE_FIRST") or 10)
+SAMPLE_EVERY = int(os.environ.get("PT_ERROR_SAMPLE_EVERY") or 100)
+
+# Variable parts of error text, most specific first.
+_VARIABLE = [
+	(re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-"
+			r"[0-9a-f]{12}\b", re.I), "<id>"),
+	(re.compile(r"\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?Z?)?"),
+			"<time>"),
+	# Access tokens: long runs of letters and digits, with at least one digit.
+	(re.compile(r"(?=[\w.-]*\d)[\w-]{20,}(\.[\w-]+)*"), "<token>"),
+	(re.compile(r"\d+(\.\d+)?"), "<n>"),
+	(re.compile(r"\s+"), " ")
+]
+
+def normalize(text):
+	"""
+	Return `text` with its numbers, dates, ids and tokens replaced by
+	placeholders, e.g. "Activity 42 was not deleted" becomes
+	"Activity <n> was not deleted".
+
+	:param String text
+	"""
+	text = text or ""
+	for pattern, placeholder in _VARIABLE:
+		text = pattern.sub(placeholder, text)
+	return text.strip()
+
+def fingerprint(origin, summary, message, user_id):
+	"""
+	Return the key (a hex SHA-1) shared by all the occurrences of an error.
+
+	:param String origin\n
+	:param String summary\n
+	:param String message\n
+	:param int user_id: `User.id`, or None
+	"""
+	key = "\x1f".join([origin or "", normalize(summary), normalize(message),
+			str(user_id or "")])
+	return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def is_sampled(count, first=SAMPLE_FIRST, every=SAMPLE_EVERY):
+	"""
+	Return True if the `count`-th occurrence of an error is kept as a raw row.
+
+	:param int count\n
+	:param int first\n
+	:param int every
+	"""
+	return count <= first or (every > 0 and count % every == 0)
+
+def record(session, summary, origin, message=None, user=None, traceback=None):
+	"""
+	Count an occurrence of an error in its `error_group` row (added the first
+	time), and keep it as an `error` row if it's sampled. Both are flushed in
+	the caller's transaction, which the caller commits. Return the
+	ErrorGroup. For the background scripts.
+
+	:param sqlalchemy.orm.Session session\n
+	:param String summary\n
+	:param String origin: e.g. "background/fitbit.py, in get_step_goal"\n
+	:param String message\n
+	:param background.models.User user\n
+	:param String traceback
+	"""
+	# Imported here: the models are only on the path in the background scripts.
+	from sqlalchemy.exc import IntegrityError
+	from models import Error, ErrorGroup
+	import metrics
+
+	user_id = user.id if user is not None else None
+	key = fingerprint(origin, summary, message, user_id)
+	now = datetime.now()
+	for attempt in range(2):
+		group = session.query(ErrorGroup).filter_by(fingerprint=key).first()
+		if group is not None:
+			# Counted in SQL, so concurrent writers don't lose occurrences.
+			group.count = ErrorGroup.count + 1
+			group.last_seen = now
+			session.flush()
+			break
+		group = ErrorGroup(fingerprint=key, summary=summary, origin=origin,
+				message=message, user_id=user_id, first_seen=now, last_seen=now,
+				count=1)
+		try:
+			# In a savepoint, so losing the race only undoes this insert and
+			# not the caller's work.
+			with session.begin_nested():
+				session.add(group)
+			break
+		except IntegrityError:
+			# Another process added the group first; count in theirs.
+			if attempt:
+				raise
+	if is_sampled(group.count):
+		session.add(Error(timestamp=now, summary=summary, origin=origin,
+				message=message, traceback=traceback, user_id=user_id,
+				group_id=group.id))
+		session.flush()
+	metrics.inc("pt_errors_total", origin=origin)
+	return group
@@ -0,0 +1,141 @@
+"""
+Exports the `day`, `event`, `activity` and `log` tables for offline analysis
+as a column-oriented archive (see columnar.py for the layout and the reader),
+one partition per study month.\n
+Only months that are over are exported, and a month already in the archive
+is never exported again, so a daily or monthly run only adds the months
+that closed since the last one. `activity` is small and changes over time;
+it's written as one "current" partition, replaced on every run.\n
+Needs NumPy, which the other scripts don't.\n
+Usage: `python export.py ../data/export [--tables day event] [--compress]
+[--from-snapshot]`\n
+Created on 10/19/2026.
+"""
+
+import argparse, logging, os, sys
+from datetime import datetime
+from sqlalchemy import Boolean, DateTime, Float, Integer, func, select
+from db import engine
+from models import Base
+import columnar
+
+# table: the column whose month picks the partition, or None for a snapshot
+TABLES = {
+	"day": "date",
+	"event": "date",	# The date of the event's day
+	"activity": None,
+	"log": "timestamp"
+}
+SNAPSHOT = "current"
+
+def _kind(column):
+	if isinstance(column.type, Boolean):
+		return columnar.BOOL
+	if isinstance(column.type, Integer):
+		return columnar.INT
+	if isinstance(column.type, Float):
+		return columnar.FLOAT
+	if isinstance(column.type, DateTime):
+		return columnar.DATETIME
+	return columnar.STRING
+
+def _query(name):
+	"""
+	Return (select, date column or None) for one exported table.
+	"""
+	table = Base.metadata.tables[name]
+	if name == "event":
+		day = Base.metadata.tables["day"]
+		date = day.c.date.label("date")
+		query = select(list(table.c) + [date]).select_from(
+				table.join(day, table.c.day_id == day.c.id))
+		return query.order_by(table.c.id), day.c.date
+	query = select(list(table.c)).order_by(table.c.id)
+	return query, table.c[TABLES[name]] if TABLES[name] else None
+
+def _months(first, last):
+	"""
+	Yield (name, start, end) for every month from `first`'s to `last`'s.
+	"""
+	year, month = first.year, first.month
+	while (year, month) <= (last.year, last.month):
+		start = datetime(year, month, 1)
+		year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+		yield start.strftime("%Y-%m"), start, datetime(year, month, 1)
+
+def _rolled_up(conn, start, end):
+	summary = Base.metadata.tables["log_summary"]
+	return conn.execute(select([func.count()]).select_from(summary).where(
+			summary.c.date >= start).where(summary.c.date < end)).scalar()
+
+def export(directory, tables=None, compress=False, bind=None):
+	"""
+	Write the months not yet in the archive, and the activity snapshot.
+	Return a list of (table, partition, rows) written.
+
+	:param String directory\n
+	:param list tables: table names, or None for all of TABLES\n
+	:param bool compress: write compressed .npz files (not memory-mappable)\n
+	:param bind: the engine to read, e.g. snapshot.open_engine(); by default
+	the database
+	"""
+	os.makedirs(directory, exist_ok=True)
+	manifest = columnar.load_manifest(directory)
+	this_month = datetime(datetime.now().year, datetime.now().month, 1)
+	written = []
+	with (bind or engine).connect() as conn:
+		for name in sorted(tables or TABLES):
+			query, date = _query(name)
+			columns = [(column.name, _kind(column)) for column in query.c]
+			entry = manifest["tables"].setdefault(name, {"partitions": {}})
+			entry["columns"] = columns
+
+			if date is None:
+				jobs = [(SNAPSHOT, query)]
+			else:
+				first = conn.execute(select([func.min(date)])).scalar()
+				jobs = []
+				if first is not None:
+					for month, start, end in _months(first, this_month):
+						if end > this_month or month in entry["partitions"]:
+							continue
+						jobs.append((month, query.where(date >= start).where(
+								date < end)))
+						if name == "log" and _rolled_up(conn, start, end):
+							logging.warning("log {} is incomplete: retention.py has "
+									"already rolled up some of its rows".format(month))
+
+			for partition, partition_query in jobs:
+				rows = [tuple(row) for row in conn.execute(partition_query)]
+				path = columnar.write_partition(directory, name, partition,
+						columns, rows, compress=compress)
+				entry["partitions"][partition] = {"rows": len(rows),
+						"file": os.path.basename(path),
+						"exported": datetime.now().isoformat()}
+				# Save as we go, so an interrupted run keeps what it wrote.
+				columnar.save_manifest(directory, manifest)
+				written.append((name, partition, len(rows)))
+	columnar.save_manifest(directory, manifest)
+	return written
+
+if __name__ == "__main__":
+	logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+	parser = argparse.ArgumentParser(description="Export the study tables as "
+			"a column-oriented archive, one partition per month.")
+	parser.add_argument("directory")
+	parser.add_argument("--tables", nargs="+", choices=sorted(TABLES),
+			help="only these tables")
+	parser.add_argument("--compress", action="store_true",
+			help="write compressed .npz partitions (not memory-mappable)")
+	parser.add_argument("--from-snapshot", action="store_true",
+			help="read the snapshot kept by snapshot.py instead of the database")
+	args = parser.parse_args()
+	bind = None
+	if args.from_snapshot:
+		import snapshot
+		bind = snapshot.open_engine()
+	written = export(args.directory, tables=args.tables, compress=args.compress,
+			bind=bind)
+	for table, partition, rows in written:
+		print("{:<10} {:<8} {:>8} rows".format(table, partition, rows))
+	print("{} partitions written".format(len(written)))
@@ -4,12 +4,14 @@ Created by Abigail Franz.\n
 Last modified by Abigail Franz on 4/30/2018.
 """
 
-from datetime import datetime
-import json, logging, requests
+import logging, os
+import connections
 from db import session
-from models import Error
+import errorgroups
+import usertime
 
-BASE_URL = "https://api.fitbit.com/1/user/-"
+# Override with FITBIT_API_URL to point at a stub server (see bench/stubs.py).
+BASE_URL = os.environ.get("FITBIT_API_URL") or "https://api.fitbit.com/1/user/-"
 DATE_FMT = "%Y-%m-%d"
 
 def change_step_goal(user, new_step_goal):
@@ -27,17 +29,17 @@ def change_step_goal(user, new_step_goal):
 		"value" : new_step_goal
 	}
 	auth_headers = {"Authorization": "Bearer " + user.fb_token}
-	response = requests.post(url, headers=auth_headers, params=params)
+	response = connections.request("fitbit", "change_step_goal", "POST", url,
+			headers=auth_headers, params=params)
 	if response.status_code == 200:
 		return response.json()["goals"]["steps"]
 	else:
-		error = Error(
+		errorgroups.record(session,
 			summary = "Couldn't change the step goal.",
 			origin = "background/fitbit.py, in change_step_goal",
 			message = response.json()["errors"][0]["message"],
 			user = user
 		)
-		session.add(error)
 		session.commit()
 		return 0
 
@@ -65,20 +67,20 @@ def get_daily_step_activities(user):
 
 	:param background.models.User user
 	"""
-	today = datetime.now().strftime(DATE_FMT)
+	today = usertime.now(user).strftime(DATE_FMT)
 	url = "{}/activities/date/{}.json".format(BASE_URL, today)
 	auth_headers = {"Authorization": "Bearer " + user.fb_token}
-	response = requests.get(url, headers=auth_headers)
+	response = connections.request("fitbit", "get_daily_step_activities",
+			"GET", url, headers=auth_headers)
 	if response.status_code == 200:
 		return response.json()["activities"]
 	else:
-		error = Error(
+		errorgroups.record(session,
 			summary = "Couldn't get today's step activities.",
 			origin = "background/fitbit.py, in _get_daily_step_activities",
 			message = response.json()["errors"][0]["message"],
 			user = user
 		)
-		session.add(error)
 		session.commit()
 		return []
 
@@ -92,17 +94,17 @@ def delete_activity(user, log_id):
 	"""
 	url = "{}/activities/{}.json".format(BASE_URL, log_id)
 	auth_headers = {"Authorization": "Bearer " + user.fb_token}
-	response = requests.delete(url, headers=auth_headers)
+	response = connections.request("fitbit", "delete_activity", "DELETE", url,
+			headers=auth_headers)
 	if response.status_code == 204:
 		return True
 	else:
-		error = Error(
+		errorgroups.record(session,
 			summary = "Activity {} was not successfully deleted".format(log_id),
 			origin = "background/fitbit.py, in delete_activity",
 			message = response.json()["errors"][0]["message"],
 			user = user
 		)
-		session.add(error)
 		session.commit()
 		return False
 
@@ -115,17 +117,17 @@ def get_step_goal(user):
 	"""
 	url = "{}/activities/goals/daily.json".format(BASE_URL)
 	auth_headers = {"Authorization": "Bearer " + user.fb_token}
-	response = requests.get(url, headers=auth_headers)
+	response = connections.request("fitbit", "get_step_goal", "GET", url,
+			headers=auth_headers)
 	if response.status_code == 200:
 		return response.json()["goals"]["steps"]
 	else:
-		error = Error(
+		errorgroups.record(session,
 			summary = "Couldn't get step goal. Using 1,000,000 instead.",
 			origin = "background/fitbit.py, in get_step_goal",
 			message = response.json()["errors"][0]["message"],
 			user = user
 		)
-		session.add(error)
 		session.commit()
 		return 1000000
 		
@@ -139,7 +141,7 @@ def log_step_activity(user, new_step_count):
 	:param int new_step_count
 	"""
 	url = "{}/activities.json".format(BASE_URL)
-	now = datetime.now()
+	now = usertime.now(user)
 	params = {
 		"activityId": '90013',
 		"startTime": now.strftime("%H:%M:%S"),
@@ -149,16 +151,16 @@ def log_step_activity(user, new_step_count):
 		"distanceUnit": "steps"
 	}
 	auth_headers = {"Authorization": "Bearer " + user.fb_token}
-	response = requests.post(url, headers=auth_headers, params=params)
+	response = connections.request("fitbit", "log_step_activity", "POST", url,
+			headers=auth_headers, params=params)
 	if response != 201:
 		return new_step_count
 	else:
-		error = Error(
+		errorgroups.record(session,
 			summary = "Couldn't log step activity.",
 			origin = "background/fitbit.py, in log_step_activity",
 			message = response.json()["errors"][0]["message"],
 			user = user
 		)
-		session.add(error)
 		session.commit()
 		return 0
\ No newline at end of file
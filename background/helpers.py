@@ -4,16 +4,23 @@ Created by Abigail Franz on 3/16/2018.\n
 Last modified by Abigail Franz on 5/7/2018.
 """
 
-from datetime import datetime, time, timedelta, MAXYEAR
+from datetime import datetime, time, timedelta
+import hashlib, logging, os
+from sqlalchemy import case, func, or_
 from db import session
-from models import Activity, Day, Event, Log, User
+from models import (Activity, CompletionStat, Day, Error, ErrorGroup, Event,
+		Log, LogSummary, MaintenanceStep, ProgressState, User)
+import recurrence
+import usertime
+import wcdecode
 import weconnect
 
-TODAY = datetime.combine(datetime.now().date(), time(0, 0, 0))
+# How far back catch_up looks for days the poller missed.
+CATCH_UP_DAYS = int(os.environ.get("PT_CATCH_UP_DAYS") or 14)
 
 def formatDate(dateStr):
 	"""convert WC JSON date to date object for databse"""
-	return datetime.strptime(dateStr, weconnect.DATE_FMT)
+	return wcdecode.parse_timestamp(dateStr)
 
 def delete_all_content():
 	session.query(Log).delete()
@@ -35,23 +42,42 @@ def remove_incomplete_users():
 	2. All WEconnect and Fitbit access tokens are unexpired.
 	Remove all users who do not meet these criteria, and any other records that
 	belong to the deleted users.
+
+	The incomplete users are picked out by one query, and each table is
+	cleared with a single DELETE driven by it (children first, so this works
+	whether or not the database enforces the ON DELETE CASCADE keys). Return
+	a dict with the number of rows removed from each table.
 	"""
 	""" #1 """
-	users = session.query(User).all()
-	for user in users:
-		
-		if not all([user.username, user.wc_id, user.wc_token, user.fb_token]):
-			activities = user.activities.all()
-			for activity in activities:
-				session.delete(activity)
-			days = user.days.all()
-			for day in days:
-				events = day.events.all()
-				for event in events:
-					session.delete(event)
-				session.delete(day)
-			session.delete(user)
-	session.commit()
+	incomplete = session.query(User.id).filter(or_(
+			User.username == None, User.username == "",
+			User.wc_id == None, User.wc_id == 0,
+			User.wc_token == None, User.wc_token == "",
+			User.fb_token == None, User.fb_token == ""))
+	days = session.query(Day.id).filter(Day.user_id.in_(incomplete))
+	activities = session.query(Activity.id).filter(
+			Activity.user_id.in_(incomplete))
+
+	removed = {}
+	try:
+		removed["event"] = session.query(Event).filter(or_(
+				Event.day_id.in_(days), Event.activity_id.in_(activities))).\
+				delete(synchronize_session=False)
+		for model in (CompletionStat, MaintenanceStep, ProgressState, Day,
+				Activity, Log, LogSummary, Error, ErrorGroup):
+			removed[model.__tablename__] = session.query(model).\
+					filter(model.user_id.in_(incomplete)).\
+					delete(synchronize_session=False)
+		removed["user"] = session.query(User).filter(User.id.in_(incomplete)).\
+				delete(synchronize_session=False)
+		session.commit()
+	except:
+		session.rollback()
+		raise
+	if removed["user"]:
+		logging.info("Removed incomplete users: " + ", ".join("{} {}".format(
+				count, table) for table, count in sorted(removed.items())))
+	return removed
 
 
 # Make sure no activities are expired
@@ -78,12 +104,10 @@ def add_or_update_activity(activity, user):
 	database. Return "Inserted" if activity was inserted, "Updated" if updated,
 	and False if neither.
 
-	:param dict activity: an activity from WEconnect in JSON format\n
+	:param wcdecode.WcActivity activity: an activity from WEconnect\n
 	:param background.models.User user: the user to which the activity belongs
 	"""
-	# Determines the start and end times and expiration date (if any)
-	st, et, expiration = extract_params(activity)
-	act_id = activity["activityId"]
+	act_id = activity.activity_id
 
 	# Flag indicating whether or not the activity was inserted/updated
 	status = False
@@ -92,55 +116,41 @@ def add_or_update_activity(activity, user):
 	# modified recently. If yes, updates it. If not, ignores it.
 	existing = session.query(Activity).filter(Activity.wc_act_id == act_id).first()
 	if existing:
-		modified = datetime.strptime(activity["dateModified"], weconnect.DATE_FMT)
-		if modified >= datetime.now() - timedelta(days=1):
-			existing.name = activity["name"]
-			existing.expiration = expiration
+		modified = activity.modified or datetime.now()
+		# Rows stored before schedules were kept get theirs filled in once.
+		if modified >= datetime.now() - timedelta(days=1) or \
+				existing.start_time is None:
+			existing.name = activity.name
+			existing.expiration = activity.expiration
+			existing.start_time = activity.start
+			existing.duration = activity.duration
+			existing.repeat = activity.repeat
 			session.commit()
 			status = "Updated"
 		else:
 			status = False
 	else:
 		# If the activity doesn't exist in the database, adds it.
-		new = Activity(wc_act_id=act_id, name=activity["name"], 
-			expiration=expiration, user=user)
+		new = Activity(wc_act_id=act_id, name=activity.name,
+			expiration=activity.expiration, start_time=activity.start,
+			duration=activity.duration, repeat=activity.repeat, user=user)
 		session.add(new)
 		session.commit()
 		status = "Inserted"
 
 	return status
 
-def extract_params(activity):
-	"""
-	Given a JSON activity object from WEconnect, extract the important
-	parameters (start time, end time, and expiration date).
-
-	:param dict activity: an activity from WEconnect in JSON format
-	"""
-	# Determines the start and end times
-	ts = datetime.strptime(activity["dateStart"], weconnect.DATE_FMT)
-	te = ts + timedelta(minutes=activity["duration"])
-
-	# Determines the expiration date (if any)
-	expiration = datetime(MAXYEAR, 12, 31)
-	if activity["repeat"] == "never":
-		expiration = te
-	if activity["repeatEnd"] != None:
-		expiration = datetime.strptime(activity["repeatEnd"], weconnect.DATE_FMT)
-
-	return ts, te, expiration
-
 def get_users_with_current_events():
 	"""
 	Get a list of all the users who have events starting or ending within
 	the next 15 minutes. Not currently in use.
 	"""
 	users_to_monitor = []
-	now = datetime.now().time()
 	margin = timedelta(minutes=15)
 	users = session.query(User).all()
 	for user in users:
-		day = user.days.filter(Day.date == TODAY)
+		now = usertime.now(user).time()
+		day = user.days.filter(Day.date == usertime.today(user))
 		events = day.events.filter((Event.start_time - margin).time() <= now).\
 				filter(now <= (Event.end_time + margin).time()).count()
 		if events:
@@ -155,58 +165,210 @@ def get_yesterdays_progress(user):
 	:param background.models.User user: the user for which to get progress
 	"""
 	yesterdays_logs = []
-	yesterday = datetime.now() - timedelta(days=1)
+	yesterday = usertime.now(user) - timedelta(days=1)
 	start = datetime(yesterday.year, yesterday.month, yesterday.day, 0, 0)
 	end = datetime(yesterday.year, yesterday.month, yesterday.day, 23, 59)
 	yest_log = user.logs.filter(Log.timestamp > start, Log.timestamp < end).\
 			order_by(Log.timestamp.desc()).first()
 	return yest_log.daily_progress
 
-def update_activities(user):
+def update_activities(user, known_digest=None):
 	"""
 	If the user has added or updated any WEconnect activities, update the
-	database.
+	database. Return a digest of the activities; if it's `known_digest`
+	(nothing changed since the digest was taken), the database isn't touched.
+	Raises IOError if WEconnect doesn't answer with the activities.
 
-	:param background.models.User user
+	:param background.models.User user\n
+	:param String known_digest: the digest returned by an earlier call
 	"""
-	wc_acts = weconnect.get_activities(user)
+	wc_acts = weconnect.get_activities(user, raise_errors=True)
+	# The records' repr lists every field, in a fixed order.
+	digest = hashlib.sha1(repr(wc_acts).encode("utf-8")).hexdigest()
+	if digest == known_digest:
+		return digest
 	for act in wc_acts:
 		add_or_update_activity(act, user)
+	return digest
 
 def populate_today(user):
 	"""
 	Populate the database (`day` and `event` tables) with a list of the user's 
-	events that occur today.
+	events that occur today, in the user's time zone.
 
 	:param background.models.User user: the user for which to get events
 	"""
+	today = usertime.today(user)
 	# Add a new Day to the user's days table if it doesn't already exist
-	day = user.days.filter(Day.date == TODAY).first()
+	day = user.days.filter(Day.date == today).first()
 	if day is None:
-		day = Day(date=datetime(TODAY.year, TODAY.month, TODAY.day), user=user)
+		day = Day(date=today, user=user)
 		session.add(day)
 		session.commit()
 
-	# Get today's events from WEconnect and add them to the day's events table
-	activity_events = weconnect.get_todays_events(user)
+	# Expand today's events from the stored activity schedules. Check-in
+	# status (and the WEconnect event ids) come later, from the poller.
+	expected = recurrence.expected_events(user, today, today)
+	if expected is None:
+		_populate_today_from_weconnect(user, day)
+		return
+	scheduled = set(activity_id for (activity_id,) in
+			session.query(Event.activity_id).filter(Event.day_id == day.id))
+	for act, st, et in expected[today]:
+		if act.id not in scheduled:
+			session.add(Event(start_time=st, end_time=et, completed=False,
+					day=day, activity=act))
+	session.commit()
+
+def _populate_today_from_weconnect(user, day):
+	"""
+	Add today's events from WEconnect's activities-with-events, for users
+	whose activities can't be expanded locally. Raises IOError if WEconnect
+	doesn't answer with them.
+
+	:param background.models.User user\n
+	:param background.models.Day day: today's `day` row
+	"""
+	activity_events = weconnect.get_todays_events(user, raise_errors=True)
 	for wc_act in activity_events:
-		act = user.activities.filter(Activity.wc_act_id == wc_act["activityId"]).first()
-		for wc_ev in wc_act["events"]:
+		act = user.activities.filter(Activity.wc_act_id == wc_act.activity_id).first()
+		for wc_ev in wc_act.events or []:
 			# If the event doesn't already exist for today, add it
-			event = session.query(Event).filter(Event.eid == wc_ev["eid"]).first()
+			event = find_event(user, wc_ev)
 			if event:
-				modified = datetime.strptime(wc_act["dateModified"], weconnect.DATE_FMT)
+				modified = wc_act.modified or datetime.now()
 				if modified >= datetime.now() - timedelta(days=1):
-					event.start_time = datetime.strptime(wc_ev["dateStart"], weconnect.DATE_FMT)
-					event.end_time = act.start_time + timedelta(minutes=wc_ev["duration"])
-					event.completed = wc_ev["didCheckin"]
+					event.start_time = usertime.from_utc(wc_ev.start, user)
+					event.end_time = usertime.from_utc(wc_ev.end, user)
+					event.completed = wc_ev.completed
 			else:
-				st = datetime.strptime(wc_ev["dateStart"], weconnect.DATE_FMT)
-				et = st + timedelta(minutes=wc_ev["duration"])
-				event = Event(eid=wc_ev["eid"], start_time=st, end_time=et,
-						completed=wc_ev["didCheckin"], day=day, activity=act)
+				event = Event(eid=wc_ev.eid,
+						start_time=usertime.from_utc(wc_ev.start, user),
+						end_time=usertime.from_utc(wc_ev.end, user),
+						completed=wc_ev.completed, day=day, activity=act)
+				session.add(event)
+	session.commit()
+
+def find_event(user, wc_ev):
+	"""
+	Return the `event` row for a WEconnect event, or None. Events expanded
+	locally (see recurrence.py) have no WEconnect id until first polled; such
+	an event is matched by activity and date, and takes the WEconnect id.
+
+	:param background.models.User user\n
+	:param wcdecode.WcEvent wc_ev: an event from WEconnect
+	"""
+	event = session.query(Event).filter(Event.eid == wc_ev.eid).first()
+	if event is not None:
+		return event
+	st = usertime.from_utc(wc_ev.start, user)
+	event = session.query(Event).join(Day).\
+			join(Activity, Event.activity_id == Activity.id).\
+			filter(Day.user_id == user.id).\
+			filter(Day.date == datetime.combine(st.date(), time(0, 0, 0))).\
+			filter(Activity.wc_act_id == wc_ev.activity_id).\
+			filter(Event.eid == None).first()
+	if event is not None:
+		event.eid = wc_ev.eid
+	return event
+
+def find_missing_days(user, lookback_days=CATCH_UP_DAYS):
+	"""
+	Return the dates (midnight datetimes, oldest first) between the user's
+	registration (at most `lookback_days` ago) and yesterday (in the user's
+	time zone) that have no `day` row.
+
+	:param background.models.User user\n
+	:param int lookback_days
+	"""
+	today = usertime.today(user)
+	first = today - timedelta(days=lookback_days)
+	if user.registered_on is not None:
+		registered = datetime.combine(user.registered_on.date(), time(0, 0, 0))
+		first = max(first, registered)
+	present = set(date for (date,) in session.query(Day.date).\
+			filter(Day.user_id == user.id).\
+			filter(Day.date >= first, Day.date < today))
+	missing = []
+	date = first
+	while date < today:
+		if date not in present:
+			missing.append(date)
+		date += timedelta(days=1)
+	return missing
+
+def catch_up(user, lookback_days=CATCH_UP_DAYS):
+	"""
+	Fill in the days the poller missed (e.g. while its host was down). The
+	events for the whole missing range are fetched from WEconnect in one
+	request, split into per-day `day` and `event` rows, and the progress of
+	every affected day is recomputed at once. Return the number of days
+	added. Raises IOError if WEconnect doesn't answer with the events, so no
+	empty days are added in their place.
+
+	:param background.models.User user\n
+	:param int lookback_days: how far back to look for missing days
+	"""
+	missing = find_missing_days(user, lookback_days)
+	if not missing:
+		return 0
+	first, last = missing[0], missing[-1]
+	activity_events = weconnect.get_events_between(user, first, last,
+			"catch_up", raise_errors=True)
+
+	# Everything needed to sort the events into days, in three queries.
+	days = dict((day.date, day) for day in user.days.filter(Day.date >= first,
+			Day.date <= last))
+	for date in missing:
+		days[date] = Day(date=date, user=user)
+	session.add_all([days[date] for date in missing])
+	activities = dict((act.wc_act_id, act) for act in user.activities)
+	known, unpolled = {}, {}
+	for event in session.query(Event).join(Day).\
+			filter(Day.user_id == user.id).\
+			filter(Day.date >= first, Day.date <= last):
+		if event.eid is None:
+			# Expanded locally (recurrence.py) and never polled.
+			unpolled[(event.activity_id, event.day_id)] = event
+		else:
+			known[event.eid] = event
+
+	affected = set(missing)
+	for wc_act in activity_events:
+		act = activities.get(wc_act.activity_id)
+		for wc_ev in wc_act.events or []:
+			start = usertime.from_utc(wc_ev.start, user)
+			date = datetime.combine(start.date(), time(0, 0, 0))
+			if date not in days:
+				continue
+			event = known.get(wc_ev.eid) or unpolled.pop((act.id if act else None,
+					days[date].id), None)
+			if event is None:
+				event = Event(day=days[date], activity=act)
 				session.add(event)
+			event.eid = wc_ev.eid
+			event.start_time = start
+			event.end_time = usertime.from_utc(wc_ev.end, user)
+			event.completed = wc_ev.completed
+			affected.add(date)
+	session.flush()
+
+	# Tally progress (completed / scheduled events) for every affected day.
+	day_ids = [days[date].id for date in affected]
+	tallies = session.query(Event.day_id, func.count(Event.id),
+			func.sum(case([(Event.completed == True, 1)], else_=0))).\
+			filter(Event.day_id.in_(day_ids)).group_by(Event.day_id)
+	progress = dict((day_id, float(done) / total if total else 0.0)
+			for day_id, total, done in tallies)
+	for date in affected:
+		days[date].computed_progress = progress.get(days[date].id, 0.0)
+	# The adherence cache may already cover later days; have it recount.
+	session.query(CompletionStat).filter(CompletionStat.user_id == user.id).\
+			filter(CompletionStat.date >= first).delete(synchronize_session=False)
 	session.commit()
+	logging.info("Caught up {} missing days ({} to {}) for {}".format(
+			len(missing), first.date(), last.date(), user))
+	return len(missing)
 
 def compute_possible_score(day):
     """
@@ -0,0 +1,60 @@
+"""
+Per-user locks shared by the background scripts and the Flask app, so that a
+pushed check-in (app/hooks.py) and the regular poller never work on the same
+user at the same time.\n
+The locks are `flock`s on one small file per user in PT_LOCK_DIR, so they
+hold across processes on one host and are released if a process dies.\n
+Created on 10/19/2026.
+"""
+
+from contextlib import contextmanager
+import fcntl, os, time
+
+LOCK_DIR = os.environ.get("PT_LOCK_DIR") or os.path.join(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+		"data", "locks")
+LOCK_TIMEOUT = float(os.environ.get("PT_LOCK_TIMEOUT") or 30)
+
+class LockTimeout(Exception):
+	"""
+	Raised when a user's lock can't be acquired within the timeout.
+	"""
+	pass
+
+@contextmanager
+def user_lock(user_id, timeout=LOCK_TIMEOUT, database=None):
+	"""
+	Hold the lock for one user for the duration of a `with` block.
+
+		with locks.user_lock(user.id, database=db.DATABASE):
+			...
+
+	:param int user_id: `User.id`\n
+	:param float timeout: seconds to wait before raising LockTimeout\n
+	:param String database: the cohort database the user is in (see
+	cohorts.py), None for the default one
+	"""
+	if not os.path.isdir(LOCK_DIR):
+		os.makedirs(LOCK_DIR, exist_ok=True)
+	name = "user-{}.lock".format(user_id)
+	if database and database != "default":
+		# User ids are only unique within a database.
+		name = "{}-{}".format(database, name)
+	path = os.path.join(LOCK_DIR, name)
+	lock_file = open(path, "a")
+	try:
+		deadline = time.time() + timeout
+		while True:
+			try:
+				fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+				break
+			except (IOError, OSError):
+				if time.time() >= deadline:
+					raise LockTimeout("user {} is locked".format(user_id))
+				time.sleep(0.05)
+		try:
+			yield
+		finally:
+			fcntl.flock(lock_file, fcntl.LOCK_UN)
+	finally:
+		lock_file.close()
@@ -1,33 +1,197 @@
 """
 Script that makes sure the database is up-to-date.\n
-Meant to be run as a job in CronTab.\n
+Meant to be run as a job in CronTab, every 10 minutes or so: each user is
+maintained once a day, soon after their local midnight.\n
 Created by Abigail Franz on 2/28/2018.\n
 Last modified by Abigail Franz on 5/5/2018.
 """
 
-from db import session
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import logging, os, zlib
+from db import DATABASE, session
 import fitbit
-from helpers import (populate_today, remove_expired_activities, 
+from helpers import (catch_up, populate_today, remove_expired_activities, 
 		remove_incomplete_users, update_activities)
-from models import User
+import locks
+import metrics
+from models import MaintenanceStep, User
+import sharding
+import tracing
+import usertime
 
-def maintain():
+# Each user's daily maintenance runs at a stable offset of up to this many
+# minutes after their local midnight, so the upstream calls are spread out.
+STAGGER_MINUTES = int(os.environ.get("PT_MAINTENANCE_STAGGER_MINUTES") or 60)
+# Set PT_MAINTAIN_ALL=1 to maintain every user now, due or not.
+MAINTAIN_ALL = bool(int(os.environ.get("PT_MAINTAIN_ALL") or 0))
+# Users maintained at once in one process (each in its own thread).
+THREADS = int(os.environ.get("PT_MAINTENANCE_THREADS") or 4)
+STEP_GOAL = 1000000
+
+def _update_activities(user, previous):
+	# The digest of the user's activities; unchanged means nothing to write.
+	return update_activities(user, known_digest=previous)
+
+def _catch_up(user, previous):
+	return str(catch_up(user))
+
+def _populate_today(user, previous):
+	populate_today(user)
+	return None
+
+def _change_step_goal(user, previous):
+	# Once set, the goal stays; it's only sent again after a failure, or
+	# after a new Fitbit login (the app clears this checkpoint).
+	if previous == str(STEP_GOAL):
+		return previous
+	# change_step_goal records a failed request and returns 0.
+	goal = fitbit.change_step_goal(user, STEP_GOAL)
+	if goal != STEP_GOAL:
+		raise IOError("Fitbit didn't set the step goal (got {})".format(goal))
+	return str(goal)
+
+# The daily steps, in order: (name, function taking the user and the
+# step's previous outcome and returning its new outcome).
+STEPS = [
+	("update_activities", _update_activities),
+	("catch_up", _catch_up),
+	("populate_today", _populate_today),
+	("change_step_goal", _change_step_goal)
+]
+
+def stagger(user):
+	"""
+	Return how long after the user's local midnight their maintenance runs.
+	"""
+	if STAGGER_MINUTES <= 0:
+		return timedelta(0)
+	key = zlib.crc32(str(user.id).encode("utf-8")) & 0xffffffff
+	return timedelta(seconds=key % (STAGGER_MINUTES * 60))
+
+def is_due(user):
+	"""
+	Return True if the user hasn't been maintained yet on their current
+	local day and it's past their slot, or has never been maintained.
+
+	:param background.models.User user
 	"""
-	Accomplishes 5 maintenance tasks:
+	if user.maintained_on is None:
+		return True
+	today = usertime.today(user)
+	return user.maintained_on < today and \
+			usertime.now(user) >= today + stagger(user)
+
+def maintain(users=None, force=MAINTAIN_ALL, threads=THREADS):
+	"""
+	Accomplishes 6 maintenance tasks:
 	* Deletes all incomplete profiles from the `user` table.
 	* If any users have been removed from the database, deletes their 
 	  `activity` and `day` (and corresponding `event`) records.
 	* If users have added or updated activities, updates the database.
+	* Fills in any recent days that were missed while the scripts weren't
+	  running (see `helpers.catch_up`).
 	* Populates each user's `day` and corresponding `event` records for today.
 	* Makes sure all users have Fitbit step goals of 1,000,00
 
+	The last four run once per user per day, shortly after the user's local
+	midnight (see `is_due`), so this is meant to run every few minutes. Up to
+	`threads` users are maintained at once. Return the number of users whose
+	steps all succeeded.
+
+	When run for one shard, `users` is that shard's users and the cleanup of
+	incomplete profiles has already been done by the caller.
+
+	:param list users: the users to maintain (default: all of them)\n
+	:param bool force: maintain every user, due or not\n
+	:param int threads
+	"""
+	if users is None:
+		remove_incomplete_users()
+		users = session.query(User).all()
+	due = [user for user in users if force or is_due(user)]
+	if threads <= 1 or len(due) <= 1:
+		return sum(_maintain_or_skip(user) for user in due)
+
+	# Each thread has its own session (db.session is thread-local), so it
+	# loads its users again. End this thread's transaction so it doesn't hold
+	# the database while they write.
+	user_ids = [user.id for user in due]
+	session.commit()
+	pool = ThreadPoolExecutor(threads)
+	try:
+		return sum(pool.map(_maintain_in_thread, user_ids))
+	finally:
+		pool.shutdown()
+
+def _maintain_in_thread(user_id):
+	try:
+		return _maintain_or_skip(session.query(User).get(user_id))
+	finally:
+		session.remove()
+
+def _maintain_or_skip(user):
+	try:
+		return maintain_user(user)
+	except locks.LockTimeout as e:
+		# The poller or a pushed check-in has the user; next run.
+		logging.warning("Maintenance skipped for {}: {}".format(user, e))
+		return False
+	except Exception:
+		# A bug or bad data for one user mustn't stop everyone else's.
+		session.rollback()
+		logging.exception("Maintenance failed for {}".format(user))
+		metrics.inc("pt_maintenance_users_failed_total")
+		return False
+
+def maintain_user(user):
+	"""
+	Run the daily steps the user doesn't have a checkpoint for today, each
+	followed by its checkpoint, so a rerun after a crash resumes where this
+	one stopped. A step whose upstream is unreachable, answers with an error,
+	or whose circuit breaker is open, is logged and left for the next run. Return True if
+	every step is done for today. Runs under the user's lock.
+
+	:param background.models.User user
 	"""
-	remove_incomplete_users()
-	users = session.query(User).all()
-	for user in users:
-		update_activities(user)
-		populate_today(user)
-		fitbit.change_step_goal(user, 1000000)
+	today = usertime.today(user)
+	done = True
+	with tracing.span("user", "maintain", user=user.id), \
+			locks.user_lock(user.id, database=DATABASE):
+		checkpoints = dict((checkpoint.step, checkpoint) for checkpoint in
+				session.query(MaintenanceStep).filter_by(user_id=user.id))
+		for name, func in STEPS:
+			checkpoint = checkpoints.get(name)
+			if checkpoint is not None and checkpoint.date == today:
+				metrics.inc("pt_maintenance_steps_total", step=name,
+						outcome="checkpointed")
+				continue
+			previous = checkpoint.result if checkpoint is not None else None
+			with tracing.span("step", name):
+				try:
+					result = func(user, previous)
+				except IOError as e:
+					session.rollback()
+					logging.warning("{} skipped for {}: {}".format(name, user, e))
+					metrics.inc("pt_maintenance_steps_total", step=name,
+							outcome="failed")
+					done = False
+					continue
+			metrics.inc("pt_maintenance_steps_total", step=name, outcome="ran"
+					if result != previous or previous is None else "unchanged")
+			if checkpoint is None:
+				checkpoint = MaintenanceStep(user_id=user.id, step=name)
+				session.add(checkpoint)
+				checkpoints[name] = checkpoint
+			checkpoint.date = today
+			checkpoint.result = result
+			checkpoint.finished_at = datetime.now()
+			session.commit()
+		if done:
+			user.maintained_on = today
+			session.commit()
+	return done
 
 if __name__ == "__main__":
-	maintain()
\ No newline at end of file
+	sharding.main(maintain, "Bring the database up to date.",
+			setup=remove_incomplete_users)
\ No newline at end of file
@@ -0,0 +1,214 @@
+"""
+Operational metrics shared by the background scripts and the Flask app.\n
+Each process keeps its counters, gauges and latency histograms in memory and
+periodically adds them to a small SQLite file (PT_METRICS_PATH), which every
+process on the host shares. The Flask app reads that file back and serves it
+in the Prometheus text format at /admin/metrics.\n
+This module only uses the standard library, so both `import metrics` (from
+the background scripts) and `from background import metrics` work.\n
+Created on 10/19/2026.
+"""
+
+import atexit, os, sqlite3, threading, time
+
+STORE_PATH = os.environ.get("PT_METRICS_PATH") or os.path.join(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+		"data", "metrics.db")
+FLUSH_SECONDS = float(os.environ.get("PT_METRICS_FLUSH_SECONDS") or 10)
+
+# Upper bounds (in seconds) of the latency histogram buckets.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+		30.0, 60.0, 300.0)
+
+COUNTER, GAUGE, HISTOGRAM = "counter", "gauge", "histogram"
+
+_lock = threading.Lock()
+_pending = {}	# (name, labels, suffix) -> [kind, value]
+_last_flush = time.time()
+
+def _labels(labels):
+	"""
+	Render labels as they appear in the text format, sorted by name.
+	"""
+	parts = []
+	for key in sorted(labels):
+		value = str(labels[key]).replace("\\", "\\\\").replace("\n", "\\n").\
+				replace('"', '\\"')
+		parts.append('{}="{}"'.format(key, value))
+	return ",".join(parts)
+
+def _add(kind, name, labels, suffix, value):
+	key = (name, labels, suffix)
+	entry = _pending.get(key)
+	if entry is None:
+		_pending[key] = [kind, value]
+	elif kind == GAUGE:
+		entry[1] = value
+	else:
+		entry[1] += value
+
+def inc(name, value=1, **labels):
+	"""
+	Add to a counter.
+	"""
+	with _lock:
+		_add(COUNTER, name, _labels(labels), "", value)
+
+def set_gauge(name, value, **labels):
+	"""
+	Set a gauge (the last value written by any process wins).
+	"""
+	with _lock:
+		_add(GAUGE, name, _labels(labels), "", value)
+
+def observe(name, seconds, **labels):
+	"""
+	Record one duration in a latency histogram.
+	"""
+	rendered = _labels(labels)
+	with _lock:
+		for bound in BUCKETS:
+			if seconds <= bound:
+				_add(HISTOGRAM, name, rendered, repr(bound), 1)
+		_add(HISTOGRAM, name, rendered, "+Inf", 1)
+		_add(HISTOGRAM, name, rendered, "sum", seconds)
+		_add(HISTOGRAM, name, rendered, "count", 1)
+
+class timer(object):
+	"""
+	Context manager that observes how long its block took.
+
+		with metrics.timer("pt_cycle_seconds", cycle="maintain"):
+			...
+	"""
+	def __init__(self, name, **labels):
+		self.name = name
+		self.labels = labels
+
+	def __enter__(self):
+		self.start = time.time()
+		return self
+
+	def __exit__(self, *exc):
+		self.seconds = time.time() - self.start
+		observe(self.name, self.seconds, **self.labels)
+		return False
+
+def record_upstream(upstream, endpoint, status, seconds):
+	"""
+	Count and time one call to Fitbit or WEconnect.
+
+	:param String upstream: "fitbit" or "weconnect"\n
+	:param String endpoint: the name of the calling API function\n
+	:param status: the HTTP status code, or "error" if there was no response\n
+	:param float seconds
+	"""
+	observe("pt_upstream_request_seconds", seconds, upstream=upstream,
+			endpoint=endpoint)
+	inc("pt_upstream_requests_total", upstream=upstream, endpoint=endpoint,
+			status=status)
+	if status == "error" or status >= 400:
+		inc("pt_upstream_failures_total", upstream=upstream, endpoint=endpoint)
+
+def _connect():
+	directory = os.path.dirname(STORE_PATH)
+	if directory and not os.path.isdir(directory):
+		os.makedirs(directory)
+	conn = sqlite3.connect(STORE_PATH, timeout=5)
+	conn.execute("PRAGMA journal_mode=WAL")
+	conn.execute("CREATE TABLE IF NOT EXISTS sample (name TEXT, labels TEXT, "
+			"suffix TEXT, kind TEXT, value REAL, updated REAL, "
+			"PRIMARY KEY (name, labels, suffix))")
+	return conn
+
+def flush():
+	"""
+	Add everything recorded since the last flush to the shared store. Errors
+	are swallowed: metrics must never break a poll cycle or a page.
+	"""
+	global _last_flush
+	with _lock:
+		pending = _pending.copy()
+		_pending.clear()
+		_last_flush = time.time()
+	if not pending:
+		return
+	now = time.time()
+	rows = [(name, labels, suffix, kind, value, now)
+			for (name, labels, suffix), (kind, value) in pending.items()]
+	try:
+		conn = _connect()
+		with conn:
+			conn.executemany("INSERT INTO sample VALUES (?, ?, ?, ?, ?, ?) "
+					"ON CONFLICT (name, labels, suffix) DO UPDATE SET "
+					"value = CASE WHEN excluded.kind = 'gauge' THEN excluded.value "
+					"ELSE value + excluded.value END, updated = excluded.updated",
+					rows)
+		conn.close()
+	except sqlite3.Error:
+		pass
+
+def maybe_flush():
+	"""
+	Flush if FLUSH_SECONDS have passed since the last flush. Cheap enough to
+	call after every request.
+	"""
+	if time.time() - _last_flush >= FLUSH_SECONDS:
+		flush()
+
+def render():
+	"""
+	Return the contents of the shared store in the Prometheus text format.
+	"""
+	try:
+		conn = _connect()
+		rows = conn.execute("SELECT name, labels, suffix, kind, value FROM "
+				"sample ORDER BY name, labels").fetchall()
+		conn.close()
+	except sqlite3.Error:
+		rows = []
+
+	lines, typed = [], set()
+	order = dict((repr(b), i) for i, b in enumerate(BUCKETS))
+	order.update({"+Inf": len(BUCKETS), "sum": len(BUCKETS) + 1,
+			"count": len(BUCKETS) + 2})
+	rows.sort(key=lambda r: (r[0], r[1], order.get(r[2], -1)))
+	for name, labels, suffix, kind, value in rows:
+		if name not in typed:
+			lines.append("# TYPE {} {}".format(name, kind))
+			typed.add(name)
+		if kind != HISTOGRAM:
+			series, extra = name, labels
+		elif suffix in ("sum", "count"):
+			series, extra = "{}_{}".format(name, suffix), labels
+		else:
+			series = name + "_bucket"
+			le = 'le="{}"'.format(suffix)
+			extra = "{},{}".format(labels, le) if labels else le
+		lines.append("{}{{{}}} {}".format(series, extra, repr(float(value))) if extra
+				else "{} {}".format(series, repr(float(value))))
+	return "\n".join(lines) + "\n"
+
+_commit_timer = threading.local()
+
+def _before_commit(session):
+	_commit_timer.start = time.time()
+
+def _after_commit(session):
+	start = getattr(_commit_timer, "start", None)
+	if start is not None:
+		observe("pt_db_commit_seconds", time.time() - start)
+		_commit_timer.start = None
+
+def instrument_commits():
+	"""
+	Time every SQLAlchemy session commit in this process
+	(pt_db_commit_seconds).
+	"""
+	from sqlalchemy import event
+	from sqlalchemy.orm import Session
+	if not event.contains(Session, "before_commit", _before_commit):
+		event.listen(Session, "before_commit", _before_commit)
+		event.listen(Session, "after_commit", _after_commit)
+
+atexit.register(flush)
@@ -6,9 +6,11 @@ Last modified by Abigail Franz on 4/30/2018.
 """
 
 from datetime import datetime
-from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, Float, Boolean
+from sqlalchemy import (Column, ForeignKey, Integer, String, DateTime, Float,
+		Boolean, UniqueConstraint)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+import usertime
 
 Base = declarative_base()
 
@@ -33,20 +35,31 @@ class User(Base):
 	__tablename__ = "user"
 	id = Column(Integer, primary_key=True)
 	username = Column(String(32), nullable=False, index=True, unique=True)
-	registered_on = Column(DateTime, index=True, default=datetime.now())
+	registered_on = Column(DateTime, index=True, default=datetime.now)
 	goal_period = Column(String(16), default="daily")
 	wc_id = Column(Integer, unique=True)
 	wc_token = Column(String(128))
 	fb_token = Column(String(256))
-	logs = relationship("Log", backref="user", lazy="dynamic")
-	activities = relationship("Activity", backref="user", lazy="dynamic")
-	errors = relationship("Error", backref="user", lazy="dynamic")
-	days = relationship("Day", backref="user", lazy="dynamic")
+	shard = Column(Integer, index=True)	# Poller shard, see sharding.py
+	shard_count = Column(Integer)	# Shard count when `shard` was assigned
+	timezone = Column(String(64))	# IANA name; None means server time
+	maintained_on = Column(DateTime)	# The user's day last maintained
+	cohort = Column(String(32), index=True)	# Study cohort, see cohorts.py
+	logs = relationship("Log", backref="user", lazy="dynamic",
+			passive_deletes=True)
+	log_summaries = relationship("LogSummary", backref="user", lazy="dynamic",
+			passive_deletes=True)
+	activities = relationship("Activity", backref="user", lazy="dynamic",
+			passive_deletes=True)
+	errors = relationship("Error", backref="user", lazy="dynamic",
+			passive_deletes=True)
+	error_groups = relationship("ErrorGroup", backref="user", lazy="dynamic",
+			passive_deletes=True)
+	days = relationship("Day", backref="user", lazy="dynamic",
+			passive_deletes=True)
 
 	def thisday(self):
-		d = datetime.now()
-		today = datetime(d.year, d.month, d.day)
-		return self.days.filter(Day.date == today).first()
+		return self.days.filter(Day.date == usertime.today(self)).first()
 
 	def __repr__(self):
 		return "<User {}>".format(self.username)
@@ -58,14 +71,94 @@ class Log(Base):
 	"""
 	__tablename__ = "log"
 	id = Column(Integer, primary_key=True)
-	timestamp = Column(DateTime, index=True, default=datetime.now())
+	timestamp = Column(DateTime, index=True, default=datetime.now)
 	wc_progress = Column(Float)
 	fb_step_count = Column(Integer)
-	user_id = Column(Integer, ForeignKey("user.id"))
+	user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"))
 
 	def __repr__(self):
 		return "<Log {}>".format(self.id)
 
+class LogSummary(Base):
+	"""
+	Represents one user's progress logs for one day, rolled up by the
+	retention job (retention.py) once the raw `log` rows have aged out.
+	"""
+	__tablename__ = "log_summary"
+	id = Column(Integer, primary_key=True)
+	date = Column(DateTime, index=True)	# Time portion is ignored
+	log_count = Column(Integer)
+	min_wc_progress = Column(Float)
+	max_wc_progress = Column(Float)
+	max_fb_step_count = Column(Integer)
+	user_id = Column(Integer, ForeignKey("user.id",
+			ondelete="CASCADE"), index=True)
+
+	def __repr__(self):
+		return "<LogSummary {} for {}>".format(self.date.strftime("%Y-%m-%d"),
+				self.user_id)
+
+class ProgressState(Base):
+	"""
+	Running progress totals for one user's current day, kept up to date by
+	progress.py as events and weights change. Rebuilt from scratch when the
+	day rolls over or the row is deleted.
+	"""
+	__tablename__ = "progress_state"
+	id = Column(Integer, primary_key=True)
+	date = Column(DateTime)	# The day the totals are for
+	possible_score = Column(Integer, default=0)	# Sum of today's event weights
+	score = Column(Integer, default=0)	# Sum of today's completed weights
+	fade = Column(String(64))	# JSON list: fade points from 1 to 4 days ago
+	event_count = Column(Integer, default=0)
+	completed_count = Column(Integer, default=0)
+	user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"),
+			unique=True)
+
+	def __repr__(self):
+		return "<ProgressState for {}>".format(self.user_id)
+
+class CompletionStat(Base):
+	"""
+	One user's event and check-in counts for one activity on one closed day,
+	cached for the admin adherence views (app/analytics.py). catch_up() drops
+	the rows from the first day it fills in, so they're recounted.
+	"""
+	__tablename__ = "completion_stat"
+	__table_args__ = (UniqueConstraint("user_id", "date", "activity_id"),)
+	id = Column(Integer, primary_key=True)
+	date = Column(DateTime, index=True)	# Time portion is ignored
+	weekday = Column(Integer)	# 0 = Sunday
+	event_count = Column(Integer, default=0)
+	completed_count = Column(Integer, default=0)
+	activity_id = Column(Integer, ForeignKey("activity.id", ondelete="CASCADE"))
+	user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"),
+			index=True)
+
+	def __repr__(self):
+		return "<CompletionStat {} for {}>".format(self.date.strftime("%Y-%m-%d"),
+				self.user_id)
+
+class MaintenanceStep(Base):
+	"""
+	A checkpoint for one of a user's daily maintenance steps (see
+	maintenance.py): the user's day it last finished on, and its outcome.
+	A rerun on the same day skips the step, and the outcome lets the next
+	day skip work whose result is already known.
+	"""
+	__tablename__ = "maintenance_step"
+	__table_args__ = (UniqueConstraint("user_id", "step"),)
+	id = Column(Integer, primary_key=True)
+	step = Column(String(32))	# e.g. "change_step_goal"
+	date = Column(DateTime)	# The user's day it finished on
+	result = Column(String(64))	# Outcome, e.g. the step goal set
+	finished_at = Column(DateTime, default=datetime.now)
+	user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"),
+			index=True)
+
+	def __repr__(self):
+		return "<MaintenanceStep {} for {}>".format(self.step, self.user_id)
+
 class Activity(Base):
 	"""
 	Represents a WEconnect activity.
@@ -75,25 +168,55 @@ class Activity(Base):
 	wc_act_id = Column(Integer, index=True, unique=True)
 	name = Column(String(256))
 	expiration = Column(DateTime, index=True)
+	start_time = Column(DateTime)	# First occurrence (UTC), see recurrence.py
+	duration = Column(Integer)	# Minutes
+	repeat = Column(String(16))	# WEconnect's "never", "daily", "weekly", ...
 	weight = Column(Integer, default=1)
-	user_id = Column(Integer, ForeignKey("user.id"))
-	events = relationship("Event", backref="activity", lazy="dynamic")
+	user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"))
+	events = relationship("Event", backref="activity", lazy="dynamic",
+			passive_deletes=True)
 
 	def __repr__(self):
 		return "<Activity '{}'>".format(self.name)
 
+class ErrorGroup(Base):
+	"""
+	All the occurrences of one error for one user (see errorgroups.py): the
+	first one's text, when it first and last happened, and how often.
+	"""
+	__tablename__ = "error_group"
+	id = Column(Integer, primary_key=True)
+	fingerprint = Column(String(40), unique=True)	# See errorgroups.fingerprint
+	summary = Column(String(64))
+	origin = Column(String(256), index=True)
+	message = Column(String(256))
+	first_seen = Column(DateTime)
+	last_seen = Column(DateTime, index=True)
+	count = Column(Integer, default=1, index=True)
+	user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"),
+			index=True)
+	errors = relationship("Error", backref="group", lazy="dynamic",
+			passive_deletes=True)
+
+	def __repr__(self):
+		return "<ErrorGroup '{}' x{}>".format(self.summary, self.count)
+
 class Error(Base):
 	"""
-	Represents an error that occurred somewhere in the application(s).
+	Represents an error that occurred somewhere in the application(s). Only
+	a sample of each group's occurrences is kept (see errorgroups.py).
 	"""
 	__tablename__ = "error"
 	id = Column(Integer, primary_key=True)
-	timestamp = Column(DateTime, default=datetime.now())
+	timestamp = Column(DateTime, index=True, default=datetime.now)
 	summary = Column(String(64))
-	origin = Column(String(256))
+	origin = Column(String(256), index=True)
 	message = Column(String(256))
 	traceback = Column(String(1048))
-	user_id = Column(Integer, ForeignKey("user.id"))
+	user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"),
+			index=True)
+	group_id = Column(Integer, ForeignKey("error_group.id",
+			ondelete="SET NULL"), index=True)
 
 	def __repr__(self):
 		return "<Error '{}', '{}'>".format(self.summary, self.message)
@@ -106,8 +229,9 @@ class Day(Base):
 	id = Column(Integer, primary_key=True)
 	date = Column(DateTime, index=True)	# Time portion is ignored
 	computed_progress = Column(Float, default=0.0)
-	user_id = Column(Integer, ForeignKey("user.id"))
-	events = relationship("Event", backref="day", lazy="dynamic")
+	user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"))
+	events = relationship("Event", backref="day", lazy="dynamic",
+			passive_deletes=True)
 
 	def __repr__(self):
 		return "<Day {}>".format(self.date.strftime("%Y-%m-%d"))
@@ -119,11 +243,11 @@ class Event(Base):
 	__tablename__ = "event"
 	id = Column(Integer, primary_key=True)
 	eid = Column(String, index=True)
-	start_time = Column(DateTime) # Date portion is ignored
+	start_time = Column(DateTime) # User's local time; date portion is ignored
 	end_time = Column(DateTime)	# Date portion is ignored
 	completed = Column(Boolean)
-	day_id = Column(Integer, ForeignKey("day.id"))
-	activity_id = Column(Integer, ForeignKey("activity.id"))
+	day_id = Column(Integer, ForeignKey("day.id", ondelete="CASCADE"))
+	activity_id = Column(Integer, ForeignKey("activity.id", ondelete="CASCADE"))
 
 	def __repr__(self):
 		output = "<Event '{}' at {}>".format(self.activity.name, 
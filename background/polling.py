@@ -5,16 +5,20 @@ Created by Abigail Franz on 2/28/2018.\n
 Last modified by Abigail Franz on 5/7/2018.
 """
 from datetime import datetime
-from db import session
+from db import DATABASE, session
 from models import Activity, Event, Log, User
 import fitbit
 import weconnect
-from helpers import compute_days_progress, compute_days_progress_tally
+from helpers import (compute_days_progress, compute_days_progress_tally,
+		find_event, populate_today)
+import locks
+import sharding
+import tracing
 import logging, sys
 
 logging.basicConfig(stream=sys.stderr, level=logging.DEBUG)
 
-def poll_and_save():
+def poll_and_save(users=None):
 	"""
 	Check for new events each day and save them to the database
 	TODO:First poll of the day adds new events
@@ -26,31 +30,58 @@ def poll_and_save():
 		completed = db.Column(db.Boolean)
 		day_id = db.Column(db.Integer, db.ForeignKey("day.id"))
 		activity_id = 
+
+	:param list users: the users to poll (default: all of them)
 	"""
-	users = User.query.all()
+	if users is None:
+		users = session.query(User).all()
 	for user in users:
-		logging.debug("polling for {}".format(user))
-		# API call to WEconnect activities-with-events
-		activity_events = weconnect.get_todays_events(user)
-		logging.debug(activity_events)	
-	
+		with tracing.span("user", "poll_and_save", user=user.id):
+			# Pushed check-ins (app/hooks.py) update the same events.
+			try:
+				with locks.user_lock(user.id, database=DATABASE):
+					_poll_and_save_user(user)
+			except (locks.LockTimeout, IOError) as e:
+				# IOError: WEconnect unreachable, answering with an error while
+				# populating today, or its circuit breaker open.
+				session.rollback()
+				logging.warning("Skipped {}: {}".format(user, e))
+
+def _poll_and_save_user(user):
+	logging.debug("polling for {}".format(user))
+	day = user.thisday()
+	if day is None:
+		# The user's day began but maintenance hasn't reached them yet.
+		populate_today(user)
+		day = user.thisday()
+	# API call to WEconnect activities-with-events
+	activity_events = weconnect.get_todays_events(user)
+	logging.debug(activity_events)	
+	activities = None
+
 	for activity in activity_events:
-		for ev in activity["events"]:
-			event = session.query(Event).filter_by(eid == ev["eid"]).first()
+		for ev in activity.events or []:
+			event = find_event(user, ev)
 			if event:
 				#update the completion
-				event.completed = (ev["didCheckin"] == True)
+				event.completed = ev.completed
 			else: #eid doesn't exist, add new event
-				newEvent = weconnect.createNewEvent(ev)
+				# E.g. an activity added since maintenance ran today.
+				if activities is None:
+					activities = dict((act.wc_act_id, act)
+							for act in user.activities)
+				newEvent = weconnect.createNewEvent(ev,
+						activities.get(activity.activity_id), user)
+				newEvent.day = day
 				session.add(newEvent)
 	try:		
 		session.commit()
-		print("Received {} Activity events in last poll.").format(len(activity_events))
+		logging.info("Received {} Activity events in last poll.".format(len(activity_events)))
 	except:
 		session.rollback()
-		print("Session Commit failed")
+		logging.error("Session Commit failed")
 
-def poll_and_update():
+def poll_and_update(users=None):
 	"""
 	For each user in the database:
 	1. Poll WEconnect to find out how many of the user''s events for today
@@ -59,13 +90,17 @@ def poll_and_update():
 	2. If the user has made progress since the last time this script was run,
 	   send the new progress to Fitbit as a walking activity with the following
 	   number of steps: progress * 1,000,000.
+
+	:param list users: the users to poll (default: all of them)
 	"""
-	users = session.query(User).all()
+	if users is None:
+		users = session.query(User).all()
 	for user in users:
-		logging.debug("polling for {}".format(user))
-		# API call to WEconnect activities-with-events
-		activity_events = weconnect.get_todays_events(user)
-		logging.debug(activity_events)
+		with tracing.span("user", "poll_and_update", user=user.id):
+			logging.debug("polling for {}".format(user))
+			# API call to WEconnect activities-with-events
+			activity_events = weconnect.get_todays_events(user)
+			logging.debug(activity_events)
 		
 		# Keep track in DB of which events have didCheckin set to True
 		#for activity in activity_events:
@@ -99,4 +134,4 @@ def poll_and_update():
 
 
 if __name__ == "__main__":
-	poll_and_save()
\ No newline at end of file
+	sharding.main(poll_and_save, "Poll WEconnect and save events.")
\ No newline at end of file
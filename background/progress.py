@@ -0,0 +1,163 @@
+"""
+Incremental progress engine.\n
+Keeps each user's running totals for today (in the user's time zone, see
+usertime.py) in `progress_state`: the possible
+score, today's completed score and event counts, and the fade points still
+carried over from each of the 4 previous days. Whenever an `Event` is added,
+removed or (un)completed, or an `Activity` weight changes, a session hook
+(progresshook.py, installed on every background and Flask app session)
+applies the difference to the totals in the same flush. The state is only
+rebuilt from scratch when the day rolls over or it has been invalidated.\n
+Set PT_PROGRESS_VERIFY=1 (or run `python progress.py verify`) to check the
+running totals against a full computation.\n
+Created on 10/19/2026.
+"""
+
+import argparse, json, logging, os, sys
+from datetime import timedelta
+from db import session
+import metrics
+from models import Activity, Day, Event, ProgressState, User
+from progresshook import FADE_DAYS, fade_points
+import usertime
+
+# "tally": completed events / scheduled events (what the poller has used
+# since 5/2018). "fade": weighted, with completions fading over 4 days.
+ALGORITHM = os.environ.get("PT_PROGRESS_ALGORITHM") or "tally"
+VERIFY = bool(int(os.environ.get("PT_PROGRESS_VERIFY") or 0))
+
+def _today(user_id):
+	timezone = session.query(User.timezone).filter_by(id=user_id).scalar()
+	return usertime.today(timezone)
+
+def _new_state(user_id, today):
+	return ProgressState(user_id=user_id, date=today, possible_score=0, score=0,
+			fade=json.dumps([0] * FADE_DAYS), event_count=0, completed_count=0)
+
+def compute_full(user_id, today=None):
+	"""
+	Compute a user's state for today from scratch, with one query over the
+	last 5 days of events. Return an unsaved ProgressState.
+
+	:param int user_id\n
+	:param datetime today: midnight of the day to compute (default: the
+	user's today)
+	"""
+	today = today or _today(user_id)
+	state = _new_state(user_id, today)
+	fade = [0] * FADE_DAYS
+	rows = session.query(Day.date, Event.completed, Activity.weight).\
+			join(Event, Event.day_id == Day.id).\
+			outerjoin(Activity, Event.activity_id == Activity.id).\
+			filter(Day.user_id == user_id).\
+			filter(Day.date >= today - timedelta(days=FADE_DAYS), Day.date <= today)
+	for date, completed, weight in rows:
+		days_ago = (today - date).days
+		weight = weight or 0
+		if days_ago == 0:
+			state.possible_score += weight
+			state.event_count += 1
+			if completed:
+				state.score += weight
+				state.completed_count += 1
+		elif completed:
+			fade[days_ago - 1] += fade_points(weight, days_ago)
+	state.fade = json.dumps(fade)
+	return state
+
+def value(state, algorithm=ALGORITHM):
+	"""
+	Turn a state into a progress value between 0 and 1.
+
+	:param ProgressState state\n
+	:param String algorithm: "tally" or "fade"
+	"""
+	if algorithm == "fade":
+		if not state.possible_score:
+			return 0.0
+		score = state.score + sum(json.loads(state.fade))
+		return min(float(score) / state.possible_score, 1.0)
+	if not state.event_count:
+		return 0.0
+	return float(state.completed_count) / state.event_count
+
+def current_state(user_id, today=None):
+	"""
+	Return the user's saved state for today, rebuilding it first if it's
+	missing or from an earlier day.
+
+	:param int user_id\n
+	:param datetime today: midnight of the user's today, if already known
+	"""
+	today = today or _today(user_id)
+	state = session.query(ProgressState).filter_by(user_id=user_id).first()
+	if state is not None and state.date == today:
+		return state
+	full = compute_full(user_id, today)
+	if state is None:
+		state = full
+		session.add(state)
+	else:
+		_copy(full, state)
+	session.flush()
+	metrics.inc("pt_progress_rebuilds_total")
+	return state
+
+def _copy(source, target):
+	for name in ("date", "possible_score", "score", "fade", "event_count",
+			"completed_count"):
+		setattr(target, name, getattr(source, name))
+
+def todays_progress(user, algorithm=ALGORITHM, verify=VERIFY):
+	"""
+	Return the user's progress for today from the running totals. With
+	`verify`, also compute it from scratch; on a mismatch, log it, repair the
+	saved state and return the full result.
+
+	:param background.models.User user\n
+	:param String algorithm: "tally" or "fade"\n
+	:param bool verify
+	"""
+	state = current_state(user.id, usertime.today(user))
+	result = value(state, algorithm)
+	if verify:
+		full = compute_full(user.id, state.date)
+		expected = value(full, algorithm)
+		if abs(expected - result) > 1e-9 or state.fade != full.fade:
+			logging.warning("Progress state for {} was {:.4f}, full computation "
+					"gives {:.4f}; repairing".format(user, result, expected))
+			metrics.inc("pt_progress_mismatches_total")
+			_copy(full, state)
+			result = expected
+	return result
+
+def invalidate(user_id):
+	"""
+	Drop a user's saved state, so the next call recomputes it from scratch.
+
+	:param int user_id
+	"""
+	session.query(ProgressState).filter_by(user_id=user_id).\
+			delete(synchronize_session=False)
+
+if __name__ == "__main__":
+	logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+	parser = argparse.ArgumentParser(description="Check the running progress "
+			"totals against a full computation.")
+	parser.add_argument("command", choices=["verify"])
+	parser.add_argument("--algorithm", choices=["tally", "fade"],
+			default=ALGORITHM)
+	args = parser.parse_args()
+	mismatches = 0
+	users = session.query(User).all()
+	for user in users:
+		state = session.query(ProgressState).filter_by(user_id=user.id).first()
+		if state is None or state.date != usertime.today(user):
+			continue
+		before = value(state, args.algorithm)
+		after = todays_progress(user, args.algorithm, verify=True)
+		if abs(before - after) > 1e-9:
+			mismatches += 1
+	session.commit()
+	print("{} users checked, {} repaired".format(len(users), mismatches))
+	sys.exit(1 if mismatches else 0)
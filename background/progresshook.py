@@ -0,0 +1,153 @@
+"""
+Session hook of the incremental progress engine (see progress.py). Whenever
+an `Event` is added, removed, (un)completed, or an `Activity` weight changes,
+it applies the difference to the user's running totals in `progress_state`,
+in the same flush.\n
+It's given the model classes instead of importing them, so the background
+scripts (db.py) and the Flask app (app/models.py) each install it on their
+own sessions, and every change to events and weights, from the poller or a
+pushed check-in, keeps the totals current. Needs SQLAlchemy, but none of the
+other background modules.\n
+Created on 10/19/2026.
+"""
+
+import json
+from datetime import timedelta
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.orm.attributes import get_history
+
+FADE_DAYS = 4
+
+_installed = set()
+
+def fade_points(weight, days_ago):
+	"""
+	Points a completed event of this weight still gives `days_ago` days
+	later.
+	"""
+	return weight if days_ago == 0 else max(weight - days_ago, 0)
+
+def install(target, models, today):
+	"""
+	Apply the running-total deltas in every flush of `target`'s sessions.
+	Installing on the same target twice does nothing.
+
+	:param target: a Session class or sessionmaker\n
+	:param dict models: the Activity, Day, Event, ProgressState and User
+	classes, by name\n
+	:param function today: midnight of today for a time zone name (e.g.
+	usertime.today)
+	"""
+	if target in _installed:
+		return
+	_installed.add(target)
+	sqlalchemy_event.listen(target, "before_flush", _Hook(models, today).run)
+
+def _apply(state, date, weight, scheduled, completed):
+	# Add (+1) or remove (-1) the share of the totals of one event on `date`.
+	if state is None or state.date is None:
+		return
+	days_ago = (state.date - date).days
+	if not 0 <= days_ago <= FADE_DAYS:
+		return
+	weight = weight or 0
+	if days_ago == 0:
+		state.possible_score += scheduled * weight
+		state.event_count += scheduled
+		state.score += completed * weight
+		state.completed_count += completed
+	elif completed:
+		fade = json.loads(state.fade)
+		fade[days_ago - 1] += completed * fade_points(weight, days_ago)
+		state.fade = json.dumps(fade)
+
+def _user_id(day):
+	if day.user_id is not None or day.user is None:
+		return day.user_id
+	return day.user.id
+
+def _old(obj, name, current):
+	history = get_history(obj, name)
+	if history.deleted:
+		return history.deleted[0]
+	return current
+
+class _Hook:
+	def __init__(self, models, today):
+		self.Activity = models["Activity"]
+		self.Day = models["Day"]
+		self.Event = models["Event"]
+		self.ProgressState = models["ProgressState"]
+		self.User = models["User"]
+		self.today = today
+
+	def run(self, sess, flush_context, instances):
+		states = {}
+		with sess.no_autoflush:
+			for obj in list(sess.new):
+				if isinstance(obj, self.Event) and obj.day is not None:
+					_apply(self._saved_state(sess, _user_id(obj.day), states),
+							obj.day.date, self._weight(sess, obj), 1,
+							1 if obj.completed else 0)
+			for obj in list(sess.deleted):
+				if isinstance(obj, self.Event) and obj.day is not None:
+					_apply(self._saved_state(sess, _user_id(obj.day), states),
+							obj.day.date, self._weight(sess, obj), -1,
+							-1 if obj.completed else 0)
+			for obj in list(sess.dirty):
+				if isinstance(obj, self.Event) and obj.day is not None:
+					self._event_changed(sess, obj, states)
+				elif isinstance(obj, self.Activity):
+					self._weight_changed(sess, obj, states)
+
+	def _saved_state(self, sess, user_id, states):
+		# The user's state, if it's for the user's today; otherwise it gets
+		# rebuilt on the next read and there's nothing to keep up to date.
+		if user_id not in states:
+			row = sess.query(self.ProgressState, self.User.timezone).\
+					join(self.User, self.User.id == self.ProgressState.user_id).\
+					filter(self.ProgressState.user_id == user_id).first()
+			states[user_id] = row[0] if row is not None and \
+					row[0].date == self.today(row[1]) else None
+		return states[user_id]
+
+	def _weight(self, sess, event):
+		if event.activity is not None:
+			return event.activity.weight
+		if event.activity_id is not None:
+			activity = sess.query(self.Activity).get(event.activity_id)
+			return activity.weight if activity is not None else 0
+		return 0
+
+	def _event_changed(self, sess, event, states):
+		if get_history(event, "day").has_changes() or \
+				get_history(event, "activity").has_changes():
+			# Moved between days or activities: too rare to be worth a delta.
+			state = self._saved_state(sess, _user_id(event.day), states)
+			if state is not None:
+				state.date = None
+			return
+		was = bool(_old(event, "completed", event.completed))
+		now = bool(event.completed)
+		if was != now:
+			_apply(self._saved_state(sess, _user_id(event.day), states),
+					event.day.date, self._weight(sess, event), 0, 1 if now else -1)
+
+	def _weight_changed(self, sess, activity, states):
+		old_weight = _old(activity, "weight", activity.weight) or 0
+		new_weight = activity.weight or 0
+		if old_weight == new_weight:
+			return
+		state = self._saved_state(sess, activity.user_id, states)
+		if state is None or state.date is None:
+			return
+		# Events still being added in this flush already count at the new weight.
+		today = state.date
+		Day, Event = self.Day, self.Event
+		rows = sess.query(Day.date, Event.completed).join(Event,
+				Event.day_id == Day.id).filter(Event.activity_id == activity.id).\
+				filter(Day.date >= today - timedelta(days=FADE_DAYS),
+				Day.date <= today)
+		for date, completed in rows:
+			_apply(state, date, new_weight, 1, 1 if completed else 0)
+			_apply(state, date, old_weight, -1, -1 if completed else 0)
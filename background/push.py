@@ -0,0 +1,56 @@
+"""
+Script that recomputes today's progress for a few users and pushes it to
+Fitbit right away. The Flask app runs it when a check-in is pushed to
+/hooks/checkin, so the user's Fitbit doesn't have to wait for the next poll.\n
+Usage: `python push.py --user 12 [--user 13 ...]`\n
+Created on 10/19/2026.
+"""
+
+import argparse, logging, sys
+from db import DATABASE, session
+from models import Log, User
+import fitbit
+import locks
+import progress
+import tracing
+
+def push_progress(user):
+	"""
+	Get the user's progress for today from the progress engine (see
+	progress.py) and, if it changed, update the `day` row, send the new step
+	count to Fitbit and add a `log` row. Runs under the user's lock. Return
+	the new progress, or None if nothing changed.
+
+	:param background.models.User user
+	"""
+	with tracing.span("user", "push_progress", user=user.id):
+		with locks.user_lock(user.id, database=DATABASE):
+			day = user.thisday()
+			if day is None:
+				return None
+			new_progress = progress.todays_progress(user)
+			if new_progress == day.computed_progress:
+				session.commit()
+				return None
+			day.computed_progress = new_progress
+			step_count = fitbit.update_progress(user, new_progress)
+			session.add(Log(wc_progress=new_progress, fb_step_count=step_count,
+					user=user))
+			session.commit()
+			logging.info("Pushed progress {:.2f} ({} steps) for {}".format(
+					new_progress, step_count, user))
+			return new_progress
+
+if __name__ == "__main__":
+	logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+	parser = argparse.ArgumentParser(description="Push today's progress to "
+			"Fitbit for some users.")
+	parser.add_argument("--user", type=int, action="append", required=True,
+			help="User.id (repeatable)")
+	args = parser.parse_args()
+	for user in session.query(User).filter(User.id.in_(args.user)):
+		try:
+			push_progress(user)
+		except (locks.LockTimeout, IOError) as e:
+			session.rollback()
+			logging.warning("Skipped {}: {}".format(user, e))
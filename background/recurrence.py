@@ -0,0 +1,119 @@
+"""
+Expands WEconnect activity schedules into events locally.\n
+Each `activity` row keeps its schedule (first start, duration, repeat rule
+and expiration), so the events a user should have on any day can be worked
+out without asking WEconnect; only check-in status needs a remote call.
+Schedules are stored as WEconnect sends them, in UTC, and repeat in UTC;
+each occurrence is then moved to the user's wall clock (see usertime.py),
+so an evening event west of UTC lands on the user's day, not the next one.
+Expansions are cached per activity and dropped when its schedule or the
+user's time zone changes.\n
+Created on 10/19/2026.
+"""
+
+from datetime import datetime, time, timedelta
+from sqlalchemy import or_
+from models import Activity
+import usertime
+
+# Repeat rules that can be expanded. Activities with any other rule (or no
+# stored schedule) still need WEconnect's activities-with-events.
+SUPPORTED_REPEATS = ("never", "daily", "weekly", "monthly")
+
+# Dates cached per activity before its cache is cleared.
+MAX_CACHED_DATES = 400
+
+_cache = {}
+
+def can_expand(activity):
+	"""
+	Return True if the activity's schedule is stored and its repeat rule is
+	supported.
+
+	:param background.models.Activity activity
+	"""
+	return activity.start_time is not None and activity.duration is not None \
+			and activity.repeat in SUPPORTED_REPEATS
+
+def _occurrence(schedule, date):
+	# The occurrence on the user's `date` starts on that UTC date or one
+	# next to it.
+	timezone = schedule[4]
+	for utc_date in (date - timedelta(days=1), date, date + timedelta(days=1)):
+		occurrence = _utc_occurrence(schedule, utc_date)
+		if occurrence is not None:
+			st = usertime.from_utc(occurrence[0], timezone)
+			if st.date() == date:
+				return st, usertime.from_utc(occurrence[1], timezone)
+	return None
+
+def _utc_occurrence(schedule, date):
+	start, duration, repeat, expiration = schedule[:4]
+	first = start.date()
+	if date < first:
+		return None
+	if repeat == "never" and date != first:
+		return None
+	if repeat == "weekly" and (date - first).days % 7:
+		return None
+	if repeat == "monthly" and date.day != first.day:
+		return None
+	st = datetime.combine(date, start.time())
+	if expiration is not None and st > expiration:
+		return None
+	return st, st + timedelta(minutes=duration)
+
+def occurrence_on(activity, date, timezone=None):
+	"""
+	Return the (start, end) of the activity's event on a date, on the user's
+	wall clock, or None if it has none that day.
+
+	:param background.models.Activity activity\n
+	:param date date: a date on the user's calendar\n
+	:param String timezone: the user's `User.timezone`
+	"""
+	schedule = (activity.start_time, activity.duration, activity.repeat,
+			activity.expiration, timezone)
+	cached = _cache.get(activity.id)
+	if cached is None or cached[0] != schedule or \
+			len(cached[1]) >= MAX_CACHED_DATES:
+		cached = _cache[activity.id] = (schedule, {})
+	dates = cached[1]
+	if date not in dates:
+		dates[date] = _occurrence(schedule, date)
+	return dates[date]
+
+def expected_events(user, first_day, last_day):
+	"""
+	Return the user's expected events from `first_day` to `last_day` as a
+	dict of midnight datetimes to lists of (activity, start, end). Return None
+	if the user has no activities stored, or any of them can't be expanded
+	locally.
+
+	:param background.models.User user\n
+	:param datetime first_day\n
+	:param datetime last_day
+	"""
+	first = datetime.combine(first_day.date(), time(0, 0, 0))
+	last = datetime.combine(last_day.date(), time(0, 0, 0))
+	activities = user.activities.filter(or_(Activity.expiration == None,
+			Activity.expiration >= first)).all()
+	# No activities may just mean they haven't been loaded yet.
+	if not activities or not all(can_expand(act) for act in activities):
+		return None
+	expected = {}
+	day = first
+	while day <= last:
+		expected[day] = []
+		for act in activities:
+			occurrence = occurrence_on(act, day.date(), user.timezone)
+			if occurrence is not None:
+				expected[day].append((act, occurrence[0], occurrence[1]))
+		day += timedelta(days=1)
+	return expected
+
+def clear_cache():
+	"""
+	Forget every cached expansion.
+	"""
+	_cache.clear()
@@ -0,0 +1,233 @@
+"""
+Script that keeps the database small: old rows are moved out of the tables
+the app and the background scripts query every day. Meant to be run once a
+day in Crontab.\n
+* `log` rows older than PT_LOG_RETENTION_DAYS are archived and rolled up into
+  one `log_summary` row per user per day.
+* `day` (with their `event` rows) and `error` rows older than
+  PT_ARCHIVE_AFTER_DAYS are archived, and so are the `error_group` rows of
+  errors that haven't happened since.
+* Archives are gzipped NDJSON files in PT_ARCHIVE_DIR, one per table per run.
+* Afterwards, the freed pages are returned to the file system (SQLite
+  incremental vacuum) and the query planner statistics are refreshed.\n
+Created on 10/19/2026.
+"""
+
+import argparse, gzip, json, logging, os, sys
+from datetime import datetime, time, timedelta
+from sqlalchemy import func
+from db import engine, session
+from models import Day, Error, ErrorGroup, Event, Log, LogSummary
+
+LOG_RETENTION_DAYS = int(os.environ.get("PT_LOG_RETENTION_DAYS") or 30)
+ARCHIVE_AFTER_DAYS = int(os.environ.get("PT_ARCHIVE_AFTER_DAYS") or 180)
+ARCHIVE_DIR = os.environ.get("PT_ARCHIVE_DIR") or os.path.join(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+		"data", "archive")
+
+# Rows are read from the database this many at a time while archiving.
+CHUNK_SIZE = 1000
+
+# Pages returned to the file system per incremental vacuum step.
+VACUUM_PAGES = 5000
+
+def _cutoff(days):
+	"""
+	Midnight `days` days ago. Whole days are always archived together.
+	"""
+	return datetime.combine(datetime.now().date(), time(0, 0, 0)) - \
+			timedelta(days=days)
+
+def _row_dict(row, columns):
+	record = {}
+	for column in columns:
+		value = getattr(row, column.name)
+		if isinstance(value, datetime):
+			value = value.isoformat()
+		record[column.name] = value
+	return record
+
+def archive_query(query, model, label):
+	"""
+	Stream every row matched by `query` into a new gzipped NDJSON file and
+	return (path, row count). The file only gets its final name once the
+	caller has committed the deletion; until then it ends in ".tmp".
+
+	:param sqlalchemy.orm.Query query\n
+	:param model: the mapped class being archived\n
+	:param String label: used in the file name
+	"""
+	if not os.path.isdir(ARCHIVE_DIR):
+		os.makedirs(ARCHIVE_DIR)
+	stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+	path = os.path.join(ARCHIVE_DIR, "{}-{}.jsonl.gz".format(label, stamp))
+	columns = model.__table__.columns
+	count = 0
+	with gzip.open(path + ".tmp", "wt") as archive:
+		for row in query.order_by(model.id).yield_per(CHUNK_SIZE):
+			archive.write(json.dumps(_row_dict(row, columns)) + "\n")
+			count += 1
+	if count == 0:
+		os.remove(path + ".tmp")
+		return None, 0
+	return path, count
+
+def _publish(paths):
+	for path in paths:
+		if path is not None:
+			os.rename(path + ".tmp", path)
+
+def _discard(paths):
+	for path in paths:
+		if path is not None and os.path.exists(path + ".tmp"):
+			os.remove(path + ".tmp")
+
+def _as_datetime(value):
+	# SQLite's date() returns a string; other databases return a date.
+	if isinstance(value, str):
+		return datetime.strptime(value, "%Y-%m-%d")
+	return datetime.combine(value, time(0, 0, 0))
+
+def roll_up_logs(cutoff):
+	"""
+	Archive the `log` rows older than `cutoff`, replace them with daily
+	per-user `log_summary` rows, and return the number of logs removed.
+
+	:param datetime cutoff
+	"""
+	old = session.query(Log).filter(Log.timestamp < cutoff)
+	path, count = archive_query(old, Log, "log")
+	if not count:
+		return 0
+	try:
+		day = func.date(Log.timestamp)
+		totals = session.query(Log.user_id, day, func.count(Log.id),
+				func.min(Log.wc_progress), func.max(Log.wc_progress),
+				func.max(Log.fb_step_count)).\
+				filter(Log.timestamp < cutoff).group_by(Log.user_id, day).all()
+		for user_id, date, log_count, low, high, steps in totals:
+			session.add(LogSummary(user_id=user_id, date=_as_datetime(date),
+					log_count=log_count, min_wc_progress=low, max_wc_progress=high,
+					max_fb_step_count=steps))
+		old.delete(synchronize_session=False)
+		session.commit()
+	except:
+		session.rollback()
+		_discard([path])
+		raise
+	_publish([path])
+	return count
+
+def archive_days(cutoff):
+	"""
+	Archive and remove the `day` rows (and their `event` rows) older than
+	`cutoff`. Return a tuple (days removed, events removed).
+
+	:param datetime cutoff
+	"""
+	old_day_ids = session.query(Day.id).filter(Day.date < cutoff)
+	old_events = session.query(Event).filter(Event.day_id.in_(old_day_ids))
+	old_days = session.query(Day).filter(Day.date < cutoff)
+	paths = []
+	try:
+		event_path, events = archive_query(old_events, Event, "event")
+		paths.append(event_path)
+		day_path, days = archive_query(old_days, Day, "day")
+		paths.append(day_path)
+		old_events.delete(synchronize_session=False)
+		old_days.delete(synchronize_session=False)
+		session.commit()
+	except:
+		session.rollback()
+		_discard(paths)
+		raise
+	_publish(paths)
+	return days, events
+
+def archive_errors(cutoff):
+	"""
+	Archive and remove the `error` rows older than `cutoff`, and the
+	`error_group` rows last seen before it. Return a tuple (errors removed,
+	groups removed).
+
+	:param datetime cutoff
+	"""
+	old_errors = session.query(Error).filter(Error.timestamp < cutoff)
+	old_groups = session.query(ErrorGroup).filter(ErrorGroup.last_seen < cutoff)
+	paths = []
+	try:
+		error_path, errors = archive_query(old_errors, Error, "error")
+		paths.append(error_path)
+		group_path, groups = archive_query(old_groups, ErrorGroup, "error_group")
+		paths.append(group_path)
+		old_errors.delete(synchronize_session=False)
+		old_groups.delete(synchronize_session=False)
+		session.commit()
+	except:
+		session.rollback()
+		_discard(paths)
+		raise
+	_publish(paths)
+	return errors, groups
+
+def compact():
+	"""
+	Give freed pages back to the file system and refresh the planner
+	statistics. On SQLite, the first run switches the file to incremental
+	auto-vacuum, which needs one full VACUUM; later runs are incremental.
+	"""
+	if engine.dialect.name != "sqlite":
+		with engine.connect() as conn:
+			conn.execute("ANALYZE")
+		return
+
+	raw = engine.raw_connection()
+	try:
+		# VACUUM can't run inside a transaction.
+		raw.connection.isolation_level = None
+		cursor = raw.cursor()
+		mode = cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+		if mode != 2:
+			cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+			cursor.execute("VACUUM")
+		else:
+			cursor.execute("PRAGMA incremental_vacuum({})".format(VACUUM_PAGES))
+		cursor.execute("ANALYZE")
+		cursor.close()
+	finally:
+		raw.connection.isolation_level = ""
+		raw.close()
+
+def run(log_days=LOG_RETENTION_DAYS, archive_days_after=ARCHIVE_AFTER_DAYS,
+		vacuum=True):
+	"""
+	Run every retention step and return a dict with the number of rows
+	removed from each table.
+
+	:param int log_days: keep raw logs for this many days\n
+	:param int archive_days_after: keep days, events and errors this long\n
+	:param bool vacuum: compact the database afterwards
+	"""
+	removed = {}
+	removed["log"] = roll_up_logs(_cutoff(log_days))
+	removed["day"], removed["event"] = archive_days(_cutoff(archive_days_after))
+	removed["error"], removed["error_group"] = archive_errors(
+			_cutoff(archive_days_after))
+	if vacuum:
+		compact()
+	return removed
+
+if __name__ == "__main__":
+	logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+	parser = argparse.ArgumentParser(description="Archive and compact old "
+			"PowerToken rows.")
+	parser.add_argument("--log-days", type=int, default=LOG_RETENTION_DAYS,
+			help="keep raw progress logs for this many days")
+	parser.add_argument("--archive-after", type=int, default=ARCHIVE_AFTER_DAYS,
+			help="keep days, events and errors for this many days")
+	parser.add_argument("--no-vacuum", action="store_true",
+			help="skip the incremental vacuum and ANALYZE")
+	args = parser.parse_args()
+	removed = run(args.log_days, args.archive_after, vacuum=not args.no_vacuum)
+	for table in ("log", "day", "event", "error", "error_group"):
+		print("{}: {} rows archived".format(table, removed[table]))
@@ -0,0 +1,182 @@
+"""
+Splits the users between several polling/maintenance processes, which may run
+on one host or on several.\n
+Each user is assigned to a shard with a stable hash of `User.id`, and the
+assignment is recorded in the `user` table. Users keep their shard until the
+shard count changes, so adding participants never moves anyone else.\n
+Created on 10/19/2026.
+"""
+
+import argparse, logging, os, time, zlib
+from multiprocessing import Pool
+import connections
+from db import session
+import metrics
+from models import User
+import tracing
+
+def shard_for(user_id, shard_count):
+	"""
+	Return the shard (0 to shard_count - 1) that owns the user with this id.
+	Uses jump consistent hashing, so when the shard count grows from n to n+1
+	only about 1/(n+1) of the users change shards.
+
+	:param int user_id\n
+	:param int shard_count
+	"""
+	key = zlib.crc32(str(user_id).encode("utf-8")) & 0xffffffff
+	shard, candidate = -1, 0
+	while candidate < shard_count:
+		shard = candidate
+		key = (key * 2862933555777941757 + 1) & 0xffffffffffffffff
+		candidate = int((shard + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+	return shard
+
+def assign_shards(shard_count):
+	"""
+	Record a shard for every user who doesn't have one for this shard count
+	yet. Return the number of users (re)assigned. Safe to run from several
+	hosts at once, since every host computes the same assignment.
+
+	:param int shard_count
+	"""
+	users = session.query(User).filter((User.shard_count != shard_count) |
+			(User.shard_count == None) | (User.shard == None)).all()
+	for user in users:
+		user.shard = shard_for(user.id, shard_count)
+		user.shard_count = shard_count
+	session.commit()
+	return len(users)
+
+def users_in_shard(shard, shard_count):
+	"""
+	Return the users assigned to a shard.
+
+	:param int shard\n
+	:param int shard_count
+	"""
+	return session.query(User).filter(User.shard == shard).\
+			filter(User.shard_count == shard_count).\
+			order_by(User.id).all()
+
+def run_shard(cycle, shard, shard_count):
+	"""
+	Run one cycle (e.g. `polling.poll_and_save`) over one shard's users and
+	return the shard's stats as a dict.
+
+	:param function cycle: takes a list of users\n
+	:param int shard\n
+	:param int shard_count
+	"""
+	start = time.time()
+	with tracing.span("cycle", cycle.__name__, shard=shard,
+			shard_count=shard_count) as cycle_span:
+		users = users_in_shard(shard, shard_count)
+		cycle_span.set(users=len(users))
+		cycle(users)
+	seconds = time.time() - start
+	stats = {
+		"shard": shard,
+		"shard_count": shard_count,
+		"pid": os.getpid(),
+		"users": len(users),
+		"seconds": round(seconds, 3)
+	}
+	logging.info("Shard {shard}/{shard_count} (pid {pid}): {users} users "
+			"in {seconds}s".format(**stats))
+
+	name = cycle.__name__
+	metrics.observe("pt_cycle_seconds", seconds, cycle=name)
+	metrics.inc("pt_cycle_users_total", len(users), cycle=name)
+	metrics.set_gauge("pt_cycle_last_seconds", stats["seconds"], cycle=name,
+			shard=shard)
+	metrics.set_gauge("pt_cycle_last_run_timestamp", time.time(), cycle=name,
+			shard=shard)
+	# Pool workers exit without running atexit hooks, so flush here.
+	metrics.flush()
+	return stats
+
+def _init_worker():
+	connections.reset()
+	tracing.reset()
+
+def _run_shard_in_worker(job):
+	cycle, shard, shard_count = job
+	return run_shard(cycle, shard, shard_count)
+
+def run_sharded(cycle, shard=None, shard_count=1, workers=None, setup=None):
+	"""
+	Run a cycle over the users, split into shards. Return a list of per-shard
+	stats.
+
+	* With `shard` set, only that shard runs, in this process. This is how a
+	  host runs its part of a multi-host deployment.
+	* Otherwise all `shard_count` shards run, spread over `workers` forked
+	  processes (each with its own HTTP and database pools).
+
+	:param function cycle: takes a list of users\n
+	:param int shard: the only shard to run, or None for all of them\n
+	:param int shard_count\n
+	:param int workers: the number of worker processes\n
+	:param function setup: run once, before any shard, e.g. cleanup
+	"""
+	if setup is not None:
+		setup()
+	assign_shards(shard_count)
+
+	if shard is not None:
+		return [run_shard(cycle, shard, shard_count)]
+	if not workers or workers <= 1:
+		return [run_shard(cycle, s, shard_count) for s in range(shard_count)]
+
+	# Connections must not be shared with the children, so close ours first,
+	# and flush our metrics so the children don't inherit (and repeat) them.
+	connections.reset()
+	metrics.flush()
+	tracing.flush()
+	pool = Pool(workers, initializer=_init_worker)
+	try:
+		jobs = [(cycle, s, shard_count) for s in range(shard_count)]
+		return pool.map(_run_shard_in_worker, jobs)
+	finally:
+		pool.close()
+		pool.join()
+
+def parse_args(description):
+	"""
+	Parse the sharding options shared by polling.py and maintenance.py.
+
+	:param String description: shown by --help
+	"""
+	parser = argparse.ArgumentParser(description=description)
+	parser.add_argument("--shard", type=int, default=None,
+			help="run only this shard (0-based)")
+	parser.add_argument("--shards", type=int, default=None,
+			help="total number of shards across all hosts")
+	parser.add_argument("--workers", type=int, default=None,
+			help="number of local worker processes")
+	args = parser.parse_args()
+
+	# With only --workers given, each worker gets one shard.
+	if args.shards is None:
+		args.shards = args.workers or 1
+	if args.shard is not None and not 0 <= args.shard < args.shards:
+		parser.error("--shard must be between 0 and --shards - 1")
+	return args
+
+def main(cycle, description, setup=None):
+	"""
+	Command-line entry point: parse the sharding options, run the cycle and
+	log a summary line for every shard.
+
+	:param function cycle: takes a list of users\n
+	:param String description: shown by --help\n
+	:param function setup: run once, before any shard
+	"""
+	args = parse_args(description)
+	results = run_sharded(cycle, shard=args.shard, shard_count=args.shards,
+			workers=args.workers, setup=setup)
+	for stats in results:
+		print("shard={shard}/{shard_count} pid={pid} users={users} "
+				"seconds={seconds}".format(**stats))
+	return results
@@ -0,0 +1,102 @@
+"""
+Copies the live SQLite database into a read-only snapshot, which the Flask
+app's dashboards and analytics (see app/replica.py) and exports read instead
+of the file the poller writes to.\n
+The copy is made with SQLite's online backup API, PT_SNAPSHOT_PAGES pages at
+a time with a short pause in between, so the poller and the app can write
+while it runs (a write from another connection makes SQLite restart the
+copy). It's written next to the snapshot and renamed over it when complete,
+so readers never see a partial copy, and connections already open keep
+reading the previous one. The snapshot's modification time is set to when
+the copy started, which its data is at least as recent as.\n
+Run it every few minutes in Crontab, or with `--every SECONDS`. A cohort with
+a database of its own (see cohorts.py) gets its own snapshot, with the
+cohort's name added to the file name; the app reads the default one only.\n
+Created on 10/19/2026.
+"""
+
+import argparse, logging, os, sqlite3, sys, time
+from db import DATABASE, engine
+import cohorts
+import metrics
+
+PATH = os.environ.get("PT_SNAPSHOT_PATH") or os.path.join(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+		"data", "snapshot.db")
+if DATABASE != cohorts.DEFAULT:
+	PATH = "-{}".format(DATABASE).join(os.path.splitext(PATH))
+PAGES = int(os.environ.get("PT_SNAPSHOT_PAGES") or 1024)
+PAUSE_SECONDS = float(os.environ.get("PT_SNAPSHOT_PAUSE_SECONDS") or 0.01)
+
+def open_engine(path=PATH):
+	"""
+	Return an engine that reads the snapshot. Every connection opens the
+	current file, so a long-lived engine follows each new snapshot.
+
+	:param String path
+	"""
+	from sqlalchemy import create_engine
+	from sqlalchemy.pool import NullPool
+	return create_engine("sqlite:///file:{}?mode=ro&immutable=1&uri=true".format(
+			path), poolclass=NullPool)
+
+def take(path=PATH, pages=PAGES, pause=PAUSE_SECONDS):
+	"""
+	Copy the database to `path`, replacing the previous snapshot, and return
+	the seconds it took.
+
+	:param String path\n
+	:param int pages: pages copied per step\n
+	:param float pause: seconds between steps, for the other connections
+	"""
+	if engine.dialect.name != "sqlite":
+		raise ValueError("snapshots need an SQLite database, not {}".format(
+				engine.dialect.name))
+	directory = os.path.dirname(path)
+	if directory and not os.path.isdir(directory):
+		os.makedirs(directory)
+	partial = path + ".tmp"
+	if os.path.exists(partial):
+		os.remove(partial)
+
+	started = time.time()
+	raw = engine.raw_connection()
+	copy = sqlite3.connect(partial)
+	try:
+		raw.connection.backup(copy, pages=pages, sleep=pause)
+		# A copy of a WAL database can't be opened read-only without its
+		# -wal and -shm files.
+		copy.execute("PRAGMA journal_mode=DELETE")
+		copy.close()
+	except:
+		copy.close()
+		os.remove(partial)
+		raise
+	finally:
+		raw.close()
+	os.chmod(partial, 0o444)
+	os.utime(partial, (started, started))
+	os.replace(partial, path)
+
+	seconds = time.time() - started
+	metrics.observe("pt_snapshot_seconds", seconds)
+	metrics.set_gauge("pt_snapshot_timestamp", started)
+	metrics.flush()
+	return seconds
+
+if __name__ == "__main__":
+	logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+	parser = argparse.ArgumentParser(description="Copy the PowerToken "
+			"database into a read-only snapshot.")
+	parser.add_argument("--path", default=PATH,
+			help="the snapshot file (PT_SNAPSHOT_PATH)")
+	parser.add_argument("--every", type=float, metavar="SECONDS",
+			help="keep taking a snapshot every SECONDS")
+	args = parser.parse_args()
+	while True:
+		seconds = take(args.path)
+		logging.info("Snapshot written to {} in {:.2f} s".format(args.path,
+				seconds))
+		if not args.every:
+			break
+		time.sleep(max(args.every - seconds, 0))
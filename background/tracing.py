@@ -0,0 +1,266 @@
+"""
+Structured trace log for the poll and maintenance cycles.\n
+Every cycle writes compact JSON lines, one per span: the cycle itself, each
+user in it, each maintenance step, each upstream call and each database
+flush. Spans carry their duration, the number of SQL statements run inside
+them and, for upstream calls, the status code and payload size. Lines are
+buffered and appended once per user, to a file (PT_TRACE_PATH) that rotates
+by size.\n
+Summarize a trace with `python tracing.py summarize <trace.jsonl>`.\n
+Created on 10/19/2026.
+"""
+
+import argparse, itertools, json, os, threading, time
+
+TRACE_PATH = os.environ.get("PT_TRACE_PATH", os.path.join(
+		os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+		"data", "trace.jsonl"))
+TRACE_MAX_BYTES = int(os.environ.get("PT_TRACE_MAX_BYTES") or 10 * 1024 * 1024)
+TRACE_BACKUPS = int(os.environ.get("PT_TRACE_BACKUPS") or 5)
+
+# Buffered lines are written when a top-level or user span ends, or when the
+# buffer grows past this many lines.
+BUFFER_LINES = 500
+
+_local = threading.local()
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_buffer = []
+
+def enabled():
+	"""
+	Tracing is on unless PT_TRACE_PATH is set to an empty string.
+	"""
+	return bool(TRACE_PATH)
+
+def _stack():
+	stack = getattr(_local, "stack", None)
+	if stack is None:
+		stack = _local.stack = []
+	return stack
+
+def _sql_count():
+	return getattr(_local, "sql", 0)
+
+def _rotate():
+	for i in range(TRACE_BACKUPS - 1, 0, -1):
+		older = "{}.{}".format(TRACE_PATH, i)
+		if os.path.exists(older):
+			os.rename(older, "{}.{}".format(TRACE_PATH, i + 1))
+	os.rename(TRACE_PATH, TRACE_PATH + ".1")
+
+def _write(lines):
+	directory = os.path.dirname(TRACE_PATH)
+	if directory and not os.path.isdir(directory):
+		os.makedirs(directory)
+	data = "\n".join(lines) + "\n"
+	size = os.path.getsize(TRACE_PATH) if os.path.exists(TRACE_PATH) else 0
+	if size and size + len(data) > TRACE_MAX_BYTES:
+		_rotate()
+	# One append per batch: lines from concurrent shard processes never
+	# interleave mid-line.
+	with open(TRACE_PATH, "a") as trace_file:
+		trace_file.write(data)
+
+def flush():
+	"""
+	Write out any buffered spans.
+	"""
+	with _lock:
+		lines = _buffer[:]
+		del _buffer[:]
+	if lines:
+		try:
+			_write(lines)
+		except (IOError, OSError):
+			pass
+
+def reset():
+	"""
+	Drop the buffer and span ids inherited from a parent process.
+	"""
+	global _ids
+	_ids = itertools.count(1)
+	with _lock:
+		del _buffer[:]
+	_local.stack = []
+
+def _emit(kind, name, start, sql_start, parent, attrs, span_id=None,
+		error=None):
+	span_id = span_id or "{}.{}".format(os.getpid(), next(_ids))
+	record = {
+		"trace": parent.trace if parent else span_id,
+		"span": span_id,
+		"parent": parent.id if parent else None,
+		"kind": kind,
+		"name": name,
+		"start": round(start, 4),
+		"ms": round((time.time() - start) * 1000.0, 2),
+		"sql": _sql_count() - sql_start
+	}
+	if error is not None:
+		record["error"] = error
+	record.update(attrs)
+	with _lock:
+		_buffer.append(json.dumps(record, separators=(",", ":")))
+		full = len(_buffer) >= BUFFER_LINES
+	if full or parent is None or kind == "user":
+		flush()
+
+class span(object):
+	"""
+	Context manager for one span. Extra keyword arguments are written with
+	the span; more can be added with `set()` before it ends.
+
+		with tracing.span("user", "poll_and_save", user=user.id):
+			...
+	"""
+	def __init__(self, kind, name, **attrs):
+		self.kind = kind
+		self.name = name
+		self.attrs = attrs
+
+	def set(self, **attrs):
+		self.attrs.update(attrs)
+
+	def __enter__(self):
+		if not enabled():
+			return self
+		stack = _stack()
+		self.parent = stack[-1] if stack else None
+		self.id = "{}.{}".format(os.getpid(), next(_ids))
+		self.trace = self.parent.trace if self.parent else self.id
+		self.start = time.time()
+		self.sql_start = _sql_count()
+		stack.append(self)
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		if not enabled():
+			return False
+		stack = _stack()
+		if self in stack:
+			del stack[stack.index(self):]
+		_emit(self.kind, self.name, self.start, self.sql_start, self.parent,
+				self.attrs, span_id=self.id,
+				error=exc_type.__name__ if exc_type else None)
+		return False
+
+def _count_statement(*args):
+	_local.sql = _sql_count() + 1
+
+def _before_flush(session, flush_context, instances):
+	_local.flush = (time.time(), _sql_count(), len(session.new) +
+			len(session.dirty) + len(session.deleted))
+
+def _after_flush(session, flush_context):
+	started = getattr(_local, "flush", None)
+	if started is not None:
+		_local.flush = None
+		stack = _stack()
+		_emit("db", "flush", started[0], started[1], stack[-1] if stack else None,
+				{"rows": started[2]})
+
+def instrument(engine):
+	"""
+	Count the SQL statements run on `engine` and trace session flushes.
+	"""
+	if not enabled():
+		return
+	from sqlalchemy import event
+	from sqlalchemy.orm import Session
+	event.listen(engine, "before_cursor_execute", _count_statement)
+	event.listen(Session, "before_flush", _before_flush)
+	event.listen(Session, "after_flush", _after_flush)
+
+def _load(paths):
+	spans = []
+	for path in paths:
+		with open(path) as trace_file:
+			for line in trace_file:
+				line = line.strip()
+				if line:
+					spans.append(json.loads(line))
+	return spans
+
+def summarize(spans, top=10):
+	"""
+	Return a text report on a list of spans: cycles, time by phase, slowest
+	users and slowest upstream endpoints.
+
+	:param list spans: decoded trace lines\n
+	:param int top: how many users and endpoints to list
+	"""
+	child_ms = {}
+	for s in spans:
+		if s.get("parent"):
+			child_ms[s["parent"]] = child_ms.get(s["parent"], 0.0) + s["ms"]
+
+	phases, users, endpoints, cycles = {}, {}, {}, []
+	for s in spans:
+		self_ms = max(s["ms"] - child_ms.get(s["span"], 0.0), 0.0)
+		if s["kind"] == "http":
+			phase = "http {}".format(s.get("upstream", "?"))
+		elif s["kind"] == "db":
+			phase = "db {}".format(s["name"])
+		else:
+			phase = "{} {} (own time)".format(s["kind"], s["name"])
+		phases[phase] = phases.get(phase, 0.0) + self_ms
+
+		if s["kind"] == "cycle":
+			cycles.append(s)
+		elif s["kind"] == "user":
+			entry = users.setdefault(s.get("user"), [0, 0.0, 0])
+			entry[0] += 1
+			entry[1] += s["ms"]
+			entry[2] += s["sql"]
+		elif s["kind"] == "http":
+			key = "{} {}".format(s.get("upstream"), s["name"])
+			entry = endpoints.setdefault(key, [0, 0.0, 0.0, 0, 0])
+			entry[0] += 1
+			entry[1] += s["ms"]
+			entry[2] = max(entry[2], s["ms"])
+			entry[3] += 0 if str(s.get("status")).startswith("2") else 1
+			entry[4] += s.get("bytes") or 0
+
+	lines = ["Cycles"]
+	for c in cycles:
+		lines.append("  {:<16} shard {:<4} {:>10.1f} ms  {:>6} sql  {}".format(
+				c["name"], c.get("shard", "-"), c["ms"], c["sql"],
+				time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(c["start"]))))
+
+	total = sum(phases.values()) or 1.0
+	lines.append("")
+	lines.append("Time by phase")
+	for phase, ms in sorted(phases.items(), key=lambda item: -item[1]):
+		lines.append("  {:<36} {:>10.1f} ms  {:>5.1f}%".format(phase, ms,
+				100.0 * ms / total))
+
+	lines.append("")
+	lines.append("Slowest users (total over all cycles)")
+	for user, (count, ms, sql) in sorted(users.items(),
+			key=lambda item: -item[1][1])[:top]:
+		lines.append("  user {:<10} {:>4} spans {:>10.1f} ms  {:>6} sql".format(
+				user, count, ms, sql))
+
+	lines.append("")
+	lines.append("Slowest endpoints (by total time)")
+	for key, (count, ms, worst, failed, size) in sorted(endpoints.items(),
+			key=lambda item: -item[1][1])[:top]:
+		lines.append("  {:<40} {:>5} calls  avg {:>8.1f} ms  max {:>8.1f} ms  "
+				"{:>4} failed  avg {:>7.0f} B".format(key, count, ms / count, worst,
+				failed, float(size) / count))
+	return "\n".join(lines)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Summarize PowerToken trace "
+			"files.")
+	subparsers = parser.add_subparsers(dest="command")
+	summary = subparsers.add_parser("summarize", help="summarize trace files")
+	summary.add_argument("paths", nargs="+", help="trace files (.jsonl)")
+	summary.add_argument("--top", type=int, default=10)
+	args = parser.parse_args()
+	if args.command == "summarize":
+		print(summarize(_load(args.paths), top=args.top))
+	else:
+		parser.print_help()
@@ -0,0 +1,122 @@
+"""
+Brings an existing database's schema up to the current models: creates the
+tables added since 5/2018, and adds the columns and indexes added to the
+tables that already existed, which `create_all` doesn't touch. It also
+moves activities the Flask app stored under their user's `wc_id` to the
+user's `id`, which both sets of models now use. Safe to run again: only
+what's missing is added, and only activities that aren't under their
+user's `id` are moved. Run it (once per cohort database, see
+cohorts.py) before starting the new scripts or app:\n
+	python -m background upgrade [--dry-run]\n
+Created on 10/19/2026.
+"""
+
+import argparse, logging, sys
+from sqlalchemy import and_, func, inspect, select
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+from db import engine
+from models import Base
+
+# Columns added to tables that existed before, with what needs them. The
+# new columns are nullable, so existing rows need no values; a foreign key
+# added this way isn't enforced on SQLite.
+COLUMNS = [
+	("user", "shard", "sharding.py"),
+	("user", "shard_count", "sharding.py"),
+	("activity", "start_time", "recurrence.py"),
+	("activity", "duration", "recurrence.py"),
+	("activity", "repeat", "recurrence.py"),
+	("user", "timezone", "usertime.py"),
+	("user", "maintained_on", "maintenance.py"),
+	("error", "group_id", "errorgroups.py"),
+	("user", "cohort", "cohorts.py")
+]
+
+def statements(bind=engine):
+	"""
+	Return the CREATE TABLE, ALTER TABLE and CREATE INDEX statements the
+	database is missing, and the UPDATEs moving activities to their user's
+	`id`, as strings.
+
+	:param sqlalchemy.engine.Engine bind
+	"""
+	inspector = inspect(bind)
+	dialect = bind.dialect
+	preparer = dialect.identifier_preparer
+	tables = set(inspector.get_table_names())
+	missing = []
+	for table in Base.metadata.sorted_tables:
+		if table.name not in tables:
+			missing.append(str(CreateTable(table).compile(dialect=dialect)))
+	for table_name, column_name, _ in COLUMNS:
+		if table_name not in tables:
+			continue
+		present = set(c["name"] for c in inspector.get_columns(table_name))
+		if column_name not in present:
+			table = Base.metadata.tables[table_name]
+			missing.append("ALTER TABLE {} ADD COLUMN {}".format(
+					preparer.format_table(table),
+					CreateColumn(table.c[column_name]).compile(dialect=dialect)))
+	for table in Base.metadata.sorted_tables:
+		present = set(i["name"] for i in inspector.get_indexes(table.name)) \
+				if table.name in tables else set()
+		for index in sorted(table.indexes, key=lambda i: i.name):
+			if index.name not in present:
+				missing.append(str(CreateIndex(index).compile(dialect=dialect)))
+	if "activity" in tables:
+		missing.extend(_activity_owner_fixes(bind))
+	return missing
+
+def _activity_owner_fixes(bind):
+	# Until 10/2026 the Flask app keyed `activity.user_id` on `user.wc_id`.
+	# An activity with events belongs to the user of their days; one without
+	# is moved only if its user_id is no user's id but is someone's wc_id.
+	tables = Base.metadata.tables
+	activity, day, event, user = (tables[name] for name in
+			("activity", "day", "event", "user"))
+	owner = select([day.c.user_id]).\
+			select_from(event.join(day, day.c.id == event.c.day_id)).\
+			where(event.c.activity_id == activity.c.id).limit(1).as_scalar()
+	by_wc_id = select([user.c.id]).where(user.c.wc_id == activity.c.user_id).\
+			as_scalar()
+	unowned = and_(activity.c.user_id.notin_(select([user.c.id])),
+			activity.c.user_id.in_(select([user.c.wc_id])))
+	statements = []
+	for condition, value in ((owner != activity.c.user_id, owner),
+			(unowned, by_wc_id)):
+		count = bind.execute(select([func.count()]).select_from(activity).\
+				where(condition)).scalar()
+		if count:
+			statements.append(str(activity.update().where(condition).\
+					values(user_id=value).compile(bind=bind,
+					compile_kwargs={"literal_binds": True})))
+	return statements
+
+def upgrade(bind=engine, dry_run=False):
+	"""
+	Add the missing tables, columns and indexes, and move the activities.
+	Return the statements, run
+	or (with `dry_run`) not.
+
+	:param sqlalchemy.engine.Engine bind\n
+	:param bool dry_run
+	"""
+	missing = statements(bind)
+	if not dry_run:
+		with bind.begin() as conn:
+			for statement in missing:
+				conn.execute(statement)
+	return missing
+
+if __name__ == "__main__":
+	logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+	parser = argparse.ArgumentParser(description="Add the columns and indexes "
+			"newer versions need to an existing PowerToken database.")
+	parser.add_argument("--dry-run", action="store_true",
+			help="print the statements instead of running them")
+	args = parser.parse_args()
+	missing = upgrade(dry_run=args.dry_run)
+	for statement in missing:
+		print(statement.strip() + ";")
+	logging.info("{} statements {}".format(len(missing),
+			"needed" if args.dry_run else "run"))
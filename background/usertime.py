@@ -0,0 +1,112 @@
+"""
+Per-user local time. Each user's days start at midnight in their own time
+zone (`User.timezone`, an IANA name like "America/Chicago"), so `day` rows,
+event windows and progress follow the user's calendar, not the server's.
+Users without a valid time zone get the server's local time.\n
+All values are naive datetimes on the user's wall clock, like the ones
+stored in the database. WEconnect's timestamps are naive UTC; `from_utc`
+and `to_utc` convert between the two. Used by the Flask app as well, so
+stdlib only.\n
+Created on 10/19/2026.
+"""
+
+from datetime import datetime, time, timezone
+import logging
+
+try:
+	from zoneinfo import ZoneInfo
+except ImportError:
+	ZoneInfo = None
+
+_zones = {}
+
+def zone(name):
+	"""
+	Return the tzinfo for an IANA time zone name, or None (server time) if
+	the name is empty or unknown.
+
+	:param String name
+	"""
+	if not name or ZoneInfo is None:
+		return None
+	if name not in _zones:
+		try:
+			_zones[name] = ZoneInfo(name)
+		except (KeyError, ValueError):
+			logging.warning("Unknown time zone {!r}; using server time".format(name))
+			_zones[name] = None
+	return _zones[name]
+
+def is_valid(name):
+	"""
+	Return True if `name` is a time zone this host knows.
+
+	:param String name
+	"""
+	if not name or ZoneInfo is None:
+		return False
+	if name in _zones:
+		return _zones[name] is not None
+	# Not cached: this is called with names from web forms.
+	try:
+		ZoneInfo(name)
+	except (KeyError, ValueError):
+		return False
+	return True
+
+def _zone_of(user):
+	return zone(user if isinstance(user, str) or user is None else user.timezone)
+
+def now(user=None):
+	"""
+	Return the current time on the user's wall clock, as a naive datetime.
+
+	:param user: a User (either model), a time zone name, or None
+	"""
+	tz = _zone_of(user)
+	if tz is None:
+		return datetime.now()
+	return datetime.now(tz).replace(tzinfo=None)
+
+def today(user=None):
+	"""
+	Return midnight of the user's current day, as a naive datetime (the
+	value stored in `Day.date`).
+
+	:param user: a User (either model), a time zone name, or None
+	"""
+	return datetime.combine(now(user).date(), time(0, 0, 0))
+
+def from_utc(value, user=None):
+	"""
+	Return a naive UTC datetime (e.g. a WEconnect timestamp) on the user's
+	wall clock. Values too close to the ends of the calendar to convert (like
+	expirations far in the future) are returned as they are.
+
+	:param datetime value: None is returned as None\n
+	:param user: a User (either model), a time zone name, or None
+	"""
+	if value is None:
+		return None
+	try:
+		# astimezone(None) is the server's time zone.
+		return value.replace(tzinfo=timezone.utc).astimezone(_zone_of(user)).\
+				replace(tzinfo=None)
+	except (OverflowError, ValueError):
+		return value
+
+def to_utc(value, user=None):
+	"""
+	Return a naive datetime on the user's wall clock as naive UTC, the
+	inverse of `from_utc`.
+
+	:param datetime value\n
+	:param user: a User (either model), a time zone name, or None
+	"""
+	tz = _zone_of(user)
+	# A naive datetime's astimezone() takes it as server time.
+	local = value.replace(tzinfo=tz) if tz is not None else value
+	try:
+		return local.astimezone(timezone.utc).replace(tzinfo=None)
+	except (OverflowError, ValueError):
+		return value
@@ -0,0 +1,194 @@
+"""
+Decodes WEconnect `activities` and `activities-with-events` responses into
+small records, in one pass over the JSON. Used by the background scripts and
+the Flask app, so stdlib only.\n
+Timestamps ("2018-04-30T14:00:00.000Z") are parsed by slicing instead of
+`strptime`, and repeated values (timestamps, activity names, repeat rules)
+are decoded once and shared. An item missing a field, or with a field of the
+wrong type, raises DecodeError; `activities` logs and drops it instead.\n
+Created on 10/19/2026.
+"""
+
+from datetime import datetime, timedelta, MAXYEAR
+import logging
+
+DATE_FMT = "%Y-%m-%dT%H:%M:%S.%fZ"
+NEVER_EXPIRES = datetime(MAXYEAR, 12, 31)
+
+# Decoded timestamps and strings kept for reuse; cleared when full.
+MEMO_SIZE = 4096
+
+_timestamps = {}
+_strings = {}
+
+class DecodeError(ValueError):
+	"""
+	A WEconnect item that doesn't have the expected fields.
+	"""
+	pass
+
+class _Record(object):
+	__slots__ = ()
+
+	def __eq__(self, other):
+		return type(self) is type(other) and all(getattr(self, name) ==
+				getattr(other, name) for name in self.__slots__)
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __repr__(self):
+		return "{}({})".format(type(self).__name__, ", ".join("{}={!r}".format(
+				name, getattr(self, name)) for name in self.__slots__))
+
+class WcActivity(_Record):
+	"""
+	A WEconnect activity. `end` is the end of its first occurrence;
+	`expiration` is `repeatEnd`, the end of a one-time activity, or
+	NEVER_EXPIRES. `events` is None for the `activities` endpoint.
+	"""
+	__slots__ = ("activity_id", "name", "start", "end", "duration", "repeat",
+			"expiration", "modified", "events")
+
+	def __init__(self, activity_id, name, start, end, duration, repeat,
+			expiration, modified, events=None):
+		self.activity_id = activity_id
+		self.name = name
+		self.start = start
+		self.end = end
+		self.duration = duration
+		self.repeat = repeat
+		self.expiration = expiration
+		self.modified = modified
+		self.events = events
+
+class WcEvent(_Record):
+	"""
+	One occurrence of a WEconnect activity, and whether it was checked in.
+	"""
+	__slots__ = ("eid", "activity_id", "start", "end", "duration", "completed")
+
+	def __init__(self, eid, activity_id, start, end, duration, completed):
+		self.eid = eid
+		self.activity_id = activity_id
+		self.start = start
+		self.end = end
+		self.duration = duration
+		self.completed = completed
+
+def parse_timestamp(text):
+	"""
+	Parse a WEconnect timestamp, "YYYY-MM-DDTHH:MM:SS.fffZ" (any number of
+	fraction digits, or none). Anything else goes through `strptime`.
+
+	:param String text
+	"""
+	if not isinstance(text, str):
+		raise DecodeError("bad timestamp {!r}".format(text))
+	value = _timestamps.get(text)
+	if value is not None:
+		return value
+	try:
+		if len(text) < 20 or text[4] != "-" or text[7] != "-" or \
+				text[10] != "T" or text[13] != ":" or text[16] != ":" or \
+				text[19] not in ".Z" or text[-1] != "Z":
+			raise ValueError(text)
+		fraction = text[20:-1]
+		value = datetime(int(text[0:4]), int(text[5:7]), int(text[8:10]),
+				int(text[11:13]), int(text[14:16]), int(text[17:19]),
+				int(fraction[:6].ljust(6, "0")))
+	except ValueError:
+		try:
+			value = datetime.strptime(text, DATE_FMT)
+		except ValueError:
+			raise DecodeError("bad timestamp {!r}".format(text))
+	if len(_timestamps) >= MEMO_SIZE:
+		_timestamps.clear()
+	_timestamps[text] = value
+	return value
+
+def _string(value, key):
+	if not isinstance(value, str):
+		raise DecodeError("{} is not a string: {!r}".format(key, value))
+	shared = _strings.get(value)
+	if shared is None:
+		if len(_strings) >= MEMO_SIZE:
+			_strings.clear()
+		shared = _strings[value] = value
+	return shared
+
+def _int(value, key):
+	if not isinstance(value, int) or isinstance(value, bool):
+		raise DecodeError("{} is not an integer: {!r}".format(key, value))
+	return value
+
+def event(item, activity_id=None):
+	"""
+	Decode one event from `activities-with-events`.
+
+	:param dict item\n
+	:param int activity_id: the enclosing activity's id, if the event has none
+	"""
+	try:
+		start = parse_timestamp(item["dateStart"])
+		duration = _int(item["duration"], "duration")
+		eid = item["eid"]
+		completed = item["didCheckin"]
+		activity_id = item.get("activityId", activity_id)
+	except (KeyError, TypeError, AttributeError) as e:
+		raise DecodeError("event without {}".format(e))
+	if not isinstance(eid, str):
+		eid = str(_int(eid, "eid"))
+	return WcEvent(eid, activity_id, start, start + timedelta(minutes=duration),
+			duration, completed == True)
+
+def activity(item):
+	"""
+	Decode one activity, with its events if it has any.
+
+	:param dict item: an activity from `activities` or
+	`activities-with-events`
+	"""
+	try:
+		activity_id = _int(item["activityId"], "activityId")
+		start = parse_timestamp(item["dateStart"])
+		duration = _int(item["duration"], "duration")
+		repeat = _string(item["repeat"], "repeat")
+		name = _string(item["name"], "name")
+		repeat_end = item["repeatEnd"]
+		modified = item.get("dateModified")
+		events = item.get("events")
+	except (KeyError, TypeError, AttributeError) as e:
+		raise DecodeError("activity without {}".format(e))
+	end = start + timedelta(minutes=duration)
+	if repeat_end is not None:
+		expiration = parse_timestamp(repeat_end)
+	elif repeat == "never":
+		expiration = end
+	else:
+		expiration = NEVER_EXPIRES
+	if modified is not None:
+		modified = parse_timestamp(modified)
+	if events is not None:
+		events = [event(ev, activity_id) for ev in events]
+	return WcActivity(activity_id, name, start, end, duration, repeat,
+			expiration, modified, events)
+
+def activities(items):
+	"""
+	Decode an `activities` or `activities-with-events` response. Items that
+	can't be decoded are logged and left out.
+
+	:param list items: the parsed JSON
+	"""
+	if not isinstance(items, list):
+		logging.warning("WEconnect returned {!r} instead of a list".format(
+				type(items).__name__))
+		return []
+	decoded = []
+	for item in items:
+		try:
+			decoded.append(activity(item))
+		except DecodeError as e:
+			logging.warning("Skipped a WEconnect activity: {}".format(e))
+	return decoded
@@ -4,22 +4,27 @@ Created by Abigail Franz.\n
 Last modified by Abigail Franz on 4/30/2018.
 """
 
-from datetime import datetime
-import json, logging, requests
+from datetime import datetime, timedelta
+import logging, os
+import connections
 from db import session
-from models import User, Activity, Event, Error
+import errorgroups
+from models import User, Event
+import usertime
+import wcdecode
 
 import logging, sys
 logging.basicConfig(stream=sys.stderr, level=logging.DEBUG)
 
 
-WC_URL = "https://palalinq.herokuapp.com/api/People"
+# Override with WECONNECT_API_URL to point at a stub server (see bench/stubs.py).
+API_URL = os.environ.get("WECONNECT_API_URL") or "https://palalinq.herokuapp.com/api"
+WC_URL = API_URL + "/People"
 WC_DATE_FMT = "%Y-%m-%dT%H:%M:%S.%fZ"
-TODAY = datetime(datetime.now().year, datetime.now().month, datetime.now().day)
 
 
 DATE_FMT = "%Y-%m-%dT%H:%M:%S.%fZ"
-BASE_URL = "https://palalinq.herokuapp.com/api/people"
+BASE_URL = API_URL + "/people"
 
 def check_wc_token_status(wc_user_id, wc_token):
 	logging.info("CHECKING STATUS")
@@ -27,13 +32,14 @@ def check_wc_token_status(wc_user_id, wc_token):
 		CHECK TOKEN STATUS (401 AUTH ERROR)
 	"""
 	url = "{}/{}?access_token={}".format(WC_URL, wc_user_id, wc_token) 
-	result = requests.get(url)
+	result = connections.request("weconnect", "check_wc_token_status", "GET", url)
 	logging.debug("Result: {}".format(result.status_code))
 	if result.status_code != 200:
-		print("Response: {}").format("Token invalid" if result.status_code == 401 else result.status_code)
+		logging.info("Response: {}".format("Token invalid"
+				if result.status_code == 401 else result.status_code))
 		return False
 	else:
-		print("Token for User {} is good").format(wc_user_id)
+		logging.info("Token for User {} is good".format(wc_user_id))
 		return True
 
 def login_to_wc(email, password):
@@ -50,7 +56,8 @@ def login_to_wc(email, password):
 	"""
 	url = "{}/login".format(WC_URL)
 	data = {"email": email, "password": password}
-	result = requests.post(url, data=data)
+	result = connections.request("weconnect", "login_to_wc", "POST", url,
+			data=data)
 	if result.status_code != 200:
 		return False, ()
 		
@@ -64,116 +71,102 @@ def login_to_wc(email, password):
 		return True, (wc_id, wc_token)
 
 
-def get_activities(user):
+def get_activities(user, raise_errors=False):
 	"""
 	OUTDATED?
-	Fetch all the user's WEconnect activities. Return an empty list if the
-	request is unsuccessful.
+	Fetch all the user's WEconnect activities, as wcdecode.WcActivity
+	records. Return an empty list if the request is unsuccessful.
 
-	:param background.models.User user
+	:param background.models.User user\n
+	:param bool raise_errors: raise IOError instead of returning an empty list
 	"""
 	logging.debug("YOU'VE ACCESSED WC.get_activities(). This is deprecated")
 	pass
 	
 	url = "{}/{}/activities?access_token={}".format(BASE_URL, user.wc_id,
 			user.wc_token)
-	response = requests.get(url)
+	response = connections.request("weconnect", "get_activities", "GET", url)
 	if response.status_code == 200:
-		return response.json()
+		return wcdecode.activities(response.json())
 	else:
-		error = Error(
+		errorgroups.record(session,
 			summary = "Couldn't get list of activities.",
 			origin = "background/weconnect.py, in _get_activities",
 			message = response.json()["error"]["message"],
 			user = user
 		)
-		session.add(error)
 		session.commit()
+		if raise_errors:
+			raise IOError("WEconnect get_activities returned {}".format(
+					response.status_code))
 		return []
 
-def set_wc_activities(wc_user_id, wc_user_token):
+def get_todays_events(user, raise_errors=False):
 	"""
-	Pulls all of a user's activities from the WEconnect backend and stores
-	information about them in the database. Returns a list of app.model.Activity
-	objects.
+	Get the activities-with-events that are happening today, in the user's
+	time zone. Return an empty list if the request is unsuccessful.
 
-	:param app.models.User user: a user from the database
+	:param background.models.User user\n
+	:param bool raise_errors: raise IOError instead of returning an empty list
 	"""
-	url = "{}/{}/activities?access_token={}".format(WC_URL, wc_user_id, wc_user_token)
-	response = requests.get(url)
-	if response.status_code != 200:
-		# Return an empty list if the request was unsuccessful
-		return []
-	wc_acts = response.json()
-	for act in wc_acts:
-		activity = createNewActivity(act, wc_user_id)
-		if activity.expiration > datetime.now():
-			# Add the activity to the database if it's unexpired.
-			session.add(activity)
-	try:
-		db.session.commit()
-		print("Added {} activities for {}").format(len(wc_acts), wc_user_id)
-	except:
-		print("Could not add activities for {}").format(wc_user_id)
-		db.rollback()
-
-
-def get_todays_events(user):
-	"""
-	Get the activities-with-events that are happening today. Return an empty
-	list if the request is unsuccessful.
+	today = usertime.now(user)
+	return get_events_between(user, today, today, "get_todays_events",
+			raise_errors)
 
-	:param background.models.User user
+
+def get_events_between(user, first_day, last_day, endpoint="get_events_between",
+		raise_errors=False):
+	"""
+	Get the activities-with-events from the start of `first_day` to the end
+	of `last_day`, in one request, as wcdecode.WcActivity records with their
+	events. Return an empty list if the request is unsuccessful.
+
+	:param background.models.User user\n
+	:param datetime first_day\n
+	:param datetime last_day\n
+	:param String endpoint: the name the request is recorded under\n
+	:param bool raise_errors: raise IOError instead of returning an empty list
 	"""
-	today = datetime.now()
-	st = today.strftime("%Y-%m-%dT00:00:00")
-	et = today.strftime("%Y-%m-%dT23:59:59")
+	# The user's days, in WEconnect's UTC.
+	first = datetime.combine(first_day.date(), datetime.min.time())
+	end = datetime.combine(last_day.date(), datetime.min.time()) + \
+			timedelta(days=1, seconds=-1)
+	st = usertime.to_utc(first, user).strftime("%Y-%m-%dT%H:%M:%S")
+	et = usertime.to_utc(end, user).strftime("%Y-%m-%dT%H:%M:%S")
 	url = "{}/{}/activities-with-events?from={}&to={}&access_token={}".format(
 			BASE_URL, user.wc_id, st, et, user.wc_token)
-	response = requests.get(url)
+	response = connections.request("weconnect", endpoint, "GET", url)
 	if response.status_code == 200:
-		return response.json()
+		return wcdecode.activities(response.json())
 	else:
-		error = Error(
-			summary = "Couldn't get activities with events for {}".format(today),
-			origin = "background/weconnect.py, in get_todays_events",
+		if first_day.date() == last_day.date():
+			period = first_day.date()
+		else:
+			period = "{} to {}".format(first_day.date(), last_day.date())
+		errorgroups.record(session,
+			summary = "Couldn't get activities with events for {}".format(period),
+			origin = "background/weconnect.py, in {}".format(endpoint),
 			message = response.json()["error"]["message"],
 			user = user
 		)
-		session.add(error)
 		session.commit()
+		if raise_errors:
+			raise IOError("WEconnect {} returned {}".format(endpoint,
+					response.status_code))
 		return []
 
 
-def createNewEvent(js_event):
+def createNewEvent(wc_event, activity, user):
 	#eid, start_time, didCheckin, day_id=None, activity_id
-	
-	startTime = datetime.strptime(ev["dateStart"], WC_DATE_FMT)
-	newEvent = Event(eid=event["eid"], start_time=startTime, activity_id=ev["activityId"], completed=ev["didCheckin"])
-
-	return newEvent
-
-
-
-def createNewActivity(wc_act, wc_user_id):
 	"""
-	Given a JSON activity object from WEconnect, convert it to an Activity
-	object compatible with the database.
-
-	:param dict wc_act: an activity from WEconnect in JSON format
-	:param app.models.User user
+	:param wcdecode.WcEvent wc_event\n
+	:param background.models.Activity activity: the local row of the event's
+	activity (`Event.activity_id` is `activity.id`, not WEconnect's id)\n
+	:param background.models.User user: for the event's local times
 	"""
-	# Determine the start and end times
-	ts = datetime.strptime(wc_act["dateStart"], WC_DATE_FMT)
-	te = ts + timedelta(minutes=wc_act["duration"])
-
-	# Determine the expiration date (if any)
-	expiration = datetime(MAXYEAR, 12, 31)
-	if wc_act["repeat"] == "never":
-		expiration = te
-	if wc_act["repeatEnd"] != None:
-		expiration = datetime.strptime(wc_act["repeatEnd"], WC_DATE_FMT)
-
-	activity = Activity(wc_act_id=wc_act["activityId"], name=wc_act["name"],
-			expiration=expiration, wc_user_id=wc_user_id)
-	return activity
\ No newline at end of file
+	newEvent = Event(eid=wc_event.eid,
+			start_time=usertime.from_utc(wc_event.start, user),
+			end_time=usertime.from_utc(wc_event.end, user), activity=activity,
+			completed=wc_event.completed)
+
+	return newEvent
@@ -0,0 +1,112 @@
+"""
+Checks how long each `python -m background <command>` takes to import its
+code, and which packages it loads.\n
+Every command is started with `--help` under `python -X importtime`, which
+imports everything the command needs and exits before doing any work. The
+import time is the sum of the "self" times in the report (best of several
+runs). The script exits with status 1 if a command goes over its budget in
+IMPORT_BUDGETS, or loads a package it must not.\n
+Usage: `python bench/import_budget.py [--runs 5] [--scale 1.0]`\n
+Created on 10/19/2026.
+"""
+
+import argparse, os, shutil, subprocess, sys, tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets in milliseconds, measured on a development laptop, with room for
+# noise. Lower a budget when a command gets faster, so the gain is kept.
+IMPORT_BUDGETS = {
+	"": 25,
+	"trace": 60,
+	"progress": 300,
+	"retention": 300,
+	"dump": 300,
+	"export": 400,
+	"push": 300,
+	"maintain": 350,
+	"poll": 350
+}
+
+# Packages each command must never load. Flask is never needed by the
+# background scripts, and `requests` only once an upstream call is made.
+FORBIDDEN = {
+	"": ["sqlalchemy", "requests", "flask"],
+	"trace": ["sqlalchemy", "requests", "flask"],
+	"progress": ["requests", "flask"],
+	"retention": ["requests", "flask"],
+	"dump": ["requests", "flask"],
+	"export": ["requests", "flask"],
+	"push": ["requests", "flask"],
+	"maintain": ["requests", "flask"],
+	"poll": ["requests", "flask"]
+}
+
+def measure(command, env):
+	"""
+	Import a command once under -X importtime. Return (milliseconds, set of
+	top-level packages loaded).
+	"""
+	cmd = [sys.executable, "-X", "importtime", "-m", "background"]
+	if command:
+		cmd += [command, "--help"]
+	process = subprocess.run(cmd, cwd=ROOT_DIR, env=env, stdout=subprocess.PIPE,
+			stderr=subprocess.PIPE, universal_newlines=True)
+	micros, packages = 0, set()
+	for line in process.stderr.splitlines():
+		if not line.startswith("import time:") or "[us]" in line:
+			continue
+		self_us, _, name = line[len("import time:"):].split("|")
+		micros += int(self_us)
+		packages.add(name.strip().split(".")[0])
+	if process.returncode != 0:
+		raise RuntimeError("`{}` failed:\n{}".format(" ".join(cmd),
+				process.stderr[-2000:]))
+	return micros / 1000.0, packages
+
+def run(runs, scale):
+	"""
+	Measure every command and return a list of
+	(command, best ms, budget ms, forbidden packages loaded).
+	"""
+	workdir = tempfile.mkdtemp(prefix="pt-import-")
+	env = dict(os.environ)
+	env["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "import.db")
+	env["PT_METRICS_PATH"] = os.path.join(workdir, "metrics.db")
+	env["PT_TRACE_PATH"] = ""
+	results = []
+	try:
+		# The first run of each command also writes the bytecode caches.
+		for command in sorted(IMPORT_BUDGETS):
+			measure(command, env)
+		for command in sorted(IMPORT_BUDGETS):
+			best, packages = None, set()
+			for _ in range(runs):
+				ms, packages = measure(command, env)
+				best = ms if best is None else min(best, ms)
+			loaded = sorted(set(FORBIDDEN.get(command, [])) & packages)
+			results.append((command, best, IMPORT_BUDGETS[command] * scale, loaded))
+	finally:
+		shutil.rmtree(workdir)
+	return results
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Check the import time of "
+			"the background commands.")
+	parser.add_argument("--runs", type=int, default=5)
+	parser.add_argument("--scale", type=float, default=1.0,
+			help="multiply every budget, for slower machines")
+	args = parser.parse_args()
+
+	failed = False
+	print("{:<12}{:>10}{:>10}  {}".format("command", "ms", "budget", "status"))
+	for command, ms, budget, loaded in run(args.runs, args.scale):
+		status = "ok"
+		if ms > budget:
+			status = "OVER BUDGET"
+		if loaded:
+			status = "loads " + ", ".join(loaded)
+		failed = failed or status != "ok"
+		print("{:<12}{:>10.1f}{:>10.0f}  {}".format(command or "(none)", ms,
+				budget, status))
+	sys.exit(1 if failed else 0)
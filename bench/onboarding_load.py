@@ -0,0 +1,184 @@
+"""
+Load test for user onboarding against a slow WEconnect stub: many simulated
+users go through the PowerToken login and WEconnect login pages at once,
+the way a study's participants do at an enrollment session.\n
+Each onboarding is GET+POST /user_login, then GET+POST /user_wc_login, which
+calls WEconnect twice (login and activities) through the stub in stubs.py.
+The app runs in its own process, under Gunicorn (`--server gunicorn`, with
+any worker class) or Werkzeug's development server. Reported: onboardings
+per second, p50/p95 latency of a whole onboarding, and failures.\n
+Usage: `python bench/onboarding_load.py --users 60 --concurrency 20
+--latency 0.5 --server gunicorn --worker-class gthread --workers 2 --threads 8`\n
+Created on 10/19/2026.
+"""
+
+import argparse, json, os, re, shutil, subprocess, sys, tempfile, threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+import stubs
+
+_csrf = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+def percentile(values, pct):
+	ordered = sorted(values)
+	index = int(round((len(ordered) - 1) * pct / 100.0))
+	return ordered[index]
+
+def app_env(workdir, wc_url):
+	env = dict(os.environ)
+	env.update({
+		"DATABASE_URL": "sqlite:///" + os.path.join(workdir, "onboarding.db"),
+		"LOG_PATH": os.path.join(workdir, "app.log"),
+		"PT_METRICS_PATH": os.path.join(workdir, "metrics.db"),
+		"PT_BREAKER_PATH": os.path.join(workdir, "breakers.db"),
+		"WECONNECT_API_URL": wc_url + "/api",
+		"SECRET_KEY": "bench",
+		"PT_ADMINS": "bench@example.com"
+	})
+	return env
+
+def start_app(args, env, port):
+	"""
+	Create the schema, then start the app server. Return the Popen.
+	"""
+	subprocess.check_call([sys.executable, "-c", "from powertoken import app, "
+			"db\nwith app.app_context(): db.create_all()"], cwd=ROOT_DIR, env=env,
+			stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+	if args.server == "gunicorn":
+		cmd = [sys.executable, "-m", "gunicorn", "--bind",
+				"127.0.0.1:{}".format(port), "--workers", str(args.workers),
+				"--worker-class", args.worker_class, "--threads", str(args.threads),
+				"--worker-connections", str(args.threads), "wsgi"]
+	else:
+		cmd = [sys.executable, "-c", "from powertoken import app\n"
+				"app.run(port={}, threaded={})".format(port, args.threads > 1)]
+	return subprocess.Popen(cmd, cwd=ROOT_DIR, env=env,
+			stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def wait_until_up(base, timeout=30):
+	import requests
+	deadline = time.time() + timeout
+	while time.time() < deadline:
+		try:
+			if requests.get(base + "/health", timeout=1).status_code == 200:
+				return
+		except requests.RequestException:
+			pass
+		time.sleep(0.2)
+	raise RuntimeError("the app didn't start within {} seconds".format(timeout))
+
+def onboard(http, base, n):
+	"""
+	Take user N through the PowerToken and WEconnect logins. Return True if
+	it ended on the Fitbit login page.
+	"""
+	page = http.get(base + "/user_login")
+	token = _csrf.search(page.text).group(1)
+	response = http.post(base + "/user_login", data={"csrf_token": token,
+			"username": "load-user-{}".format(n)}, allow_redirects=False)
+	location = response.headers.get("Location", "")
+	if "user_wc_login" not in location:
+		return False
+	url = location if location.startswith("http") else base + location
+	page = http.get(url)
+	token = _csrf.search(page.text).group(1)
+	response = http.post(url, data={"csrf_token": token,
+			"email": "user{}@example.com".format(n), "password": "secret"},
+			allow_redirects=False)
+	return "user_fb_login" in response.headers.get("Location", "")
+
+def run(args):
+	"""
+	Start the stubs and the app, onboard `args.users` users with
+	`args.concurrency` clients at once, and return a result dict.
+	"""
+	import requests
+	options = stubs.StubOptions(latency=args.latency, jitter=args.jitter)
+	wc, fb = stubs.start_stubs(options)
+	workdir = tempfile.mkdtemp(prefix="pt-onboarding-")
+	base = "http://127.0.0.1:{}".format(args.port)
+	server = start_app(args, app_env(workdir, wc.url), args.port)
+	try:
+		wait_until_up(base)
+		next_user = iter(range(1, args.users + 1))
+		lock = threading.Lock()
+		latencies, failures = [], [0]
+
+		def client():
+			http = requests.Session()
+			while True:
+				with lock:
+					n = next(next_user, None)
+				if n is None:
+					return
+				start = time.time()
+				try:
+					ok = onboard(http, base, n)
+				except (requests.RequestException, AttributeError):
+					ok = False
+				with lock:
+					if ok:
+						latencies.append(time.time() - start)
+					else:
+						failures[0] += 1
+
+		start = time.time()
+		threads = [threading.Thread(target=client)
+				for _ in range(args.concurrency)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		elapsed = time.time() - start
+	finally:
+		server.terminate()
+		server.wait()
+		shutil.rmtree(workdir)
+
+	label = args.server if args.server != "gunicorn" else "gunicorn {} x{} " \
+			"({} threads)".format(args.worker_class, args.workers, args.threads)
+	return {
+		"server": label,
+		"users": args.users,
+		"concurrency": args.concurrency,
+		"latency": args.latency,
+		"seconds": round(elapsed, 2),
+		"onboardings_per_s": round(len(latencies) / elapsed, 2),
+		"p50_s": round(percentile(latencies, 50), 2) if latencies else None,
+		"p95_s": round(percentile(latencies, 95), 2) if latencies else None,
+		"failures": failures[0],
+		"upstream_requests": wc.stats()["requests"]
+	}
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Load-test concurrent user "
+			"onboarding against a slow WEconnect stub.")
+	parser.add_argument("--users", type=int, default=60)
+	parser.add_argument("--concurrency", type=int, default=20,
+			help="clients onboarding at the same time")
+	parser.add_argument("--latency", type=float, default=0.5,
+			help="seconds the WEconnect stub takes per request")
+	parser.add_argument("--jitter", type=float, default=0.0)
+	parser.add_argument("--server", choices=["gunicorn", "werkzeug"],
+			default="gunicorn")
+	parser.add_argument("--worker-class", default="sync",
+			help="Gunicorn worker class: sync, gthread, gevent, ...")
+	parser.add_argument("--workers", type=int, default=3)
+	parser.add_argument("--threads", type=int, default=1,
+			help="threads (or greenlets) per worker; Werkzeug: >1 means threaded")
+	parser.add_argument("--port", type=int, default=5077)
+	parser.add_argument("--json", action="store_true")
+	args = parser.parse_args()
+
+	result = run(args)
+	if args.json:
+		print(json.dumps(result))
+	else:
+		for key in ("server", "users", "concurrency", "latency", "seconds",
+				"onboardings_per_s", "p50_s", "p95_s", "failures",
+				"upstream_requests"):
+			print("{:<20} {}".format(key, result[key]))
+	sys.exit(1 if result["failures"] else 0)
@@ -0,0 +1,183 @@
+"""
+Measures how the background cycles scale with the number of users, against
+the local stub servers in stubs.py.\n
+For each user count, a fresh SQLite database is filled with synthetic users
+and a child process runs the cycles (`maintain`, `populate`, `poll`) one after
+the other. Reported per cycle: wall time, upstream requests per second, SQL
+statements and the child's peak RSS.\n
+The synthetic users' WEconnect ids differ from their local ids, and a few
+incomplete users (whose ids are other users' WEconnect ids) are added with
+some history. After `maintain`, the script checks that exactly their rows
+were removed, and exits with status 1 if not.\n
+Usage: `python bench/poll_cycle.py --users 10 100 1000 [--latency 0.05]`\n
+Created on 10/19/2026.
+"""
+
+import argparse, json, logging, os, resource, shutil, subprocess, sys
+import tempfile, time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKGROUND_DIR = os.path.join(os.path.dirname(BENCH_DIR), "background")
+CYCLES = ["maintain", "populate", "poll"]
+# Incomplete users added for maintain() to remove.
+INCOMPLETE_USERS = 5
+
+def _stub_requests(wc_url, fb_url):
+	import requests
+	total = 0
+	for url in (wc_url, fb_url):
+		total += requests.get(url + "/_stub/stats").json()["requests"]
+	return total
+
+def _cleanup_ok(db, models, count, incomplete):
+	# Only the incomplete users' rows are gone, and no activity or day was
+	# left without its user.
+	from sqlalchemy import or_
+	session = db.session
+	users = session.query(models.User.id)
+	return session.query(models.User).count() == count and \
+			session.query(models.Activity).filter(or_(
+			models.Activity.user_id.in_(incomplete),
+			~models.Activity.user_id.in_(users))).count() == 0 and \
+			session.query(models.Day).filter(or_(models.Day.user_id.in_(incomplete),
+			~models.Day.user_id.in_(users))).count() == 0
+
+def run_child(count, cycles, wc_url, fb_url):
+	"""
+	Run inside the child process: create the schema and users, then time each
+	cycle. Prints one JSON line per cycle.
+	"""
+	sys.path.insert(0, BACKGROUND_DIR)
+	sys.path.insert(0, BENCH_DIR)
+	from sqlalchemy import event
+	import db, models, synth
+	import helpers, maintenance, polling
+
+	# DEBUG logging of every payload would dominate the timings.
+	logging.getLogger().setLevel(logging.WARNING)
+
+	models.Base.metadata.create_all(db.engine)
+	metadata = models.Base.metadata
+	synth.create_users(db.engine, metadata, count, wc_id_offset=count)
+	incomplete = synth.create_users(db.engine, metadata,
+			min(INCOMPLETE_USERS, count), first_id=count + 1, wc_id_offset=count)
+	db.engine.execute(models.User.__table__.update().where(
+			models.User.id.in_(incomplete)).values(fb_token=None))
+	synth.create_history(db.engine, metadata, incomplete, days=2)
+
+	statements = [0]
+	def count_statement(*args):
+		statements[0] += 1
+	event.listen(db.engine, "before_cursor_execute", count_statement)
+
+	def populate():
+		for user in db.session.query(models.User).all():
+			try:
+				helpers.populate_today(user)
+			except IOError:
+				# WEconnect failed (see --error-rate); maintain() skips the
+				# user the same way.
+				db.session.rollback()
+
+	runners = {
+		"maintain": maintenance.maintain,
+		"populate": populate,
+		"poll": polling.poll_and_save
+	}
+	for name in cycles:
+		statements[0] = 0
+		requests_before = _stub_requests(wc_url, fb_url)
+		start = time.time()
+		runners[name]()
+		seconds = time.time() - start
+		requests_made = _stub_requests(wc_url, fb_url) - requests_before
+		result = {
+			"cycle": name,
+			"users": count,
+			"seconds": round(seconds, 3),
+			"requests": requests_made,
+			"requests_per_second": round(requests_made / seconds, 1) if seconds else 0,
+			"statements": statements[0],
+			"peak_rss_mb": round(resource.getrusage(
+					resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+		}
+		if name == "maintain":
+			result["cleanup_ok"] = _cleanup_ok(db, models, count, incomplete)
+		print(json.dumps(result))
+		sys.stdout.flush()
+
+def run(counts, cycles, options, keep=False):
+	"""
+	Start the stubs and run one child per user count. Return the list of
+	per-cycle results.
+	"""
+	from stubs import start_stubs
+	wc, fb = start_stubs(options)
+	results = []
+	workdir = tempfile.mkdtemp(prefix="pt-bench-")
+	try:
+		for count in counts:
+			env = dict(os.environ)
+			env["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir,
+					"poll-{}.db".format(count))
+			env["WECONNECT_API_URL"] = wc.url + "/api"
+			env["FITBIT_API_URL"] = fb.url + "/1/user/-"
+			env["PT_METRICS_PATH"] = os.path.join(workdir, "metrics.db")
+			cmd = [sys.executable, os.path.abspath(__file__), "--child",
+					str(count), "--cycles"] + cycles + ["--wc-url", wc.url,
+					"--fb-url", fb.url]
+			output = subprocess.check_output(cmd, env=env, cwd=BACKGROUND_DIR)
+			for line in output.decode("utf-8").splitlines():
+				if line.startswith("{"):
+					results.append(json.loads(line))
+	finally:
+		wc.shutdown()
+		fb.shutdown()
+		if keep:
+			print("Databases kept in {}".format(workdir))
+		else:
+			shutil.rmtree(workdir)
+	return results
+
+def print_table(results):
+	header = ("cycle", "users", "seconds", "requests", "requests_per_second",
+			"statements", "peak_rss_mb")
+	print("{:<10}{:>8}{:>10}{:>10}{:>10}{:>12}{:>10}".format("cycle", "users",
+			"seconds", "requests", "req/s", "statements", "rss_mb"))
+	for r in results:
+		print("{:<10}{:>8}{:>10}{:>10}{:>10}{:>12}{:>10}".format(
+				*[r[k] for k in header]))
+
+if __name__ == "__main__":
+	sys.path.insert(0, BENCH_DIR)
+	import stubs
+	parser = argparse.ArgumentParser(description="Benchmark the background "
+			"cycles against stub WEconnect and Fitbit servers.")
+	parser.add_argument("--users", type=int, nargs="+", default=[10, 100],
+			help="user counts to benchmark (10 to 10000)")
+	parser.add_argument("--cycles", nargs="+", default=CYCLES, choices=CYCLES)
+	parser.add_argument("--json", action="store_true",
+			help="print raw JSON lines instead of a table")
+	parser.add_argument("--keep", action="store_true",
+			help="keep the generated databases")
+	parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+	parser.add_argument("--wc-url", help=argparse.SUPPRESS)
+	parser.add_argument("--fb-url", help=argparse.SUPPRESS)
+	stubs.add_options(parser)
+	args = parser.parse_args()
+
+	if args.child is not None:
+		run_child(args.child, args.cycles, args.wc_url, args.fb_url)
+	else:
+		results = run(args.users, args.cycles, stubs.options_from_args(args),
+				keep=args.keep)
+		if args.json:
+			for r in results:
+				print(json.dumps(r))
+		else:
+			print_table(results)
+		checks = [r["cleanup_ok"] for r in results if "cleanup_ok" in r]
+		if checks and not args.json:
+			print("Incomplete users cleaned up: {}".format(
+					"yes" if all(checks) else "NO"))
+		sys.exit(0 if all(checks) else 1)
@@ -0,0 +1,173 @@
+"""
+Drives the admin and user routes through the Flask test client against a
+database filled with months of synthetic history, and checks each route
+against its query budget.\n
+For every route it reports latency percentiles and the number of SQL
+statements per request. The script exits with status 1 if any route runs
+more statements than its budget allows, or if the completion analytics
+disagree with a direct count of the events. The synthetic users' and
+activities' WEconnect ids differ from their local ids (WC_ID_OFFSET,
+WC_ACT_OFFSET), as they do in production, so a join on the wrong one shows
+up here.\n
+Usage: `python bench/route_budgets.py --users 100 --days 90`\n
+Created on 10/19/2026.
+"""
+
+import argparse, os, shutil, sys, tempfile, time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+# (endpoint, URL, fixed statements, statements per user)
+# A request may run at most `fixed + per_user * users` statements. The fixed
+# part covers the admin session lookup and the page's main query; the per-user
+# part covers view-model properties that still query once per user.
+# Added to each synthetic user's `id` to make its `wc_id`, and to each
+# activity's `id` to make its `wc_act_id`.
+WC_ID_OFFSET = 1000
+WC_ACT_OFFSET = 1000000
+
+ROUTE_BUDGETS = [
+	("admin_home", "/admin/home", 4, 2),
+	("admin_user_stats", "/admin/user_stats", 4, 2),
+	("admin_progress_logs", "/admin/progress_logs", 4, 1),
+	("admin_event_stats", "/admin/event_stats", 4, 0),
+	("admin_completion", "/admin/completion", 8, 0),
+	("admin_system_logs", "/admin/system_logs", 4, 0),
+	("admin_system_logs_search", "/admin/system_logs?q=step+goal&user=1", 4, 0),
+	("admin_system_logs_frequent", "/admin/system_logs?sort=count", 4, 0),
+	("admin_error_group", "/admin/system_logs/1", 4, 0),
+	("user_activities", "/user_activities?username=bench-user-1", 4, 0),
+]
+
+def percentile(values, pct):
+	ordered = sorted(values)
+	index = int(round((len(ordered) - 1) * pct / 100.0))
+	return ordered[index]
+
+def setup_app(workdir):
+	"""
+	Point the app at a scratch database and import it. Return (app, db).
+	"""
+	os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "routes.db")
+	os.environ["LOG_PATH"] = os.path.join(workdir, "app.log")
+	os.environ["PT_METRICS_PATH"] = os.path.join(workdir, "metrics.db")
+	os.environ.setdefault("SECRET_KEY", "bench")
+	os.environ.setdefault("PT_ADMINS", "bench@example.com")
+	sys.path.insert(0, ROOT_DIR)
+	sys.path.insert(0, BENCH_DIR)
+	from app import create_app, db
+	app = create_app()
+	app.config["WTF_CSRF_ENABLED"] = False
+	return app, db
+
+def populate(app, db, users, days):
+	import synth
+	from app import errorlog
+	from app.models import Admin
+	with app.app_context():
+		db.create_all()
+		ids = synth.create_users(db.engine, db.metadata, users,
+				wc_id_offset=WC_ID_OFFSET)
+		counts = synth.create_history(db.engine, db.metadata, ids, days=days,
+				wc_act_offset=WC_ACT_OFFSET)
+		errorlog.install()
+		admin = Admin(username="bench", email="bench@example.com")
+		admin.set_password("bench")
+		db.session.add(admin)
+		db.session.commit()
+	return counts
+
+def measure(app, db, users, repeat):
+	"""
+	Request every route `repeat` times. Return a list of result dicts.
+	"""
+	from sqlalchemy import event
+	statements = [0]
+	def count_statement(*args):
+		statements[0] += 1
+
+	results = []
+	client = app.test_client()
+	client.post("/admin/login", data={"username": "bench", "password": "bench"})
+	with app.app_context():
+		event.listen(db.engine, "before_cursor_execute", count_statement)
+	for endpoint, url, fixed, per_user in ROUTE_BUDGETS:
+		timings, counts, status = [], [], None
+		for _ in range(repeat):
+			statements[0] = 0
+			start = time.time()
+			response = client.get(url)
+			timings.append((time.time() - start) * 1000.0)
+			counts.append(statements[0])
+			status = response.status_code
+		budget = fixed + per_user * users
+		results.append({
+			"endpoint": endpoint,
+			"status": status,
+			"p50_ms": round(percentile(timings, 50), 1),
+			"p90_ms": round(percentile(timings, 90), 1),
+			"p99_ms": round(percentile(timings, 99), 1),
+			"statements": max(counts),
+			"budget": budget,
+			"ok": status == 200 and max(counts) <= budget
+		})
+	return results
+
+def check_completion(app, db):
+	"""
+	Return True if analytics.by_activity() matches the events of the closed
+	days, counted per activity straight from the `event` table.
+	"""
+	from sqlalchemy import case, func
+	from app import analytics
+	from app.models import Day, Event
+	with app.app_context():
+		analytics.refresh(force=True)
+		expected = dict((activity_id, (events, completed))
+				for activity_id, events, completed in db.session.query(
+				Event.activity_id, func.count(Event.id),
+				func.sum(case([(Event.completed == True, 1)], else_=0))).\
+				join(Day, Event.day_id == Day.id).\
+				filter(Day.date < analytics._closed_before()).\
+				group_by(Event.activity_id))
+		return analytics.by_activity() == expected
+
+def print_table(results):
+	row = "{:<28}{:>7}{:>10}{:>10}{:>10}{:>12}{:>8}  {}"
+	print(row.format("endpoint", "status", "p50_ms", "p90_ms", "p99_ms",
+			"statements", "budget", ""))
+	for r in results:
+		print(row.format(r["endpoint"], r["status"], r["p50_ms"], r["p90_ms"],
+				r["p99_ms"], r["statements"], r["budget"],
+				"" if r["ok"] else "OVER BUDGET"))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark the Flask routes "
+			"against synthetic data and enforce their query budgets.")
+	parser.add_argument("--users", type=int, default=100)
+	parser.add_argument("--days", type=int, default=90,
+			help="days of history per user")
+	parser.add_argument("--repeat", type=int, default=5,
+			help="requests per route")
+	parser.add_argument("--keep", action="store_true",
+			help="keep the generated database")
+	args = parser.parse_args()
+
+	workdir = tempfile.mkdtemp(prefix="pt-routes-")
+	try:
+		app, db = setup_app(workdir)
+		counts = populate(app, db, args.users, args.days)
+		print("Rows: " + ", ".join("{} {}".format(n, t)
+				for t, n in sorted(counts.items())))
+		results = measure(app, db, args.users, args.repeat)
+		print_table(results)
+		completion_ok = check_completion(app, db)
+		print("Completion analytics match the events: {}".format(
+				"yes" if completion_ok else "NO"))
+	finally:
+		if args.keep:
+			print("Database kept in {}".format(workdir))
+		else:
+			shutil.rmtree(workdir)
+	sys.exit(0 if completion_ok and all(r["ok"] for r in results) else 1)
@@ -0,0 +1,59 @@
+"""
+Local stand-in for WEconnect's check-in notifications: sends signed check-ins
+to the Flask app's /hooks/checkin endpoint (see app/hooks.py).\n
+Usage: `python bench/send_checkin.py --person 12 --eid 456-20181019
+[--undo] [--url http://localhost:5000/hooks/checkin]`\n
+The secret is read from PT_CHECKIN_HOOK_SECRET, like the app's.\n
+Created on 10/19/2026.
+"""
+
+import argparse, hashlib, hmac, json, os, sys, time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+def send_checkin(url, secret, person_id, eid, did_checkin=True):
+	"""
+	POST one check-in and return (status code, decoded JSON response).
+
+	:param String url: the /hooks/checkin URL\n
+	:param String secret: the app's CHECKIN_HOOK_SECRET\n
+	:param int person_id: the user's WEconnect id\n
+	:param String eid: the WEconnect event id\n
+	:param bool did_checkin
+	"""
+	body = json.dumps({"personId": person_id, "eid": eid,
+			"didCheckin": did_checkin}).encode("utf-8")
+	signature = "sha256=" + hmac.new(secret.encode("utf-8"), body,
+			hashlib.sha256).hexdigest()
+	req = Request(url, data=body, method="POST", headers={
+		"Content-Type": "application/json",
+		"X-PowerToken-Signature": signature
+	})
+	try:
+		response = urlopen(req)
+	except HTTPError as e:
+		response = e
+	return response.getcode(), json.loads(response.read().decode("utf-8") or "{}")
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Send check-in notifications "
+			"to a PowerToken app.")
+	parser.add_argument("--url", default="http://localhost:5000/hooks/checkin")
+	parser.add_argument("--secret", default=os.environ.get("PT_CHECKIN_HOOK_SECRET"))
+	parser.add_argument("--person", type=int, required=True,
+			help="WEconnect person id")
+	parser.add_argument("--eid", nargs="+", required=True, help="event ids")
+	parser.add_argument("--undo", action="store_true",
+			help="send didCheckin=false instead")
+	args = parser.parse_args()
+	if not args.secret:
+		parser.error("set PT_CHECKIN_HOOK_SECRET or pass --secret")
+
+	for eid in args.eid:
+		start = time.time()
+		status, body = send_checkin(args.url, args.secret, args.person, eid,
+				not args.undo)
+		print("{} {} {:.1f} ms {}".format(eid, status,
+				(time.time() - start) * 1000.0, json.dumps(body)))
+		if status >= 400:
+			sys.exit(1)
@@ -0,0 +1,404 @@
+"""
+Local stand-ins for the WEconnect and Fitbit web APIs, so the background
+scripts can be benchmarked without touching palalinq.herokuapp.com or
+api.fitbit.com.\n
+Point the scripts at the stubs with the WECONNECT_API_URL and FITBIT_API_URL
+environment variables. Run `python bench/stubs.py` to serve both by hand.\n
+Created on 10/19/2026.
+"""
+
+import argparse, json, random, re, threading, time, zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+WC_DATE_FMT = "%Y-%m-%dT%H:%M:%S.%fZ"
+WC_QUERY_FMT = "%Y-%m-%dT%H:%M:%S"
+
+# Every synthetic activity was created (and last modified) well in the past.
+ACTIVITY_EPOCH = datetime(2018, 1, 1)
+
+class StubOptions(object):
+	"""
+	Knobs shared by both stub servers.
+	"""
+	def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=None,
+			rate_window=3600, activities_per_user=3, checkin_rate=0.5, seed=0):
+		"""
+		:param float latency: seconds added to every response\n
+		:param float jitter: up to this many extra seconds, chosen at random\n
+		:param float error_rate: fraction of requests answered with a 500\n
+		:param int rate_limit: requests per token per window (None: no limit)\n
+		:param int rate_window: length of the rate-limit window, in seconds\n
+		:param int activities_per_user: WEconnect activities per user\n
+		:param float checkin_rate: fraction of events already checked in\n
+		:param int seed: seed for the error and jitter draws
+		"""
+		self.latency = latency
+		self.jitter = jitter
+		self.error_rate = error_rate
+		self.rate_limit = rate_limit
+		self.rate_window = rate_window
+		self.activities_per_user = activities_per_user
+		self.checkin_rate = checkin_rate
+		self.seed = seed
+
+class StubServer(ThreadingHTTPServer):
+	"""
+	A threaded HTTP server that counts what it serves and keeps per-token
+	rate-limit windows.
+	"""
+	daemon_threads = True
+
+	def __init__(self, handler_class, options, port=0):
+		ThreadingHTTPServer.__init__(self, ("127.0.0.1", port), handler_class)
+		self.options = options
+		self.lock = threading.Lock()
+		self.state = {}
+		self._random = random.Random(options.seed)
+		self._windows = {}
+		self._counts = {"requests": 0, "errors": 0, "throttled": 0}
+		self._routes = {}
+
+	@property
+	def url(self):
+		return "http://{}:{}".format(*self.server_address)
+
+	def start(self):
+		thread = threading.Thread(target=self.serve_forever)
+		thread.daemon = True
+		thread.start()
+		return self
+
+	def stats(self):
+		"""
+		Return a snapshot of the request counters.
+		"""
+		with self.lock:
+			stats = dict(self._counts)
+			stats["routes"] = dict(self._routes)
+		return stats
+
+	def record(self, route, outcome=None):
+		with self.lock:
+			self._counts["requests"] += 1
+			self._routes[route] = self._routes.get(route, 0) + 1
+			if outcome:
+				self._counts[outcome] += 1
+
+	def delay(self):
+		with self.lock:
+			extra = self._random.random() * self.options.jitter
+		return self.options.latency + extra
+
+	def roll_error(self):
+		if not self.options.error_rate:
+			return False
+		with self.lock:
+			return self._random.random() < self.options.error_rate
+
+	def take_quota(self, token):
+		"""
+		Count one request against the token's window. Return a tuple
+		(allowed, remaining, seconds until reset).
+		"""
+		limit = self.options.rate_limit
+		if limit is None:
+			return True, None, None
+		now = time.time()
+		with self.lock:
+			start, used = self._windows.get(token, (now, 0))
+			if now - start >= self.options.rate_window:
+				start, used = now, 0
+			allowed = used < limit
+			if allowed:
+				used += 1
+			self._windows[token] = (start, used)
+		reset = int(start + self.options.rate_window - now)
+		return allowed, limit - used, reset
+
+class StubHandler(BaseHTTPRequestHandler):
+	"""
+	Dispatches requests to the methods listed in `routes`, adding latency,
+	random failures and rate limiting along the way.
+	"""
+	# Keep-alive, so that the client's connection pools are exercised.
+	protocol_version = "HTTP/1.1"
+	disable_nagle_algorithm = True
+	rate_limit_headers = ("X-RateLimit-Limit", "X-RateLimit-Remaining",
+			"X-RateLimit-Reset")
+	routes = []
+
+	def log_message(self, format, *args):
+		pass
+
+	def do_GET(self):
+		self._dispatch("GET")
+
+	def do_POST(self):
+		self._dispatch("POST")
+
+	def do_DELETE(self):
+		self._dispatch("DELETE")
+
+	def error_body(self, message):
+		"""
+		Return the JSON body of an error response. Subclasses use their API's
+		error format.
+		"""
+		return {"message": message}
+
+	def token(self, query):
+		"""
+		Return the token a request is rate limited under. By default every
+		client shares one window; subclasses use the caller's access token.
+		"""
+		return None
+
+	def _dispatch(self, method):
+		server = self.server
+		parsed = urlparse(self.path)
+		query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+		length = int(self.headers.get("Content-Length") or 0)
+		if length:
+			body = self.rfile.read(length).decode("utf-8")
+			query.update({k: v[-1] for k, v in parse_qs(body).items()})
+
+		if parsed.path == "/_stub/stats":
+			return self._send(200, server.stats())
+
+		for route_method, pattern, name in self.routes:
+			match = re.match(pattern + "$", parsed.path, re.IGNORECASE)
+			if route_method == method and match:
+				break
+		else:
+			server.record("unknown", "errors")
+			return self._send(404, self.error_body("Not found"))
+
+		delay = server.delay()
+		if delay:
+			time.sleep(delay)
+
+		headers = {}
+		allowed, remaining, reset = server.take_quota(self.token(query))
+		if remaining is not None:
+			limit_h, remaining_h, reset_h = self.rate_limit_headers
+			headers[limit_h] = server.options.rate_limit
+			headers[remaining_h] = remaining
+			headers[reset_h] = reset
+		if not allowed:
+			server.record(name, "throttled")
+			return self._send(429, self.error_body("Too Many Requests"), headers)
+		if server.roll_error():
+			server.record(name, "errors")
+			return self._send(500, self.error_body("Internal Server Error"),
+					headers)
+
+		server.record(name)
+		status, body = getattr(self, name)(query, *match.groups())
+		self._send(status, body, headers)
+
+	def _send(self, status, body, headers=None):
+		data = b"" if body is None else json.dumps(body).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(data)))
+		for key, value in (headers or {}).items():
+			self.send_header(key, str(value))
+		self.end_headers()
+		self.wfile.write(data)
+
+def _checked_in(eid, rate):
+	"""
+	Deterministically decide whether an event has been checked in.
+	"""
+	return (zlib.crc32(eid.encode("utf-8")) % 1000) < rate * 1000
+
+class WeconnectHandler(StubHandler):
+	"""
+	Emulates the parts of the WEconnect (LoopBack) API that PowerToken uses.
+	User N logs in as `userN@example.com` and gets the token `wc-token-N`.
+	Every user has the same number of daily activities.
+	"""
+	routes = [
+		("POST", r"/api/people/login", "login"),
+		("GET", r"/api/people/(\d+)", "person"),
+		("GET", r"/api/people/(\d+)/activities", "activities"),
+		("GET", r"/api/people/(\d+)/activities-with-events",
+				"activities_with_events"),
+	]
+
+	def error_body(self, message):
+		return {"error": {"message": message}}
+
+	def token(self, query):
+		return query.get("access_token") or query.get("email")
+
+	def login(self, query):
+		match = re.match(r"user(\d+)@", query.get("email") or "")
+		if match is None or not query.get("password"):
+			return 401, self.error_body("login failed")
+		wc_id = int(match.group(1))
+		return 200, {"accessToken": {"id": "wc-token-{}".format(wc_id),
+				"userId": wc_id, "ttl": 7776000}}
+
+	def person(self, query, wc_id):
+		if not query.get("access_token"):
+			return 401, self.error_body("Authorization Required")
+		return 200, {"id": int(wc_id)}
+
+	def _activities(self, wc_id):
+		acts = []
+		for k in range(self.server.options.activities_per_user):
+			start = ACTIVITY_EPOCH + timedelta(hours=8 + 2 * k)
+			acts.append({
+				"activityId": int(wc_id) * 100 + k,
+				"name": "Activity {}".format(k + 1),
+				"dateStart": start.strftime(WC_DATE_FMT),
+				"duration": 30,
+				"repeat": "daily",
+				"repeatEnd": None,
+				"dateModified": ACTIVITY_EPOCH.strftime(WC_DATE_FMT)
+			})
+		return acts
+
+	def activities(self, query, wc_id):
+		if not query.get("access_token"):
+			return 401, self.error_body("Authorization Required")
+		return 200, self._activities(wc_id)
+
+	def activities_with_events(self, query, wc_id):
+		if not query.get("access_token"):
+			return 401, self.error_body("Authorization Required")
+		start = datetime.strptime(query["from"], WC_QUERY_FMT)
+		end = datetime.strptime(query["to"], WC_QUERY_FMT)
+		overrides = self.server.state.get("checkins", {})
+		acts = self._activities(wc_id)
+		for act in acts:
+			first = datetime.strptime(act["dateStart"], WC_DATE_FMT)
+			act["events"] = []
+			day = datetime(start.year, start.month, start.day)
+			while day <= end:
+				ev_start = datetime.combine(day.date(), first.time())
+				eid = "{}-{}".format(act["activityId"], day.strftime("%Y%m%d"))
+				if start <= ev_start <= end:
+					act["events"].append({
+						"eid": eid,
+						"activityId": act["activityId"],
+						"dateStart": ev_start.strftime(WC_DATE_FMT),
+						"duration": act["duration"],
+						"didCheckin": overrides.get(eid, _checked_in(eid,
+								self.server.options.checkin_rate))
+					})
+				day += timedelta(days=1)
+		return 200, acts
+
+class FitbitHandler(StubHandler):
+	"""
+	Emulates the Fitbit Web API activity and goal endpoints, keeping each
+	token's step goal and logged activities in memory.
+	"""
+	rate_limit_headers = ("Fitbit-Rate-Limit-Limit",
+			"Fitbit-Rate-Limit-Remaining", "Fitbit-Rate-Limit-Reset")
+	routes = [
+		("GET", r"/1/user/-/activities/goals/daily\.json", "get_goal"),
+		("POST", r"/1/user/-/activities/goals/daily\.json", "set_goal"),
+		("GET", r"/1/user/-/activities/date/([\d-]+)\.json", "day_activities"),
+		("POST", r"/1/user/-/activities\.json", "log_activity"),
+		("DELETE", r"/1/user/-/activities/(\d+)\.json", "delete_activity"),
+	]
+
+	def error_body(self, message):
+		return {"errors": [{"errorType": "system", "message": message}]}
+
+	def token(self, query):
+		auth = self.headers.get("Authorization") or ""
+		return auth.replace("Bearer ", "", 1)
+
+	def _account(self):
+		token = self.token({})
+		with self.server.lock:
+			accounts = self.server.state.setdefault("accounts", {})
+			return accounts.setdefault(token, {"goal": 10000, "logs": {}})
+
+	def get_goal(self, query):
+		return 200, {"goals": {"steps": self._account()["goal"]}}
+
+	def set_goal(self, query):
+		account = self._account()
+		account["goal"] = int(query.get("value") or 0)
+		return 200, {"goals": {"steps": account["goal"]}}
+
+	def day_activities(self, query, date):
+		logs = self._account()["logs"]
+		return 200, {"activities": [l for l in list(logs.values())
+				if l["startDate"] == date]}
+
+	def log_activity(self, query):
+		with self.server.lock:
+			log_id = self.server.state.get("next_log_id", 1)
+			self.server.state["next_log_id"] = log_id + 1
+		log = {"logId": log_id, "activityId": int(query.get("activityId", 0)),
+				"startDate": query.get("date"), "startTime": query.get("startTime"),
+				"steps": int(float(query.get("distance") or 0))}
+		self._account()["logs"][log_id] = log
+		return 201, {"activityLog": log}
+
+	def delete_activity(self, query, log_id):
+		if self._account()["logs"].pop(int(log_id), None) is None:
+			return 404, self.error_body("Activity log not found")
+		return 204, None
+
+def start_stubs(options, wc_port=0, fb_port=0):
+	"""
+	Start both stub servers in background threads and return them as a
+	tuple (weconnect, fitbit).
+
+	:param StubOptions options\n
+	:param int wc_port: 0 picks a free port\n
+	:param int fb_port: 0 picks a free port
+	"""
+	wc = StubServer(WeconnectHandler, options, wc_port).start()
+	fb = StubServer(FitbitHandler, options, fb_port).start()
+	return wc, fb
+
+def add_options(parser):
+	"""
+	Add the stub knobs to an argparse parser.
+	"""
+	parser.add_argument("--latency", type=float, default=0.0,
+			help="seconds of latency added to every stub response")
+	parser.add_argument("--jitter", type=float, default=0.0,
+			help="up to this many extra seconds of random latency")
+	parser.add_argument("--error-rate", type=float, default=0.0,
+			help="fraction of stub requests that fail with a 500")
+	parser.add_argument("--rate-limit", type=int, default=None,
+			help="requests per token per window before a 429")
+	parser.add_argument("--rate-window", type=int, default=3600,
+			help="rate-limit window, in seconds")
+	parser.add_argument("--activities", type=int, default=3,
+			help="WEconnect activities per user")
+	parser.add_argument("--checkin-rate", type=float, default=0.5,
+			help="fraction of events that are already checked in")
+
+def options_from_args(args):
+	return StubOptions(latency=args.latency, jitter=args.jitter,
+			error_rate=args.error_rate, rate_limit=args.rate_limit,
+			rate_window=args.rate_window, activities_per_user=args.activities,
+			checkin_rate=args.checkin_rate)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Serve stub WEconnect and "
+			"Fitbit APIs.")
+	parser.add_argument("--wc-port", type=int, default=5001)
+	parser.add_argument("--fb-port", type=int, default=5002)
+	add_options(parser)
+	args = parser.parse_args()
+	wc, fb = start_stubs(options_from_args(args), args.wc_port, args.fb_port)
+	print("export WECONNECT_API_URL={}/api".format(wc.url))
+	print("export FITBIT_API_URL={}/1/user/-".format(fb.url))
+	try:
+		while True:
+			time.sleep(3600)
+	except KeyboardInterrupt:
+		pass
@@ -0,0 +1,146 @@
+"""
+Generates synthetic PowerToken data for the benchmarks.\n
+Rows are written with plain table inserts, so the same generator works with
+the background models and with the Flask models. Activities, days and events
+point at the local `user.id` and `activity.id`, as both write them;
+`wc_id_offset` and `wc_act_offset` make the WEconnect ids (`user.wc_id`,
+`activity.wc_act_id`) differ from them, as they do in production. User N
+gets the tokens the stub servers in stubs.py expect for its `wc_id`.\n
+Created on 10/19/2026.
+"""
+
+import os, random, sys
+from datetime import datetime, time, timedelta, MAXYEAR
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+	sys.path.append(ROOT_DIR)
+from background import errorgroups
+
+BATCH_SIZE = 1000
+
+# (summary, origin, message) of the synthetic `error` rows.
+ERRORS = [
+	("Couldn't get step goal. Using 1,000,000 instead.",
+			"background/fitbit.py, in get_step_goal",
+			"Access token expired: fb-token-{}"),
+	("Couldn't change the step goal.",
+			"background/fitbit.py, in change_step_goal",
+			"Too Many Requests for fb-token-{}"),
+	("Couldn't get list of activities.",
+			"background/weconnect.py, in _get_activities",
+			"Authorization Required for person {}"),
+	("Couldn't get activities with events for today",
+			"background/weconnect.py, in get_todays_events",
+			"Service unavailable while polling person {}")
+]
+
+def _insert_batches(conn, table, rows):
+	for i in range(0, len(rows), BATCH_SIZE):
+		conn.execute(table.insert(), rows[i:i + BATCH_SIZE])
+
+def create_users(engine, metadata, count, first_id=1, wc_id_offset=0):
+	"""
+	Insert `count` complete users (with WEconnect and Fitbit tokens) and
+	return their ids.
+
+	:param sqlalchemy.engine.Engine engine\n
+	:param sqlalchemy.MetaData metadata: the models' metadata\n
+	:param int count\n
+	:param int first_id\n
+	:param int wc_id_offset: added to `user.id` to make `wc_id`
+	"""
+	ids = list(range(first_id, first_id + count))
+	now = datetime.now()
+	rows = [{
+		"id": i,
+		"username": "bench-user-{}".format(i),
+		"registered_on": now,
+		"goal_period": "daily",
+		"wc_id": i + wc_id_offset,
+		"wc_token": "wc-token-{}".format(i + wc_id_offset),
+		"fb_token": "fb-token-{}".format(i + wc_id_offset)
+	} for i in ids]
+	with engine.begin() as conn:
+		_insert_batches(conn, metadata.tables["user"], rows)
+	return ids
+
+def create_history(engine, metadata, user_ids, days=90, activities_per_user=3,
+		logs_per_day=4, error_rate=0.2, checkin_rate=0.6, wc_act_offset=0,
+		seed=0):
+	"""
+	Give each user `activities_per_user` daily activities and fill the
+	`day`, `event`, `log`, `error` and `error_group` tables for the last
+	`days` days (including today). Return a dict of row counts per table.
+
+	:param sqlalchemy.engine.Engine engine\n
+	:param sqlalchemy.MetaData metadata: the models' metadata\n
+	:param list user_ids: users created by create_users\n
+	:param int days\n
+	:param int activities_per_user\n
+	:param int logs_per_day: progress logs per user per day\n
+	:param float error_rate: expected error rows per user per day\n
+	:param float checkin_rate: fraction of events completed\n
+	:param int wc_act_offset: added to `activity.id` to make `wc_act_id`\n
+	:param int seed
+	"""
+	rand = random.Random(seed)
+	tables = metadata.tables
+	today = datetime.combine(datetime.now().date(), time(0, 0, 0))
+	counts = {"activity": 0, "day": 0, "event": 0, "log": 0, "error": 0,
+			"error_group": 0}
+	day_id = event_id = group_id = 1
+	with engine.begin() as conn:
+		for user_id in user_ids:
+			acts, day_rows, event_rows, log_rows, error_rows = [], [], [], [], []
+			groups = {}
+			for k in range(activities_per_user):
+				act_id = user_id * 100 + k
+				acts.append({"id": act_id, "wc_act_id": act_id + wc_act_offset,
+						"user_id": user_id,
+						"name": "Activity {}".format(k + 1), "weight": 1 + k % 5,
+						"expiration": datetime(MAXYEAR, 12, 31)})
+			for offset in range(days - 1, -1, -1):
+				date = today - timedelta(days=offset)
+				completed = 0
+				for act in acts:
+					start = date + timedelta(hours=8 + 2 * (act["id"] % 100))
+					done = rand.random() < checkin_rate
+					completed += done
+					event_rows.append({"id": event_id,
+							"eid": "{}-{}".format(act["id"], date.strftime("%Y%m%d")),
+							"start_time": start, "end_time": start + timedelta(minutes=30),
+							"completed": done, "day_id": day_id,
+							"activity_id": act["id"]})
+					event_id += 1
+				progress = float(completed) / len(acts) if acts else 0.0
+				day_rows.append({"id": day_id, "date": date, "user_id": user_id,
+						"computed_progress": progress})
+				day_id += 1
+				for n in range(logs_per_day):
+					log_rows.append({"user_id": user_id,
+							"timestamp": date + timedelta(hours=8 + 3 * n),
+							"wc_progress": progress * (n + 1) / logs_per_day,
+							"fb_step_count": int(progress * 1000000)})
+				if rand.random() < error_rate:
+					summary, origin, message = ERRORS[(user_id + offset) % len(ERRORS)]
+					message = message.format(user_id)
+					timestamp = date + timedelta(hours=rand.randint(0, 23))
+					key = errorgroups.fingerprint(origin, summary, message, user_id)
+					group = groups.get(key)
+					if group is None:
+						group = groups[key] = {"id": group_id, "fingerprint": key,
+								"summary": summary, "origin": origin, "message": message,
+								"user_id": user_id, "first_seen": timestamp, "count": 0}
+						group_id += 1
+					group["count"] += 1
+					group["last_seen"] = timestamp
+					error_rows.append({"user_id": user_id, "timestamp": timestamp,
+							"summary": summary, "origin": origin, "message": message,
+							"group_id": group["id"]})
+			for name, rows in (("activity", acts), ("day", day_rows),
+					("event", event_rows), ("log", log_rows),
+					("error_group", list(groups.values())), ("error", error_rows)):
+				_insert_batches(conn, tables[name], rows)
+				counts[name] += len(rows)
+	return counts
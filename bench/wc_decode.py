@@ -0,0 +1,127 @@
+"""
+Microbenchmark for background/wcdecode.py: decodes a synthetic WEconnect
+`activities-with-events` response with the decoder and with the per-field
+`strptime` parsing the call sites used before it, and reports the time per
+response and the memory kept by the result.\n
+Usage: `python bench/wc_decode.py --activities 20 --days 14 --repeat 50`\n
+Created on 10/19/2026.
+"""
+
+import argparse, gc, json, os, sys, time, tracemalloc
+from datetime import datetime, timedelta, MAXYEAR
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "background"))
+import wcdecode
+
+WC_DATE_FMT = "%Y-%m-%dT%H:%M:%S.%fZ"
+EPOCH = datetime(2026, 9, 1)
+
+def _stamp(value):
+	# WEconnect sends milliseconds.
+	return value.strftime("%Y-%m-%dT%H:%M:%S.") + \
+			"{:03d}Z".format(value.microsecond // 1000)
+
+def make_payload(activities, days):
+	"""
+	Return the JSON text of a response with `activities` daily activities,
+	each with one event per day for `days` days.
+	"""
+	items = []
+	for k in range(activities):
+		start = EPOCH + timedelta(hours=8, minutes=30 * k)
+		items.append({
+			"activityId": 1000 + k,
+			"name": "Activity {}".format(k % 5),
+			"dateStart": _stamp(start),
+			"duration": 30,
+			"repeat": "daily",
+			"repeatEnd": None,
+			"dateModified": _stamp(EPOCH),
+			"events": [{
+				"eid": "{}-{}".format(1000 + k, d),
+				"activityId": 1000 + k,
+				"dateStart": _stamp(start + timedelta(days=d)),
+				"duration": 30,
+				"didCheckin": d % 3 == 0
+			} for d in range(days)]
+		})
+	return json.dumps(items)
+
+def legacy(items):
+	"""
+	The parsing the call sites did before wcdecode: strptime for every
+	timestamp, with the JSON dicts kept around.
+	"""
+	out = []
+	for act in items:
+		ts = datetime.strptime(act["dateStart"], WC_DATE_FMT)
+		te = ts + timedelta(minutes=act["duration"])
+		expiration = datetime(MAXYEAR, 12, 31)
+		if act["repeat"] == "never":
+			expiration = te
+		if act["repeatEnd"] != None:
+			expiration = datetime.strptime(act["repeatEnd"], WC_DATE_FMT)
+		modified = datetime.strptime(act["dateModified"], WC_DATE_FMT)
+		events = []
+		for ev in act["events"]:
+			st = datetime.strptime(ev["dateStart"], WC_DATE_FMT)
+			events.append((ev, st, st + timedelta(minutes=ev["duration"])))
+		out.append((act, ts, te, expiration, modified, events))
+	return out
+
+def measure(decode, text, repeat):
+	"""
+	Return (best seconds per response, bytes kept by one result).
+	"""
+	best = None
+	for _ in range(repeat):
+		wcdecode._timestamps.clear()
+		wcdecode._strings.clear()
+		start = time.perf_counter()
+		decode(json.loads(text))
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	gc.collect()
+	wcdecode._timestamps.clear()
+	wcdecode._strings.clear()
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	items = json.loads(text)
+	result = decode(items)
+	del items
+	gc.collect()
+	kept = tracemalloc.get_traced_memory()[0] - before
+	tracemalloc.stop()
+	del result
+	return best, kept
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Compare wcdecode with the "
+			"strptime-based parsing of WEconnect responses.")
+	parser.add_argument("--activities", type=int, default=20)
+	parser.add_argument("--days", type=int, default=14,
+			help="events per activity")
+	parser.add_argument("--repeat", type=int, default=50)
+	parser.add_argument("--json", action="store_true")
+	args = parser.parse_args()
+
+	text = make_payload(args.activities, args.days)
+	assert len(wcdecode.activities(json.loads(text))) == args.activities
+	results = {}
+	for name, decode in (("legacy", legacy), ("wcdecode", wcdecode.activities)):
+		seconds, kept = measure(decode, text, args.repeat)
+		results[name] = {"ms": round(seconds * 1000, 3),
+				"kept_kb": round(kept / 1024.0, 1)}
+	results["speedup"] = round(results["legacy"]["ms"] /
+			results["wcdecode"]["ms"], 2)
+	results["events"] = args.activities * args.days
+	if args.json:
+		print(json.dumps(results))
+	else:
+		print("{} activities, {} events, JSON parse included".format(
+				args.activities, results["events"]))
+		for name in ("legacy", "wcdecode"):
+			print("{:<10} {:>9} ms {:>9} KB kept".format(name,
+					results[name]["ms"], results[name]["kept_kb"]))
+		print("speedup    {}x".format(results["speedup"]))
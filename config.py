@@ -27,3 +27,20 @@ class Config(object):
 	ADMINS = os.environ.get("PT_ADMINS").split(",")
 	LOG_FILE = os.environ.get("LOG_PATH") or \
 		os.path.join(basedir, "data/app.log")
+	# Bearer token that lets a Prometheus scraper read /admin/metrics without
+	# an admin login. Unset means only logged-in admins can read it.
+	METRICS_TOKEN = os.environ.get("PT_METRICS_TOKEN")
+	# Per-request SQL profiling (see app/profiling.py). Requests slower than
+	# SQL_PROFILING_SLOW_MS or running at least SQL_PROFILING_MAX_QUERIES
+	# statements are logged with their most expensive statements.
+	SQL_PROFILING = int(os.environ.get("PT_SQL_PROFILING") or 0)
+	SQL_PROFILING_SLOW_MS = float(os.environ.get("PT_SQL_PROFILING_SLOW_MS") or 500)
+	SQL_PROFILING_MAX_QUERIES = int(os.environ.get("PT_SQL_PROFILING_MAX_QUERIES") or 50)
+	# Shared secret that signs check-ins pushed to /hooks/checkin (see
+	# app/hooks.py). Unset disables the endpoint.
+	CHECKIN_HOOK_SECRET = os.environ.get("PT_CHECKIN_HOOK_SECRET")
+	# Read-only snapshot of the database kept by background/snapshot.py, read
+	# by the dashboards and analytics (see app/replica.py) while it's at most
+	# REPLICA_MAX_AGE seconds old. Unset means everything reads the database.
+	REPLICA_PATH = os.environ.get("PT_SNAPSHOT_PATH")
+	REPLICA_MAX_AGE = float(os.environ.get("PT_SNAPSHOT_MAX_AGE") or 1800)
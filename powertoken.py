@@ -7,8 +7,10 @@ Created by Abigail Franz on 3/12/2018.\n
 Last modified by Abigail Franz on 3/13/2018.
 """
 
-from app import app, db
-from app.models import User, Admin, Log, Activity
+from app import create_app, db
+from app.models import User, Admin, Log, Activity, Day, Event
+
+app = create_app()
 
 @app.shell_context_processor
 def make_shell_context():
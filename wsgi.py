@@ -1,6 +1,9 @@
 """
 WSGI entry point for Gunicorn. Can be run with the command:
 `gunicorn --bind <host>:<port> wsgi [options]`
+
+Without `--preload`, each worker imports this itself and builds its own app
+(with its own database and HTTP pools).
 """
 
 from powertoken import app as application